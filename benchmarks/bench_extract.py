@@ -0,0 +1,94 @@
+"""
+Benchmark comparing the HTML extraction of the scraper with the previous one, which parsed every page twice with
+BeautifulSoup and stored the remaining markup.
+
+Pages are synthetic intranet pages with the menus, sidebars and attribute-heavy markup of a WordPress theme around
+a few paragraphs of content. Reports the CPU time per page and the size of what is stored, in characters and in
+embedding tokens.
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import Callable
+
+import tiktoken
+from bs4 import BeautifulSoup
+
+from regent_rag.core.extractors import extract_text_and_links_from_html
+
+WORDS = "lease car staff policy travel expense certificate font logo office meeting holiday salary report".split()
+
+
+def make_page(rng: random.Random, paragraphs: int, menu_items: int) -> str:
+    def sentence() -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+
+    menu = "".join(
+        f'<li id="menu-item-{i}" class="menu-item menu-item-type-post_type menu-item-object-page menu-item-{i}">'
+        f'<a href="https://intern.regent.se/en/page-{i}/" class="menu-link" data-id="{i}">{rng.choice(WORDS)}</a></li>'
+        for i in range(menu_items)
+    )
+    content = "".join(
+        f'<p class="has-text-align-left wp-block-paragraph" style="margin-top:0">{sentence()} {sentence()} '
+        f'<a href="https://intern.regent.se/en/doc-{i}.pdf" target="_blank" rel="noopener">{rng.choice(WORDS)}</a> '
+        f"{sentence()}</p>"
+        for i in range(paragraphs)
+    )
+    return (
+        '<!DOCTYPE html><html lang="en-US"><head><meta charset="UTF-8"><title>Staff car - Regent Intranet</title>'
+        '<link rel="stylesheet" href="/wp-content/themes/regent/style.css"><style>.menu-item{display:inline}</style>'
+        "<script>window.dataLayer = window.dataLayer || []; function gtag(){dataLayer.push(arguments);}</script>"
+        '</head><body class="page-template-default page page-id-42 logged-in">'
+        f'<header class="site-header"><nav class="main-navigation"><ul id="primary-menu" class="menu">{menu}</ul></nav>'
+        '</header><div id="content" class="site-content"><div class="entry-content">'
+        f'<h1 class="entry-title">Staff car</h1>{content}</div>'
+        f'<aside class="widget-area"><ul>{menu[: len(menu) // 4]}</ul></aside></div>'
+        '<footer class="site-footer"><div class="site-info">Regent &copy; 2023</div></footer>'
+        '<script src="/wp-includes/js/jquery.min.js"></script></body></html>'
+    )
+
+
+def legacy_extract(page: str) -> tuple[str, list[str]]:
+    """
+    The extraction the scraper did before: one tree for the links, one stripped of scripts and styles.
+    """
+    raw_soup = BeautifulSoup(page, "html.parser")
+    soup = BeautifulSoup(page, "html.parser")
+    for script_or_style in soup(["script", "style", "link", "header", "footer"]):
+        script_or_style.decompose()
+    text_content = re.sub(r"[\n\t]", "", str(soup))
+    links = list({a["href"] for a in raw_soup.find_all("a") if a.has_attr("href")})
+    return text_content, links
+
+
+def measure(name: str, extract: Callable[[str], tuple[str, list[str]]], pages: list[str]) -> None:
+    tokenizer = tiktoken.get_encoding("cl100k_base")
+    start = time.process_time()
+    results = [extract(page) for page in pages]
+    elapsed = time.process_time() - start
+    chars = sum(len(text) for text, _ in results)
+    tokens = sum(len(tokenizer.encode(text, disallowed_special=())) for text, _ in results)
+    links = sum(len(links) for _, links in results)
+    print(
+        f"{name:<10} {elapsed / len(pages) * 1000:>7.2f} ms/page {chars / len(pages):>9.0f} chars/page "
+        f"{tokens / len(pages):>8.0f} tokens/page {links / len(pages):>6.1f} links/page"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=500, help="number of pages to extract")
+    parser.add_argument("--paragraphs", type=int, default=8, help="paragraphs of content per page")
+    parser.add_argument("--menu-items", type=int, default=60, help="items in the navigation menu of every page")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [make_page(rng, args.paragraphs, args.menu_items) for _ in range(args.pages)]
+    measure("legacy", legacy_extract, pages)
+    measure("lxml", extract_text_and_links_from_html, pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark comparing the serial embed-then-upsert loop with the concurrent, rate limit aware ingest pipeline.
+
+Embeddings are served by a local fake of the OpenAI embeddings API that answers with 429 above a fixed number of
+concurrent requests, and vectors are upserted into an in-memory index with a fixed latency per request.
+"""
+
+import argparse
+import time
+
+import openai
+
+from regent_rag.embeddings import create_and_index_embeddings, create_embeddings_and_metadata
+from regent_rag.ingest import IngestOptions
+from tests.fakes import FakeEmbeddingServer, FakeIndex
+
+MODEL = "text-embedding-ada-002"
+SERIAL_BATCH_SIZE = 32
+
+
+def make_chunks(count: int, words: int) -> list[dict[str, str]]:
+    return [
+        {
+            "id": f"chunk-{i}",
+            "source": f"https://intern.regent.se/en/page/{i // 10}",
+            "text": " ".join(f"word{(i * 7 + j) % 997}" for j in range(words)),
+        }
+        for i in range(count)
+    ]
+
+
+def run_serial(data: list[dict[str, str]], index: FakeIndex) -> float:
+    """
+    Embed and upsert one fixed size batch at a time, the way ingest worked before the pipeline.
+    """
+    start = time.perf_counter()
+    for i in range(0, len(data), SERIAL_BATCH_SIZE):
+        batch = data[i : i + SERIAL_BATCH_SIZE]
+        embeds, metadata = create_embeddings_and_metadata(
+            [item["text"] for item in batch], [item["source"] for item in batch], MODEL
+        )
+        index.upsert(vectors=list(zip([item["id"] for item in batch], embeds, metadata)))
+    return time.perf_counter() - start
+
+
+def run_pipeline(data: list[dict[str, str]], index: FakeIndex, options: IngestOptions) -> tuple[float, str]:
+    start = time.perf_counter()
+    stats = create_and_index_embeddings(data, MODEL, index, options=options)
+    return time.perf_counter() - start, str(stats)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=4000, help="number of chunks to ingest")
+    parser.add_argument("--words", type=int, default=100, help="words per chunk")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum concurrent embedding requests")
+    parser.add_argument("--batch-tokens", type=int, default=16000, help="maximum tokens per embedding request")
+    parser.add_argument("--capacity", type=int, default=4, help="concurrent requests before the server sends 429")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per embedding request")
+    parser.add_argument("--input-latency", type=float, default=0.0005, help="extra seconds per embedded text")
+    parser.add_argument("--upsert-latency", type=float, default=0.02, help="seconds per upsert request")
+    args = parser.parse_args()
+
+    data = make_chunks(args.chunks, args.words)
+    options = IngestOptions(concurrency=args.concurrency, batch_tokens=args.batch_tokens, backoff=0.05)
+
+    with FakeEmbeddingServer(latency=args.latency, input_latency=args.input_latency, capacity=args.capacity) as server:
+        openai.api_key = "fake"
+        openai.api_base = server.url
+
+        serial_seconds = run_serial(data, FakeIndex(args.upsert_latency))
+        serial_requests = server.requests
+        pipeline_index = FakeIndex(args.upsert_latency)
+        pipeline_seconds, stats = run_pipeline(data, pipeline_index, options)
+        assert len(pipeline_index.vectors) == len(data)
+
+    print(f"chunks:   {args.chunks}")
+    print(f"serial:   {serial_seconds:.2f}s, {args.chunks / serial_seconds:.0f} chunks/s, {serial_requests} requests")
+    print(f"pipeline: {pipeline_seconds:.2f}s, {args.chunks / pipeline_seconds:.0f} chunks/s, {stats}")
+    print(f"429s:     {server.rate_limited}")
+    print(f"speedup:  {serial_seconds / pipeline_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
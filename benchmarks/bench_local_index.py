@@ -0,0 +1,71 @@
+"""
+Benchmark comparing exact search in the local vector index with its inverted file (IVF) index.
+
+The vectors are drawn around random topic centers, like embeddings of chunks about a limited number of subjects,
+and the queries are noisy copies of indexed vectors. Recall@k is the share of the exact top k that IVF also finds.
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from regent_rag.core.local_index import LocalIndex
+
+
+def make_vectors(count: int, dimension: int, topics: int, noise: float, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((topics, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(topics, size=count)] + noise * rng.standard_normal((count, dimension))
+    return vectors.astype(np.float32)
+
+
+def run_queries(index: LocalIndex, queries: np.ndarray, top_k: int) -> tuple[list[set[str]], np.ndarray]:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        matches = index.query(query, top_k=top_k, include_metadata=False)["matches"]
+        latencies.append(time.perf_counter() - start)
+        results.append({match["id"] for match in matches})
+    return results, np.array(latencies) * 1000
+
+
+def report(name: str, latencies: np.ndarray, recall: float) -> None:
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{name:<14} recall {recall:6.3f}   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=200_000, help="number of indexed vectors")
+    parser.add_argument("--dimension", type=int, default=256, help="dimension of the vectors")
+    parser.add_argument("--topics", type=int, default=500, help="number of topic centers the vectors are drawn around")
+    parser.add_argument("--noise", type=float, default=0.8, help="spread of the vectors around their topic")
+    parser.add_argument("--queries", type=int, default=500, help="number of queries")
+    parser.add_argument("--top-k", type=int, default=10, help="number of matches per query")
+    parser.add_argument("--lists", type=int, default=0, help="number of IVF clusters, 0 for 4 * sqrt(vectors)")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 16, 64], help="IVF probes to compare")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(args.vectors, args.dimension, args.topics, args.noise, rng)
+    queries = vectors[rng.integers(args.vectors, size=args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as folder:
+        index = LocalIndex(folder)
+        index.upsert((str(i), vector, {}) for i, vector in enumerate(vectors))
+        start = time.perf_counter()
+        index.build_ivf(args.lists or None)
+        print(f"vectors: {args.vectors} x {args.dimension}, IVF built in {time.perf_counter() - start:.1f}s")
+
+        exact, latencies = run_queries(LocalIndex(folder), queries, args.top_k)
+        report("exact", latencies, 1.0)
+        for nprobe in args.probes:
+            found, latencies = run_queries(LocalIndex(folder, nprobe=nprobe), queries, args.top_k)
+            recall = np.mean([len(a & b) / len(a) for a, b in zip(exact, found)])
+            report(f"ivf nprobe={nprobe}", latencies, float(recall))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark comparing exact search in the local vector index with search on int8 and binary codes of the vectors,
+rescored with the full-precision vectors.
+
+Memory is what a query scans and needs in memory to be fast: the float32 vectors for exact search, the codes for
+quantized search, which then only reads the rows of the candidates it rescores from the memory-mapped vectors.
+Recall@k is the share of the exact top k that quantized search also finds.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_local_index import make_vectors, run_queries
+from regent_rag.core.local_index import QUANTIZED_FILE, LocalIndex, QuantizedVectors
+
+
+def report(name: str, memory: int, latencies: np.ndarray, recall: float) -> None:
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{name:<22} memory {memory / 2**20:8.1f} MiB   recall {recall:6.3f}   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=50_000, help="number of indexed vectors")
+    parser.add_argument("--dimension", type=int, default=1536, help="dimension of the vectors, 1536 for ada-002")
+    parser.add_argument("--topics", type=int, default=500, help="number of topic centers the vectors are drawn around")
+    parser.add_argument("--noise", type=float, default=0.8, help="spread of the vectors around their topic")
+    parser.add_argument("--queries", type=int, default=200, help="number of queries")
+    parser.add_argument("--top-k", type=int, default=10, help="number of matches per query")
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 4, 16], help="rescore factors to compare")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(args.vectors, args.dimension, args.topics, args.noise, rng)
+    queries = vectors[rng.integers(args.vectors, size=args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as folder:
+        index = LocalIndex(folder)
+        index.upsert((str(i), vector, {}) for i, vector in enumerate(vectors))
+        index.save()
+        print(f"vectors: {args.vectors} x {args.dimension}, top {args.top_k}")
+
+        exact, latencies = run_queries(LocalIndex(folder), queries, args.top_k)
+        report("float32", vectors.nbytes, latencies, 1.0)
+        for kind in ("int8", "binary"):
+            start = time.perf_counter()
+            index.quantize(kind)  # type: ignore[arg-type]
+            print(f"{kind} codes built in {time.perf_counter() - start:.1f}s")
+            memory = QuantizedVectors.load(os.path.join(folder, QUANTIZED_FILE)).codes.nbytes
+            for rescore in args.rescore:
+                quantized = LocalIndex(folder, rescore=rescore)
+                found, latencies = run_queries(quantized, queries, args.top_k)
+                recall = np.mean([len(a & b) / len(a) for a, b in zip(exact, found)])
+                report(f"{kind} rescore={rescore}", memory, latencies, float(recall))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark comparing the thread-based crawler with the asyncio crawler.
+
+Both crawl a local synthetic site of interlinked pages that answers every request after a fixed latency, with the
+same cookies and user agent, and save every page the way `make scrape` does.
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+from typing import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from regent_rag import scrape
+from regent_rag.core.crawler import CrawlStats
+from tests.fakes import FakeSite
+
+COOKIES = {"session": "benchmark"}
+USER_AGENT = "bench-scrape"
+
+
+def run_threads(url: str, workers: int) -> CrawlStats:
+    with requests.Session() as session:
+        session.cookies.update(COOKIES)
+        session.headers.update({"User-Agent": USER_AGENT})
+        adapter = HTTPAdapter(pool_maxsize=workers)
+        session.mount("http://", adapter)
+        return scrape.scrape_website(session, url, workers)
+
+
+def run_async(url: str, concurrency: int) -> CrawlStats:
+    return asyncio.run(scrape.scrape_website_async(COOKIES, USER_AGENT, url, concurrency))
+
+
+def measure(name: str, crawl: Callable[[str], CrawlStats], args: argparse.Namespace) -> None:
+    with (
+        FakeSite(pages=args.pages, links=args.links, latency=args.latency) as site,
+        tempfile.TemporaryDirectory() as folder,
+    ):
+        scrape.SCRAPE_FOLDER = folder  # type: ignore
+        start = time.perf_counter()
+        stats = crawl(site.url)
+        elapsed = time.perf_counter() - start
+    print(
+        f"{name:<28} {stats.fetched:>6} pages {elapsed:>7.2f}s {stats.fetched / elapsed:>8.1f} pages/s "
+        f"{len(site.connections):>5} connections"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=2000, help="number of pages on the synthetic site")
+    parser.add_argument("--links", type=int, default=5, help="links per page")
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds before the site answers a request")
+    parser.add_argument("--workers", type=int, default=10, help="threads of the thread-based crawler")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[50, 200, 1000], help="concurrent downloads of the async crawler"
+    )
+    args = parser.parse_args()
+
+    # A log line per downloaded page would dominate the time of both crawlers
+    logging.getLogger("SingletonLogger").setLevel(logging.WARNING)
+    measure(f"threads (workers={args.workers})", lambda url: run_threads(url, args.workers), args)
+    for concurrency in args.concurrency:
+        measure(f"async (concurrency={concurrency})", lambda url, c=concurrency: run_async(url, c), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark of splitting scraped pages into chunks on a thread pool and on process pools of 1 to N processes.
+
+The corpus is synthetic pages of a few thousand words in paragraphs, written to a temporary scrape folder.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from regent_rag.core.crawl_manifest import scrape_filename
+from regent_rag.splits import split_files
+
+WORDS = "lease car staff policy travel expense certificate font logo office meeting holiday salary report".split()
+
+
+def write_corpus(folder: str, pages: int, words: int) -> list[str]:
+    rng = random.Random(0)
+    file_paths = []
+    for i in range(pages):
+        url = f"https://intern.regent.se/en/page-{i}/"
+        paragraphs = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))) for _ in range(words // 80)]
+        file_path = scrape_filename(folder, url)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "content": "\n\n".join(paragraphs)}, f)
+        file_paths.append(file_path)
+    return file_paths
+
+
+def measure(name: str, file_paths: list[str], executor: str, workers: int, baseline: float = 0.0) -> float:
+    start = time.perf_counter()
+    chunks = split_files(file_paths, executor, workers)  # type: ignore[arg-type]
+    elapsed = time.perf_counter() - start
+    speedup = f"{baseline / elapsed:>5.2f}x" if baseline else ""
+    print(f"{name:<16} {len(chunks):>7} chunks {elapsed:>7.2f}s {len(file_paths) / elapsed:>8.1f} pages/s {speedup}")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=400, help="number of pages in the corpus")
+    parser.add_argument("--words", type=int, default=3000, help="words per page")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="largest process pool")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_paths = write_corpus(folder, args.pages, args.words)
+        print(f"Cores: {os.cpu_count()}")
+        measure("threads (4)", file_paths, "threads", 4)
+        baseline = measure("processes (1)", file_paths, "processes", 1)
+        # Powers of two up to the number of cores, and the number of cores itself
+        for workers in sorted({2**i for i in range(1, args.max_workers.bit_length())} | {args.max_workers} - {1}):
+            measure(f"processes ({workers})", file_paths, "processes", workers, baseline)
+
+
+if __name__ == "__main__":
+    main()
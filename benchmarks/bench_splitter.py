@@ -0,0 +1,72 @@
+"""
+Benchmark comparing the token splitter of `make splits` with LangChain's RecursiveCharacterTextSplitter measuring
+length with tiktoken, at the same chunk size and overlap.
+
+Documents are synthetic text of growing length, PDF-like (short lines, with a paragraph break every few lines) and
+PPTX-like (one long line of words, with no line breaks to split on). Reports the time to split each document and how
+close the chunks come to the chunk size, in tokens.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import Callable
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from regent_rag.splits import TokenSplitter, tiktoken_len, tokenizer
+
+WORDS = "lease car staff policy travel expense certificate font logo office meeting holiday salary report".split()
+CHUNK_SIZE = 600
+CHUNK_OVERLAP = 100
+
+
+def make_document(rng: random.Random, words: int, line_breaks: bool = True) -> str:
+    lines = []
+    while words > 0:
+        line = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+        if line_breaks:
+            lines.append(" ".join(line) + ("\n\n" if rng.random() < 0.15 else "\n"))
+        else:
+            lines.append(" ".join(line) + ". ")
+        words -= len(line)
+    return "".join(lines)
+
+
+def measure(name: str, split: Callable[[str], list[str]], document: str) -> None:
+    start = time.perf_counter()
+    chunks = split(document)
+    elapsed = time.perf_counter() - start
+    sizes = [tiktoken_len(chunk) for chunk in chunks]
+    over = sum(size > CHUNK_SIZE for size in sizes)
+    print(
+        f"  {name:<10} {elapsed:>8.3f}s {len(chunks):>5} chunks {statistics.mean(sizes):>6.0f} mean tokens "
+        f"{min(sizes):>4}-{max(sizes):<4} range {over:>3} over {CHUNK_SIZE}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, nargs="+", default=[2_000, 10_000, 50_000, 200_000], help="document sizes")
+    args = parser.parse_args()
+
+    recursive = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=tiktoken_len,
+        separators=["\n\n", "\n", " ", ""],
+    )
+    token = TokenSplitter(tokenizer, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+    rng = random.Random(0)
+    for line_breaks in (True, False):
+        for words in args.words:
+            document = make_document(rng, words, line_breaks)
+            print(f"{'PDF' if line_breaks else 'PPTX'}-like, {words} words, {tiktoken_len(document)} tokens")
+            measure("recursive", recursive.split_text, document)
+            measure("token", token.split_text, document)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Load test comparing the sync Flask /chat view with the async aiohttp /chat endpoint.
+
+Both apps share a RagPipeline built from fake local LLM, embedding and vector store backends with a fixed
+latency, so the numbers reflect how many questions each serving mode keeps in flight, not OpenAI or Pinecone.
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import TCPConnector
+from aiohttp.test_utils import TestClient, TestServer
+
+from regent_rag import app as sync_app
+from regent_rag import async_app
+from regent_rag.core.settings import get_settings
+from regent_rag.pipeline import RagPipeline
+from tests.fakes import fake_builder
+
+QUESTION = "How long is the lease time for a staff car?"
+
+
+def run_sync(pipeline: RagPipeline, requests: int, workers: int) -> float:
+    """
+    Send the requests to the Flask view from `workers` threads, like a pool of sync workers would serve them.
+    """
+    app = sync_app.create_app(pipeline)
+
+    def post(_: int) -> None:
+        with app.test_client() as client:
+            response = client.post("/chat", json={"query": QUESTION})
+            assert response.status_code == 200
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(post, range(requests)))
+    return time.perf_counter() - start
+
+
+async def run_async(pipeline: RagPipeline, requests: int) -> float:
+    """
+    Send all requests at once to the aiohttp endpoint served by a single event loop.
+    """
+    server = TestServer(async_app.create_app(pipeline))
+    async with TestClient(server, connector=TCPConnector(limit=0)) as client:
+
+        async def post() -> None:
+            response = await client.post("/chat", json={"query": QUESTION})
+            assert response.status == 200
+            await response.json()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(post() for _ in range(requests)))
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200, help="number of questions to send")
+    parser.add_argument("--sync-workers", type=int, default=4, help="number of sync workers serving the Flask view")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="seconds per fake LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.02, help="seconds per fake vector search")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="seconds per fake embedding call")
+    parser.add_argument(
+        "--retrieval-mode", choices=["plain", "multi_query", "adaptive"], help="override RETRIEVAL_MODE"
+    )
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if args.retrieval_mode:
+        settings = settings.model_copy(update={"retrieval_mode": args.retrieval_mode})
+    builder = fake_builder(args.llm_latency, args.search_latency, args.embed_latency)
+    pipeline = RagPipeline(settings, builder=builder)
+
+    sync_seconds = run_sync(pipeline, args.requests, args.sync_workers)
+    async_seconds = asyncio.run(run_async(pipeline, args.requests))
+
+    print(f"requests:     {args.requests}, retrieval mode: {settings.retrieval_mode}")
+    print(f"sync  (Flask, {args.sync_workers} workers): {sync_seconds:.2f}s, {args.requests / sync_seconds:.1f} req/s")
+    print(f"async (aiohttp, 1 loop):   {async_seconds:.2f}s, {args.requests / async_seconds:.1f} req/s")
+    print(f"speedup:      {sync_seconds / async_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
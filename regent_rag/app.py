@@ -1,14 +1,65 @@
-from flask import Flask, request
+import json
+from typing import Iterator, Optional
+
+from flask import Flask, Response, request, stream_with_context
 from flask_cors import CORS
 
-from regent_rag.retrieval import retrieve_answer
+from regent_rag.core.settings import get_settings
+from regent_rag.core.sse import format_sse
+from regent_rag.pipeline import RagPipeline, batch_queries_error, get_pipeline
+
+
+def create_app(pipeline: Optional[RagPipeline] = None) -> Flask:
+    app = Flask(__name__)
+    CORS(app)
+
+    # Build the pipeline once at startup, every request shares the same clients and chain
+    pipeline = pipeline or get_pipeline()
+
+    @app.route("/chat", methods=["POST"])
+    def ask():
+        query = request.json["query"]
+        result = pipeline.ask(query)
+        return {"answer": result["answer"], "sources": result["sources"]}
+
+    @app.route("/chat/stream", methods=["POST"])
+    def ask_stream():
+        query = request.json["query"]
+
+        def events() -> Iterator[str]:
+            for event, data in pipeline.stream(query):
+                yield format_sse(event, data)
+
+        return Response(
+            stream_with_context(events()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.route("/chat/batch", methods=["POST"])
+    def ask_batch():
+        body = request.get_json(silent=True)
+        error = batch_queries_error(body, get_settings().batch_max_queries)
+        if error is not None:
+            return {"error": error}, 400
+        queries = body["queries"]
+
+        def lines() -> Iterator[str]:
+            for result in pipeline.ask_batch(queries):
+                yield json.dumps(result) + "\n"
+
+        return Response(
+            stream_with_context(lines()),
+            mimetype="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
-app = Flask(__name__)
-CORS(app)
+    @app.route("/cache/stats", methods=["GET"])
+    def cache_stats():
+        return pipeline.cache_stats()
 
+    @app.route("/embeddings/stats", methods=["GET"])
+    def embedding_batch_stats():
+        return pipeline.embedding_batch_stats()
 
-@app.route("/chat", methods=["POST"])
-def ask():
-    query = request.json["query"]
-    result = retrieve_answer(query)
-    return {"answer": result["answer"], "sources": result["sources"]}
+    return app
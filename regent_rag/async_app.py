@@ -0,0 +1,116 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+from aiohttp import web
+
+from regent_rag.core.logging import logger
+from regent_rag.core.settings import get_settings
+from regent_rag.core.sse import format_sse
+from regent_rag.pipeline import RagPipeline, batch_queries_error, get_pipeline
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+@web.middleware
+async def preflight_middleware(request: web.Request, handler: Handler) -> web.StreamResponse:
+    """
+    Answer CORS preflight requests, the CORS headers themselves are added by `add_cors_headers`.
+    """
+    if request.method == "OPTIONS":
+        return web.Response()
+    return await handler(request)
+
+
+async def add_cors_headers(_: web.Request, response: web.StreamResponse) -> None:
+    """
+    Allow the React frontend to call the API from another origin, like flask_cors does for the sync app.
+    Added just before the headers are sent, so that streamed responses get them too.
+    """
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+
+
+async def ask(request: web.Request) -> web.Response:
+    body = await request.json()
+    query = body["query"]
+    result = await request.app["pipeline"].aask(query)
+    return web.json_response({"answer": result["answer"], "sources": result["sources"]})
+
+
+async def ask_stream(request: web.Request) -> web.StreamResponse:
+    body = await request.json()
+    query = body["query"]
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    async for event, data in request.app["pipeline"].astream(query):
+        await response.write(format_sse(event, data).encode("utf-8"))
+    await response.write_eof()
+    return response
+
+
+async def ask_batch(request: web.Request) -> web.StreamResponse:
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        body = None
+    error = batch_queries_error(body, get_settings().batch_max_queries)
+    if error is not None:
+        return web.json_response({"error": error}, status=400)
+    queries = body["queries"]
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    async for result in request.app["pipeline"].aask_batch(queries):
+        await response.write((json.dumps(result) + "\n").encode("utf-8"))
+    await response.write_eof()
+    return response
+
+
+async def cache_stats(request: web.Request) -> web.Response:
+    return web.json_response(request.app["pipeline"].cache_stats())
+
+
+async def embedding_batch_stats(request: web.Request) -> web.Response:
+    return web.json_response(request.app["pipeline"].embedding_batch_stats())
+
+
+async def on_startup(app: web.Application) -> None:
+    # Blocking clients (e.g. the Pinecone vector store) are run in the default executor,
+    # make it large enough to not become the bottleneck for hundreds of in-flight questions
+    executor = ThreadPoolExecutor(max_workers=get_settings().async_executor_workers)
+    asyncio.get_running_loop().set_default_executor(executor)
+    app["executor"] = executor
+
+
+async def on_cleanup(app: web.Application) -> None:
+    app["executor"].shutdown(wait=False)
+
+
+def create_app(pipeline: Optional[RagPipeline] = None) -> web.Application:
+    app = web.Application(middlewares=[preflight_middleware])
+
+    # Build the pipeline once at startup, every request shares the same clients and chain
+    app["pipeline"] = pipeline or get_pipeline()
+
+    app.router.add_post("/chat", ask)
+    app.router.add_post("/chat/stream", ask_stream)
+    app.router.add_post("/chat/batch", ask_batch)
+    app.router.add_get("/cache/stats", cache_stats)
+    app.router.add_get("/embeddings/stats", embedding_batch_stats)
+    app.on_response_prepare.append(add_cors_headers)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main() -> None:
+    logger.info("Starting async server...")
+    web.run_app(create_app(), port=5000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import json
+import sys
+from typing import Iterable, List, TextIO
+
+from regent_rag.core.logging import logger
+from regent_rag.pipeline import get_pipeline
+
+
+def read_queries(lines: Iterable[str]) -> List[str]:
+    """
+    Reads the questions to answer, one per line, either as plain text or as JSON objects with a "query" key like the
+    /chat request body. Blank lines are skipped.
+
+    Args:
+        lines (Iterable[str]): The lines of the input.
+
+    Returns:
+        List[str]: The questions, in order.
+    """
+    queries = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+    return queries
+
+
+def write_answers(queries: List[str], output: TextIO) -> int:
+    """
+    Answers the questions in bulk and writes every result as a JSON line as soon as it is ready.
+
+    Args:
+        queries (List[str]): The questions to answer.
+        output (TextIO): Where to write the results.
+
+    Returns:
+        int: The number of questions that failed.
+    """
+    failed = 0
+    for result in get_pipeline().ask_batch(queries):
+        failed += "error" in result
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Answer a list of questions, writing the answers in JSONL.")
+    parser.add_argument("input", nargs="?", help="file with one question per line, stdin if omitted")
+    parser.add_argument("--output", "-o", help="file to write the answers to, stdout if omitted")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as file:
+            queries = read_queries(file)
+    else:
+        queries = read_queries(sys.stdin)
+    logger.info(f"Answering {len(queries)} questions from {args.input or 'stdin'}...")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            failed = write_answers(queries, output)
+    else:
+        failed = write_answers(queries, sys.stdout)
+    logger.info(f"Answered {len(queries) - failed} questions, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
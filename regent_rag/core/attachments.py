@@ -0,0 +1,143 @@
+import os
+import signal
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from types import FrameType
+from typing import Any, Callable, Optional
+
+from regent_rag.core.extractors import iter_pdf_pages, iter_pptx_slides
+from regent_rag.core.logging import logger
+
+# The pages of a file: the number of every page with text, and its text
+Pages = list[tuple[int, str]]
+
+
+class ExtractionTimeout(BaseException):
+    """
+    Raised in a worker process when extracting a file takes longer than the time limit.
+
+    Like KeyboardInterrupt it is not an Exception, pypdf catches and recovers from those while parsing.
+    """
+
+
+def init_worker() -> None:
+    """
+    Prepares a worker process of the pool, leaving Ctrl-C to the crawl in the parent.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _raise_timeout(signum: int, frame: Optional[FrameType]) -> None:
+    raise ExtractionTimeout()
+
+
+def extract_pages(url: str, content: bytes, timeout: float = 0.0) -> Pages:
+    """
+    Extracts the text of a PDF or PPTX file page by page. Runs in a worker process of the pool.
+
+    Parameters:
+    url (str): The URL of the file, its extension tells the format.
+    content (bytes): The content of the file.
+    timeout (float): Seconds after which the extraction is abandoned, no limit if 0.
+
+    Returns:
+    Pages: The number and text of every page with text.
+    """
+    pages = iter_pdf_pages(content) if url.endswith(".pdf") else iter_pptx_slides(content)
+    # A timer signal interrupts the extraction wherever it is stuck, without losing the worker process
+    use_timer = timeout > 0 and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if use_timer:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return list(pages)
+    finally:
+        if use_timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+class AttachmentExtractor:
+    """
+    Extracts the text of PDF and PPTX files on a pool of processes, so that parsing large files neither holds up
+    the thread or event loop that downloaded them nor, through the GIL, the other downloads.
+
+    Files larger than `max_bytes` are skipped and extractions that take longer than `timeout` are abandoned, both
+    are counted in `skipped`. The callback of a file runs once its pages are extracted, on a thread of the pool.
+    At most two files per process wait for extraction, further files wait to be submitted, so that the content of
+    downloaded files does not pile up in memory when they are downloaded faster than they are extracted.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_bytes: int = 50_000_000, timeout: float = 60.0) -> None:
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.extracted = 0
+        self.skipped = 0
+        workers = workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+        self._pending = threading.BoundedSemaphore(workers * 2)
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "AttachmentExtractor":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def submit(self, url: str, content: bytes, on_pages: Callable[[Pages], None]) -> Optional[Future]:
+        """
+        Queues a file for extraction, waiting while too many files are queued already.
+
+        Args:
+            url (str): The URL of the file.
+            content (bytes): The content of the file.
+            on_pages (Callable[[Pages], None]): Called with the pages of the file once they are extracted, not called
+                if the file is skipped or can't be extracted.
+
+        Returns:
+            Optional[Future]: The pending extraction, or None if the file is too large.
+        """
+        if len(content) > self.max_bytes:
+            logger.warning(f"{url} is larger than {self.max_bytes} bytes, skipping it")
+            self._count(skipped=1)
+            return None
+        self._pending.acquire()  # pylint: disable=consider-using-with
+        try:
+            future = self._pool.submit(extract_pages, url, content, self.timeout)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda done: self._done(url, done, on_pages))
+        return future
+
+    def close(self) -> None:
+        """
+        Waits for the queued files to be extracted and their callbacks to finish, and stops the worker processes.
+        """
+        self._pool.shutdown(wait=True)
+
+    def _done(self, url: str, future: Future, on_pages: Callable[[Pages], None]) -> None:
+        self._pending.release()
+        try:
+            pages = future.result()
+        except ExtractionTimeout:
+            logger.warning(f"Extracting {url} took longer than {self.timeout}s, skipping it")
+            self._count(skipped=1)
+            return
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error(f"Failed to extract {url}: {e!r}")
+            self._count(skipped=1)
+            return
+        try:
+            on_pages(pages)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Exceptions in done callbacks are only logged by the pool, and without the URL
+            logger.error(f"Failed to save {url}: {e!r}")
+            self._count(skipped=1)
+            return
+        self._count(extracted=1)
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
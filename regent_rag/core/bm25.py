@@ -0,0 +1,191 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+BM25_FOLDER = "bm25"
+POSTINGS_FILE = "postings.npz"
+VOCABULARY_FILE = "vocabulary.json"
+DOCUMENTS_FILE = "documents.jsonl"
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits a text into lowercase word tokens, keeping numbers like "9001" as tokens of their own.
+
+    Parameters:
+    text (str): The text to tokenize.
+
+    Returns:
+    list[str]: The tokens.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class Bm25Index:
+    """
+    An inverted index over chunks, ranking them by Okapi BM25.
+
+    The postings of all terms are stored back to back in flat arrays, with `offsets[t]:offsets[t + 1]` the
+    range of term `t`, so that scoring a query term is a vectorized update of the scores of the chunks it occurs in.
+    """
+
+    def __init__(
+        self,
+        vocabulary: dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        documents: list[dict[str, Any]],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        # The length normalization of the BM25 term frequency only depends on the chunk, compute it once
+        average_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self._length_norms = k1 * (1 - b + b * doc_lengths / (average_length or 1.0))
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def build(cls, documents: Iterable[dict[str, Any]]) -> "Bm25Index":
+        """
+        Builds the index over chunks.
+
+        Parameters:
+        documents (Iterable[dict[str, Any]]): The chunks, with an "id", "text" and "source".
+
+        Returns:
+        Bm25Index: The index.
+        """
+        vocabulary: dict[str, int] = {}
+        term_ids: list[int] = []
+        doc_ids: list[int] = []
+        term_freqs: list[int] = []
+        doc_lengths: list[int] = []
+        stored: list[dict[str, Any]] = []
+        for doc_id, document in enumerate(documents):
+            tokens = tokenize(document["text"])
+            for term, count in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                term_freqs.append(count)
+            doc_lengths.append(len(tokens))
+            stored.append({"id": document["id"], "text": document["text"], "source": document["source"]})
+            if "page" in document:
+                stored[-1]["page"] = document["page"]
+            if len(document.get("sources", [])) > 1:
+                stored[-1]["sources"] = document["sources"]
+
+        order = np.argsort(np.asarray(term_ids, dtype=np.int64), kind="stable")
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(np.asarray(term_ids, dtype=np.int64), minlength=len(vocabulary)))
+        return cls(
+            vocabulary,
+            offsets,
+            np.asarray(doc_ids, dtype=np.int32)[order],
+            np.asarray(term_freqs, dtype=np.float32)[order],
+            np.asarray(doc_lengths, dtype=np.float32),
+            stored,
+        )
+
+    def search(self, query: str, k: int = 10) -> list[tuple[int, float]]:
+        """
+        Finds the chunks that best match the query.
+
+        Parameters:
+        query (str): The query.
+        k (int): The maximum number of chunks to return.
+
+        Returns:
+        list[tuple[int, float]]: The position of each matching chunk in `documents` and its score, best first.
+        """
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end]
+            idf = math.log(1 + (len(self.documents) - len(docs) + 0.5) / (len(docs) + 0.5))
+            # Each chunk occurs once in the postings of a term, so a plain fancy-indexed add is safe
+            scores[docs] += idf * freqs * (self.k1 + 1) / (freqs + self._length_norms[docs])
+
+        matches = np.flatnonzero(scores)
+        if len(matches) > k:
+            matches = matches[np.argpartition(-scores[matches], k - 1)[:k]]
+        matches = matches[np.argsort(-scores[matches], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in matches]
+
+    def save(self, folder: str) -> None:
+        """
+        Writes the index to a folder.
+
+        Parameters:
+        folder (str): The folder to write the index to.
+
+        Returns:
+        None
+        """
+        os.makedirs(folder, exist_ok=True)
+        postings_path = os.path.join(folder, POSTINGS_FILE)
+        with open(f"{postings_path}.tmp", "wb") as f:
+            np.savez_compressed(
+                f,
+                offsets=self.offsets,
+                doc_ids=self.doc_ids,
+                term_freqs=self.term_freqs.astype(np.uint16),
+                doc_lengths=self.doc_lengths.astype(np.uint32),
+            )
+        vocabulary_path = os.path.join(folder, VOCABULARY_FILE)
+        with open(f"{vocabulary_path}.tmp", "w", encoding="utf-8") as f:
+            # Term IDs are positions in the list, which is smaller than storing the mapping
+            json.dump(sorted(self.vocabulary, key=self.vocabulary.__getitem__), f, ensure_ascii=False)
+        documents_path = os.path.join(folder, DOCUMENTS_FILE)
+        with open(f"{documents_path}.tmp", "w", encoding="utf-8") as f:
+            for document in self.documents:
+                f.write(json.dumps(document) + "\n")
+
+        for path in (postings_path, vocabulary_path, documents_path):
+            os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, folder: str) -> Optional["Bm25Index"]:
+        """
+        Reads an index written by `save`.
+
+        Parameters:
+        folder (str): The folder the index was written to.
+
+        Returns:
+        Optional[Bm25Index]: The index, or None if the folder holds no index.
+        """
+        postings_path = os.path.join(folder, POSTINGS_FILE)
+        if not os.path.isfile(postings_path):
+            return None
+        with np.load(postings_path) as postings:
+            offsets = postings["offsets"]
+            doc_ids = postings["doc_ids"]
+            term_freqs = postings["term_freqs"].astype(np.float32)
+            doc_lengths = postings["doc_lengths"].astype(np.float32)
+        with open(os.path.join(folder, VOCABULARY_FILE), "r", encoding="utf-8") as f:
+            vocabulary = {term: term_id for term_id, term in enumerate(json.load(f))}
+        with open(os.path.join(folder, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+            documents = [json.loads(line) for line in f]
+        return cls(vocabulary, offsets, doc_ids, term_freqs, doc_lengths, documents)
@@ -0,0 +1,119 @@
+import hashlib
+import re
+from array import array
+from typing import AbstractSet, Iterator
+
+import numpy as np
+
+# Pages are extracted with their blocks (paragraphs, list items, table cells...) separated by blank lines
+BLOCK_SEPARATOR_PATTERN = re.compile(r"\n\s*\n")
+
+
+def iter_blocks(text: str) -> Iterator[tuple[int, int]]:
+    """
+    Finds the blocks of a page, the text between blank lines.
+
+    Parameters:
+    text (str): The text of the page.
+
+    Returns:
+    Iterator[tuple[int, int]]: The start and end character offset of every block, in order.
+    """
+    start = 0
+    for match in BLOCK_SEPARATOR_PATTERN.finditer(text):
+        yield start, match.start()
+        start = match.end()
+    yield start, len(text)
+
+
+def block_hash(block: str) -> int:
+    """
+    Hashes a block to 64 bits, ignoring differences in whitespace.
+
+    Parameters:
+    block (str): The text of the block.
+
+    Returns:
+    int: The hash, 0 for a block without text.
+    """
+    normalized = " ".join(block.split())
+    if not normalized:
+        return 0
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class BlockCounter:
+    """
+    Counts on how many pages every block occurs, to find the template blocks like menus, sidebars and cookie banners
+    that repeat on many pages of a site.
+
+    Only the 64-bit hashes of the distinct blocks of every page are kept, in one flat array that is counted once all
+    pages are added, so the pages can be streamed through it.
+    """
+
+    def __init__(self) -> None:
+        self.pages = 0
+        self._hashes = array("Q")
+
+    def add(self, text: str) -> None:
+        """
+        Counts the blocks of a page.
+
+        Args:
+            text (str): The text of the page.
+        """
+        self.pages += 1
+        hashes = {block_hash(text[start:end]) for start, end in iter_blocks(text)}
+        hashes.discard(0)
+        self._hashes.extend(hashes)
+
+    def boilerplate(self, fraction: float, min_pages: int) -> frozenset[int]:
+        """
+        Finds the blocks that occur on at least a fraction of the pages.
+
+        Args:
+            fraction (float): The fraction of the pages a block must occur on.
+            min_pages (int): The number of pages a block must occur on at least, so that in a small corpus a block
+                on two pages is not boilerplate.
+
+        Returns:
+            frozenset[int]: The hashes of the boilerplate blocks.
+        """
+        if not self._hashes:
+            return frozenset()
+        hashes, counts = np.unique(np.frombuffer(self._hashes, dtype=np.uint64), return_counts=True)
+        frequent = hashes[counts >= max(fraction * self.pages, min_pages)]
+        return frozenset(int(value) for value in frequent)
+
+
+def strip_blocks(text: str, boilerplate: AbstractSet[int]) -> tuple[str, list[tuple[int, int]]]:
+    """
+    Removes the boilerplate blocks from a page.
+
+    Parameters:
+    text (str): The text of the page.
+    boilerplate (AbstractSet[int]): The hashes of the blocks to remove.
+
+    Returns:
+    tuple[str, list[tuple[int, int]]]: The text of the remaining blocks separated by blank lines, and for each of
+    them where it starts in that text and where it started in the page, to map offsets back to the page. The text
+    is returned as is if no block is removed.
+    """
+    if not boilerplate:
+        return text, [(0, 0)]
+    blocks = list(iter_blocks(text))
+    kept = [(start, end) for start, end in blocks if block_hash(text[start:end]) not in boilerplate]
+    if len(kept) == len(blocks):
+        return text, [(0, 0)]
+
+    parts: list[str] = []
+    segments = []
+    offset = 0
+    for start, end in kept:
+        if parts:
+            parts.append("\n\n")
+            offset += 2
+        segments.append((offset, start))
+        parts.append(text[start:end])
+        offset += end - start
+    return "".join(parts), segments
@@ -0,0 +1,97 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+SCRAPE_CHANGES_FILE = "scrape_changes.json"
+SPLITS_CHANGES_FILE = "splits_changes.json"
+
+
+@dataclass
+class SourceChanges:
+    """
+    The sources (page URLs) whose content changed or was removed since a stage of the pipeline last ran.
+    """
+
+    changed: set[str] = field(default_factory=set)
+    removed: set[str] = field(default_factory=set)
+
+    @property
+    def sources(self) -> set[str]:
+        return self.changed | self.removed
+
+    def merge(self, later: "SourceChanges") -> "SourceChanges":
+        """
+        Combines these changes with the changes of a later run, the later one wins for sources in both.
+
+        Args:
+            later (SourceChanges): The changes of the later run.
+
+        Returns:
+            SourceChanges: The changes of both runs.
+        """
+        return SourceChanges(
+            changed=(self.changed - later.removed) | later.changed,
+            removed=(self.removed - later.changed) | later.removed,
+        )
+
+    @classmethod
+    def load(cls, file_path: str) -> Optional["SourceChanges"]:
+        """
+        Reads changes written by `save`.
+
+        Args:
+            file_path (str): The path to the changes file.
+
+        Returns:
+            Optional[SourceChanges]: The changes, or None if there is no changes file.
+        """
+        if not os.path.isfile(file_path):
+            return None
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(changed=set(data["changed"]), removed=set(data["removed"]))
+
+    def save(self, file_path: str) -> None:
+        """
+        Writes the changes, replacing the previous file atomically.
+
+        Args:
+            file_path (str): The path to the changes file.
+        """
+        tmp_file_path = f"{file_path}.tmp"
+        with open(tmp_file_path, "w", encoding="utf-8") as f:
+            json.dump({"changed": sorted(self.changed), "removed": sorted(self.removed)}, f, indent=2)
+        os.replace(tmp_file_path, file_path)
+
+
+def add_pending_changes(file_path: str, changes: SourceChanges) -> SourceChanges:
+    """
+    Adds changes to those not yet processed by the next stage, so that running a stage twice before the next one
+    runs loses nothing.
+
+    Parameters:
+    file_path (str): The path to the changes file of the next stage.
+    changes (SourceChanges): The changes to add.
+
+    Returns:
+    SourceChanges: All pending changes.
+    """
+    pending = SourceChanges.load(file_path)
+    changes = pending.merge(changes) if pending is not None else changes
+    changes.save(file_path)
+    return changes
+
+
+def clear_pending_changes(file_path: str) -> None:
+    """
+    Removes the pending changes of a stage, after it processed them or when it has to process everything.
+
+    Parameters:
+    file_path (str): The path to the changes file.
+
+    Returns:
+    None
+    """
+    if os.path.isfile(file_path):
+        os.remove(file_path)
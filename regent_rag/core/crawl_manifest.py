@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import threading
+import urllib.parse
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from regent_rag.core.changes import SourceChanges
+from regent_rag.core.logging import logger
+
+CRAWL_MANIFEST_FILE = "crawl_manifest.json"
+
+
+def scrape_filename(folder: str, url: str) -> str:
+    """
+    The file the content of a page is saved to.
+
+    Parameters:
+    folder (str): The scrape folder.
+    url (str): The URL of the page.
+
+    Returns:
+    str: The path to the file.
+    """
+    return os.path.join(folder, f"{urllib.parse.quote_plus(url)}.json")
+
+
+def text_hash(text: str) -> str:
+    """
+    Hashes the saved content of a page, used to detect pages whose content did not change.
+
+    Parameters:
+    text (str): The content.
+
+    Returns:
+    str: The hex digest of the content.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class CrawlEntry:
+    """
+    What is known about a page from the last time it was downloaded.
+    """
+
+    content_hash: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    links: list[str] = field(default_factory=list)
+
+
+class CrawlManifest:
+    """
+    The pages saved by the previous crawls, used to send conditional requests, to leave unchanged pages alone and to
+    find the pages that changed or disappeared.
+
+    A page is kept as long as the crawl reaches it: pages that could not be downloaded keep their previous content,
+    pages that are no longer linked to or answer 404 are removed.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self._entries: dict[str, CrawlEntry] = {}
+        self._visited: set[str] = set()
+        self._changed: set[str] = set()
+        self._gone: set[str] = set()
+        self._lock = threading.Lock()
+        if os.path.isfile(file_path):
+            with open(file_path, "r", encoding="utf-8") as f:
+                self._entries = {url: CrawlEntry(**entry) for url, entry in json.load(f).items()}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def visit(self, url: str) -> dict[str, str]:
+        """
+        Marks a page as reached by this crawl.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            dict[str, str]: The headers of a conditional request for the page, empty if it was not downloaded before.
+        """
+        with self._lock:
+            self._visited.add(url)
+            entry = self._entries.get(url)
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def not_modified(self, url: str) -> list[str]:
+        """
+        Keeps a page the server answered 304 Not Modified for, or that failed to download.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            list[str]: The links on the page, as found when it was last downloaded.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+        return list(entry.links) if entry is not None else []
+
+    def record(self, url: str, entry: CrawlEntry) -> bool:
+        """
+        Records a downloaded page.
+
+        Args:
+            url (str): The URL of the page.
+            entry (CrawlEntry): The validators, content hash and links of the page.
+
+        Returns:
+            bool: Whether the content of the page is new or changed.
+        """
+        with self._lock:
+            previous = self._entries.get(url)
+            self._entries[url] = entry
+            changed = previous is None or previous.content_hash != entry.content_hash
+            if changed:
+                self._changed.add(url)
+            return changed
+
+    def gone(self, url: str) -> None:
+        """
+        Marks a page the server answered 404 Not Found or 410 Gone for.
+
+        Args:
+            url (str): The URL of the page.
+        """
+        with self._lock:
+            self._gone.add(url)
+
+    def finish(self, scrape_folder: str) -> SourceChanges:
+        """
+        Removes the pages this crawl did not reach, or that are gone, and saves the manifest. Only call this after a
+        complete crawl, an aborted crawl reaches too few pages.
+
+        Args:
+            scrape_folder (str): The folder the pages are saved in. Saved pages that are not in the manifest, e.g.
+                from a crawl before the manifest existed, are removed as well if this crawl did not reach them.
+
+        Returns:
+            SourceChanges: The pages that changed or were removed since the previous crawl.
+        """
+        with self._lock:
+            saved = {
+                urllib.parse.unquote_plus(file[: -len(".json")])
+                for file in os.listdir(scrape_folder)
+                if file.endswith(".json")
+            }
+            known = saved | set(self._entries)
+            # Pages that failed to download were visited, they keep their entry and content until the next crawl
+            removed = (known - self._visited) | (known & self._gone)
+            for url in removed:
+                self._entries.pop(url, None)
+                path = scrape_filename(scrape_folder, url)
+                if os.path.isfile(path):
+                    os.remove(path)
+            changes = SourceChanges(changed=self._changed - removed, removed=removed)
+
+            tmp_file_path = f"{self.file_path}.tmp"
+            with open(tmp_file_path, "w", encoding="utf-8") as f:
+                json.dump({url: asdict(entry) for url, entry in self._entries.items()}, f)
+            os.replace(tmp_file_path, self.file_path)
+
+        logger.info(
+            f"{len(changes.changed)} pages changed and {len(changes.removed)} pages removed since the last crawl"
+        )
+        return changes
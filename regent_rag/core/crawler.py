@@ -0,0 +1,337 @@
+import asyncio
+import queue
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Optional
+
+from regent_rag.core.logging import logger
+
+
+class CrawlAborted(Exception):
+    """
+    Raised by a fetch function to stop the whole crawl, e.g. when the session turns out not to be authenticated.
+    """
+
+
+class FetchFailed(Exception):
+    """
+    Raised by a fetch function when a page could not be downloaded, e.g. when the server answered with an error.
+    """
+
+
+@dataclass
+class CrawlStats:
+    """
+    Counters describing a finished crawl.
+    """
+
+    fetched: int = 0
+    failed: int = 0
+    seen: int = 0
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """
+    Resolves a link against the page it was found on and normalizes it, so that every way of writing a URL
+    maps to the same key.
+
+    Parameters:
+    url (str): The URL or link.
+    base (Optional[str]): The URL of the page the link was found on.
+
+    Returns:
+    Optional[str]: The normalized URL, or None if it is not an http(s) URL.
+    """
+    url = urllib.parse.urljoin(base, url.strip()) if base else url.strip()
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https") or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower()
+    default_port = {"http": 80, "https": 443}[scheme]
+    netloc = host if parts.port in (None, default_port) else f"{host}:{parts.port}"
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    # The fragment only points within the page, it never changes what is fetched
+    return urllib.parse.urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+class HostLimiter:
+    """
+    Politeness limits per host: at most `concurrency` requests in flight (no limit if 0) and at least `delay`
+    seconds between the starts of two requests.
+    """
+
+    def __init__(self, concurrency: int = 0, delay: float = 0.0) -> None:
+        self.concurrency = concurrency
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self._next_start: dict[str, float] = {}
+
+    def acquire(self, host: str) -> None:
+        if self.concurrency:
+            with self._lock:
+                semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.concurrency))
+            semaphore.acquire()
+        wait = self._reserve_start(host)
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self, host: str) -> None:
+        if self.concurrency:
+            self._semaphores[host].release()
+
+    def _reserve_start(self, host: str) -> float:
+        # Reserve the next start slot of the host and return how long to wait for it, waiting happens outside the lock
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.delay
+        return start - now
+
+
+class AsyncHostLimiter(HostLimiter):
+    """
+    The politeness limits of HostLimiter for coroutines.
+    """
+
+    def __init__(self, concurrency: int = 0, delay: float = 0.0) -> None:
+        super().__init__(concurrency, delay)
+        self._async_semaphores: dict[str, asyncio.Semaphore] = {}
+
+    async def acquire_async(self, host: str) -> None:
+        if self.concurrency:
+            semaphore = self._async_semaphores.setdefault(host, asyncio.Semaphore(self.concurrency))
+            await semaphore.acquire()
+        wait = self._reserve_start(host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def release_async(self, host: str) -> None:
+        if self.concurrency:
+            self._async_semaphores[host].release()
+
+
+class _Frontier:
+    """
+    The URLs seen during a crawl. Every URL is normalized and admitted at most once, and links are only followed
+    to the allowed hosts. The links of a page whose fetch failed are taken from `failed_links`, if given, so that the
+    pages below it are still reached.
+    """
+
+    def __init__(
+        self,
+        allowed_hosts: Optional[Iterable[str]] = None,
+        failed_links: Optional[Callable[[str], Iterable[str]]] = None,
+    ) -> None:
+        self.allowed_hosts = {host.lower() for host in allowed_hosts} if allowed_hosts is not None else None
+        self.failed_links = failed_links
+        self._seen: set[str] = set()
+        self._lock = threading.Lock()
+        self._stats = CrawlStats()
+        self._aborted: Optional[CrawlAborted] = None
+
+    def _admit(self, url: str, base: Optional[str]) -> Optional[str]:
+        normalized = normalize_url(url, base)
+        if normalized is None:
+            return None
+        if self.allowed_hosts is not None and urllib.parse.urlsplit(normalized).netloc not in self.allowed_hosts:
+            return None
+        with self._lock:
+            if normalized in self._seen or self._aborted is not None:
+                return None
+            self._seen.add(normalized)
+        return normalized
+
+    def _abort(self, error: CrawlAborted) -> None:
+        with self._lock:
+            self._aborted = self._aborted or error
+
+    def _finish(self) -> CrawlStats:
+        if self._aborted is not None:
+            raise self._aborted
+        with self._lock:
+            self._stats.seen = len(self._seen)
+            return CrawlStats(**vars(self._stats))
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self._stats, name, getattr(self._stats, name) + value)
+
+    def _fail(self, url: str, error: Exception) -> list[str]:
+        logger.error(f"Failed to fetch {url}: {error!r}")
+        self._count(failed=1)
+        return list(self.failed_links(url)) if self.failed_links is not None else []
+
+
+class CrawlFrontier(_Frontier):
+    """
+    The set of URLs to crawl, fetched by a pool of worker threads.
+
+    The crawl returns once every enqueued URL has been fetched, or right after a fetch function raised CrawlAborted.
+    """
+
+    def __init__(
+        self,
+        allowed_hosts: Optional[Iterable[str]] = None,
+        host_limiter: Optional[HostLimiter] = None,
+        failed_links: Optional[Callable[[str], Iterable[str]]] = None,
+    ) -> None:
+        super().__init__(allowed_hosts, failed_links)
+        self.host_limiter = host_limiter or HostLimiter()
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+
+    def add(self, url: str, base: Optional[str] = None) -> bool:
+        """
+        Enqueue a URL, unless it has been seen before or is on another host.
+
+        Args:
+            url (str): The URL or link.
+            base (Optional[str]): The URL of the page the link was found on.
+
+        Returns:
+            bool: Whether the URL was enqueued.
+        """
+        normalized = self._admit(url, base)
+        if normalized is None:
+            return False
+        self._queue.put(normalized)
+        return True
+
+    def crawl(self, fetch: Callable[[str], Iterable[str]], workers: int = 10) -> CrawlStats:
+        """
+        Fetch every URL in the frontier, adding the links returned by `fetch` as they are found.
+
+        Args:
+            fetch (Callable[[str], Iterable[str]]): Downloads a page and returns the links on it.
+            workers (int): The number of worker threads.
+
+        Returns:
+            CrawlStats: Counters describing the crawl.
+        """
+        threads = [
+            threading.Thread(target=self._work, args=(fetch,), name=f"crawler-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Every URL is marked done after its links have been enqueued, so this only returns once nothing is left
+        self._queue.join()
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+        return self._finish()
+
+    def _work(self, fetch: Callable[[str], Iterable[str]]) -> None:
+        while (url := self._queue.get()) is not None:
+            try:
+                if self._aborted is None:
+                    self._fetch(fetch, url)
+            finally:
+                self._queue.task_done()
+        self._queue.task_done()
+
+    def _fetch(self, fetch: Callable[[str], Iterable[str]], url: str) -> None:
+        host = urllib.parse.urlsplit(url).netloc
+        self.host_limiter.acquire(host)
+        try:
+            links = list(fetch(url))
+        except CrawlAborted as e:
+            self._abort(e)
+            return
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            links = self._fail(url, e)
+        else:
+            self._count(fetched=1)
+        finally:
+            self.host_limiter.release(host)
+
+        for link in links:
+            self.add(link, base=url)
+
+
+class AsyncCrawlFrontier(_Frontier):
+    """
+    The set of URLs to crawl, fetched by coroutines on one event loop. The number of concurrent fetches is bounded
+    by a semaphore, so it can be in the thousands without a thread per request.
+    """
+
+    def __init__(
+        self,
+        allowed_hosts: Optional[Iterable[str]] = None,
+        host_limiter: Optional[AsyncHostLimiter] = None,
+        failed_links: Optional[Callable[[str], Iterable[str]]] = None,
+    ) -> None:
+        super().__init__(allowed_hosts, failed_links)
+        self.host_limiter = host_limiter or AsyncHostLimiter()
+        self._pending: list[str] = []
+
+    def add(self, url: str, base: Optional[str] = None) -> bool:
+        """
+        Add a URL to crawl, unless it has been seen before or is on another host.
+
+        Args:
+            url (str): The URL or link.
+            base (Optional[str]): The URL of the page the link was found on.
+
+        Returns:
+            bool: Whether the URL was added.
+        """
+        normalized = self._admit(url, base)
+        if normalized is None:
+            return False
+        self._pending.append(normalized)
+        return True
+
+    async def crawl(self, fetch: Callable[[str], Awaitable[Iterable[str]]], concurrency: int = 200) -> CrawlStats:
+        """
+        Fetch every URL in the frontier, adding the links returned by `fetch` as they are found.
+
+        Args:
+            fetch (Callable[[str], Awaitable[Iterable[str]]]): Downloads a page and returns the links on it.
+            concurrency (int): The maximum number of concurrent fetches.
+
+        Returns:
+            CrawlStats: Counters describing the crawl.
+        """
+        semaphore = asyncio.BoundedSemaphore(concurrency)
+        tasks: set[asyncio.Task] = set()
+        while self._pending or tasks:
+            while self._pending and self._aborted is None:
+                tasks.add(asyncio.create_task(self._fetch(fetch, self._pending.pop(), semaphore)))
+            if tasks:
+                # Links found by a finished fetch are added to the pending URLs and started on the next round
+                _, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            if self._aborted is not None:
+                self._pending.clear()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                tasks = set()
+        return self._finish()
+
+    async def _fetch(
+        self, fetch: Callable[[str], Awaitable[Iterable[str]]], url: str, semaphore: asyncio.BoundedSemaphore
+    ) -> None:
+        host = urllib.parse.urlsplit(url).netloc
+        async with semaphore:
+            await self.host_limiter.acquire_async(host)
+            try:
+                links = list(await fetch(url))
+            except CrawlAborted as e:
+                self._abort(e)
+                return
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                links = self._fail(url, e)
+            else:
+                self._count(fetched=1)
+            finally:
+                self.host_limiter.release_async(host)
+
+        for link in links:
+            self.add(link, base=url)
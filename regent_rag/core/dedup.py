@@ -0,0 +1,113 @@
+import zlib
+from typing import Any, Optional
+
+import numpy as np
+
+from regent_rag.core.bm25 import tokenize
+
+
+def duplicate_sources(chunk: dict[str, Any]) -> list[str]:
+    """
+    Gets the URLs of the duplicates that were collapsed into a chunk when splitting.
+
+    Parameters:
+    chunk (dict[str, Any]): The chunk, with the URLs of its whole group of duplicates in "sources".
+
+    Returns:
+    list[str]: The URLs in "sources" other than the chunk's own "source", in order.
+    """
+    return [source for source in chunk.get("sources", []) if source != chunk["source"]]
+
+
+class NearDuplicateIndex:
+    """
+    Groups texts that are the same or nearly the same, by MinHash signatures of their word shingles and
+    locality-sensitive hashing of the signatures.
+
+    The signature of a text is the minimum of `num_perm` hash functions over its shingles, and the fraction of
+    equal values in two signatures estimates the Jaccard similarity of their shingle sets. Signatures are cut into
+    `bands` bands, and a text is only compared with the groups it shares a whole band with, so adding a text takes
+    the same time however many texts were added before it. A text joins the first such group whose first text it
+    is at least `threshold` similar to.
+    """
+
+    def __init__(
+        self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16, shingle_size: int = 5, seed: int = 1
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError(f"{num_perm} hash functions can't be cut into {bands} bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # The hash functions are (a * x + b) mod 2 ** 32, which permute the 32-bit shingle hashes for odd a. Unlike
+        # modulo a prime they wrap around in uint32 arithmetic, which is several times faster.
+        self._a = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint32) | 1
+        self._b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint32)
+        self._shingle_weights = rng.integers(0, 1 << 32, size=shingle_size, dtype=np.uint32) | 1
+        self._word_hashes: dict[str, int] = {}
+        self._signatures: list[np.ndarray] = []
+        self._buckets: dict[tuple[int, bytes], int] = {}
+
+    def __len__(self) -> int:
+        """
+        The number of groups.
+        """
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Computes the MinHash signature of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            np.ndarray: The `num_perm` values of the signature.
+        """
+        hashes = self._word_hashes
+        words = np.array(
+            [hashes[word] if word in hashes else self._hash_word(word) for word in tokenize(text)], dtype=np.uint32
+        )
+        if len(words) == 0:
+            words = np.zeros(1, dtype=np.uint32)
+        # Hash every run of `shingle_size` words, or the whole text if it is shorter
+        size = min(self.shingle_size, len(words))
+        shingles = np.zeros(len(words) - size + 1, dtype=np.uint32)
+        for i in range(size):
+            shingles += words[i : len(words) - size + 1 + i] * self._shingle_weights[i]
+        return (self._a * shingles + self._b).min(axis=1)
+
+    def add(self, text: str) -> int:
+        """
+        Adds a text to the group of the first similar enough text, or to a new group.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The index of the group, groups are numbered in the order they are created.
+        """
+        signature = self.signature(text)
+        rows = self.num_perm // self.bands
+        keys = [(band, signature[band * rows : (band + 1) * rows].tobytes()) for band in range(self.bands)]
+        group = self._find(signature, keys)
+        if group is None:
+            group = len(self._signatures)
+            self._signatures.append(signature)
+            for key in keys:
+                self._buckets.setdefault(key, group)
+        return group
+
+    def _hash_word(self, word: str) -> int:
+        # Words repeat across chunks, so each is hashed once
+        self._word_hashes[word] = zlib.crc32(word.encode("utf-8"))
+        return self._word_hashes[word]
+
+    def _find(self, signature: np.ndarray, keys: list[tuple[int, bytes]]) -> Optional[int]:
+        candidates = dict.fromkeys(self._buckets[key] for key in keys if key in self._buckets)
+        for group in candidates:
+            if np.mean(self._signatures[group] == signature) >= self.threshold:
+                return group
+        return None
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from langchain.schema.embeddings import Embeddings
+
+
+@dataclass
+class BatchStats:
+    """
+    Counters describing how well query embeddings are batched.
+    """
+
+    max_size: int = 0
+    batches: int = 0
+    full_batches: int = 0
+    queries: int = 0
+    texts: int = 0
+    largest_batch: int = 0
+    errors: int = 0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.texts / self.batches if self.batches else 0.0
+
+    @property
+    def fill_rate(self) -> float:
+        return self.mean_batch_size / self.max_size if self.max_size else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "mean_batch_size": self.mean_batch_size, "fill_rate": self.fill_rate}
+
+
+class _Batch:
+    def __init__(self) -> None:
+        # The distinct texts of the batch and the position of each, a text asked for twice is embedded once
+        self.positions: dict[str, int] = {}
+        self.queries = 0
+        self.closed = threading.Event()
+        self.vectors: "Future[List[List[float]]]" = Future()
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embeddings that gather the queries of concurrent requests into one embeddings call.
+
+    The first query that finds no open batch opens one, waits up to `window` seconds for other queries to join it,
+    or until `max_size` texts have joined, and then embeds the batch on its own thread while the others wait for
+    their vector. So there is no background thread, and a query that is alone is only delayed by the window.
+    Async queries join the same batches from the default executor. Documents are embedded as they are.
+
+    Texts whose vectors are already known, like questions embedded in bulk, can be `primed` so that queries for them
+    are answered without a call.
+    """
+
+    def __init__(self, embeddings: Embeddings, window: float = 0.005, max_size: int = 16) -> None:
+        self.embeddings = embeddings
+        self.window = window
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._open: Optional[_Batch] = None
+        self._stats = BatchStats(max_size=max_size)
+        # Primed text -> (vector, number of `primed` blocks that primed it)
+        self._primed: dict[str, tuple[List[float], int]] = {}
+
+    @property
+    def stats(self) -> BatchStats:
+        with self._lock:
+            return BatchStats(**asdict(self._stats))
+
+    @contextmanager
+    def primed(self, texts: Sequence[str], vectors: Sequence[List[float]]) -> Iterator[None]:
+        """
+        Answer queries for the texts with their known vectors until the block exits.
+
+        Args:
+            texts (Sequence[str]): The texts.
+            vectors (Sequence[List[float]]): The vector of each text.
+        """
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                self._primed[text] = (vector, self._primed.get(text, (vector, 0))[1] + 1)
+        try:
+            yield
+        finally:
+            with self._lock:
+                for text in texts:
+                    vector, count = self._primed.pop(text)
+                    if count > 1:
+                        self._primed[text] = (vector, count - 1)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            if text in self._primed:
+                return self._primed[text][0]
+            batch = self._open
+            leader = batch is None
+            if batch is None:
+                batch = self._open = _Batch()
+            position = batch.positions.setdefault(text, len(batch.positions))
+            batch.queries += 1
+            if len(batch.positions) >= self.max_size:
+                self._open = None
+                batch.closed.set()
+
+        if leader:
+            batch.closed.wait(self.window)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._embed(batch)
+        return batch.vectors.result()[position]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with self._lock:
+            if text in self._primed:
+                return self._primed[text][0]
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_query, text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def _embed(self, batch: _Batch) -> None:
+        # The batch is closed, no other query can join it anymore
+        texts = list(batch.positions)
+        try:
+            vectors = self.embeddings.embed_documents(texts)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Every query of the batch fails with the error of the call
+            batch.vectors.set_exception(e)
+            with self._lock:
+                self._stats.errors += 1
+            return
+        batch.vectors.set_result(vectors)
+        with self._lock:
+            self._stats.batches += 1
+            self._stats.full_batches += len(texts) >= self.max_size
+            self._stats.queries += batch.queries
+            self._stats.texts += len(texts)
+            self._stats.largest_batch = max(self._stats.largest_batch, len(texts))
@@ -0,0 +1,92 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Optional, Sequence
+
+import numpy as np
+
+EMBEDDING_CACHE_FILE = "embeddings.sqlite"
+
+# SQLite limits the number of parameters in a single statement
+MAX_QUERY_PARAMS = 500
+
+
+def embedding_key(text: str, model: str) -> bytes:
+    """
+    Computes the content address of an embedding.
+
+    Parameters:
+    text (str): The embedded text.
+    model (str): The name of the embedding model.
+
+    Returns:
+    bytes: The SHA-256 digest of the model name and the text.
+    """
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    A persistent, content-addressed store of embeddings, keyed by the hash of the text and the model name.
+
+    Vectors are stored as float32 blobs in a SQLite database, so the cache is compact and safe to share
+    between the threads of an ingest run.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(file_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def get_many(self, texts: Sequence[str], model: str) -> list[Optional[list[float]]]:
+        """
+        Look up the embeddings of the texts.
+
+        Args:
+            texts (Sequence[str]): The texts to look up.
+            model (str): The name of the embedding model.
+
+        Returns:
+            list[Optional[list[float]]]: The embedding of each text, or None if it is not cached.
+        """
+        keys = [embedding_key(text, model) for text in texts]
+        found: dict[bytes, bytes] = {}
+        with self._lock:
+            for i in range(0, len(keys), MAX_QUERY_PARAMS):
+                batch = keys[i : i + MAX_QUERY_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                found.update(rows)
+        return [np.frombuffer(found[key], dtype=np.float32).tolist() if key in found else None for key in keys]
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]], model: str) -> None:
+        """
+        Store the embeddings of the texts.
+
+        Args:
+            texts (Sequence[str]): The embedded texts.
+            embeddings (Sequence[Sequence[float]]): The embedding of each text.
+            model (str): The name of the embedding model.
+        """
+        rows = [
+            (embedding_key(text, model), np.asarray(embedding, dtype=np.float32).tobytes())
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
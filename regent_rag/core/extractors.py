@@ -1,8 +1,66 @@
+import re
 from io import BytesIO
+from typing import Iterator, Optional, Union
 
+from lxml import etree, html
 from pptx import Presentation
 from pypdf import PdfReader
 
+# Elements whose text is not part of the content of a page: code, navigation and the chrome around the content
+BOILERPLATE_TAGS = frozenset(
+    {
+        "head",
+        "script",
+        "style",
+        "noscript",
+        "template",
+        "link",
+        "meta",
+        "svg",
+        "iframe",
+        "header",
+        "footer",
+        "nav",
+        "aside",
+        "form",
+        "button",
+        "select",
+    }
+)
+# Elements that start a new block of text, so that paragraphs, headings and list items end up on lines of their own
+BLOCK_TAGS = frozenset(
+    {
+        "address",
+        "article",
+        "blockquote",
+        "dd",
+        "div",
+        "dl",
+        "dt",
+        "figcaption",
+        "figure",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "hr",
+        "li",
+        "main",
+        "ol",
+        "p",
+        "pre",
+        "section",
+        "table",
+        "td",
+        "th",
+        "tr",
+        "ul",
+    }
+)
+BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+
 
 def extract_text_from_pdf(file_content: bytes) -> str:
     """
@@ -14,13 +72,7 @@ def extract_text_from_pdf(file_content: bytes) -> str:
     Returns:
     str: The extracted text from the PDF file.
     """
-    # Load the PDF file
-    pdf_file = PdfReader(BytesIO(file_content))
-
-    # Extract text from each page
-    extracted_text = " ".join([page.extract_text() for page in pdf_file.pages])
-
-    return extracted_text.strip()
+    return join_pages(iter_pdf_pages(file_content))[0]
 
 
 def extract_text_from_pptx(file_content: bytes) -> str:
@@ -33,20 +85,141 @@ def extract_text_from_pptx(file_content: bytes) -> str:
     Returns:
     str: The extracted text from the PPTX file.
     """
-    # Load the PPTX presentation
+    return join_pages(iter_pptx_slides(file_content))[0]
+
+
+def iter_pdf_pages(file_content: bytes) -> Iterator[tuple[int, str]]:
+    """
+    Extracts text from a PDF file one page at a time, so that only the page being extracted is parsed.
+
+    Parameters:
+    file_content (bytes): The content of a PDF file.
+
+    Returns:
+    Iterator[tuple[int, str]]: The number of every page with text, counting from 1, and its text.
+    """
+    pdf_file = PdfReader(BytesIO(file_content))
+    for number, page in enumerate(pdf_file.pages, start=1):
+        text = page.extract_text().strip()
+        if text:
+            yield number, text
+
+
+def iter_pptx_slides(file_content: bytes) -> Iterator[tuple[int, str]]:
+    """
+    Extracts text from a PPTX file one slide at a time.
+
+    Parameters:
+    file_content (bytes): The content of a PPTX file.
+
+    Returns:
+    Iterator[tuple[int, str]]: The number of every slide with text, counting from 1, and its text.
+    """
     presentation = Presentation(BytesIO(file_content))
+    for number, slide in enumerate(presentation.slides, start=1):
+        # The text of every shape, paragraph, and run of the slide
+        text = " ".join(
+            run.text
+            for shape in slide.shapes
+            if shape.has_text_frame
+            for paragraph in shape.text_frame.paragraphs
+            for run in paragraph.runs
+        ).strip()
+        if text:
+            yield number, text
+
 
-    # Extract text from each slide, shape, paragraph, and run
-    extracted_text = [
-        run.text
-        for slide in presentation.slides
-        for shape in slide.shapes
-        if shape.has_text_frame
-        for paragraph in shape.text_frame.paragraphs
-        for run in paragraph.runs
-    ]
+def join_pages(pages: Iterator[tuple[int, str]]) -> tuple[str, list[dict[str, int]]]:
+    """
+    Joins the text of pages into the text of a document, separating the pages by a blank line.
+
+    Parameters:
+    pages (Iterator[tuple[int, str]]): The number and text of every page.
+
+    Returns:
+    tuple[str, list[dict[str, int]]]: The text, and the number of every page with the offset it starts at in the text.
+    """
+    texts: list[str] = []
+    starts: list[dict[str, int]] = []
+    offset = 0
+    for number, text in pages:
+        starts.append({"page": number, "start": offset})
+        texts.append(text)
+        offset += len(text) + 2
+    return "\n\n".join(texts), starts
+
+
+def page_url(url: str, page: Optional[Union[int, str]]) -> str:
+    """
+    Links to a page of a PDF or PPTX file, the way PDF viewers open a file at a page.
+
+    Parameters:
+    url (str): The URL of the file.
+    page (Optional[Union[int, str]]): The page number, or None for the whole file or an HTML page.
+
+    Returns:
+    str: The URL of the page.
+    """
+    return f"{url}#page={page}" if page else url
+
+
+def extract_text_and_links_from_html(page: str) -> tuple[str, list[str]]:
+    """
+    Extracts the main text and the links of an HTML page, parsing it once.
+
+    The text is taken from the `<main>` element if the page has one, otherwise from the whole body, leaving out
+    boilerplate like scripts, navigation, headers and footers. Blocks are separated by blank lines and all markup
+    is dropped. Links are collected from the whole page, navigation included.
+
+    Parameters:
+    page (str): The HTML of the page.
+
+    Returns:
+    tuple[str, list[str]]: The text of the page, and the href of every link on it, in order of appearance.
+    """
+    if not page.strip():
+        return "", []
+    # Parse bytes with an explicit encoding, lxml refuses strings that still carry an XML encoding declaration
+    root = html.document_fromstring(page.encode("utf-8"), parser=html.HTMLParser(encoding="utf-8"))
+    main = root.find(".//main")
+    title = " ".join((root.findtext(".//title") or "").split())
 
-    # Join the extracted text into a single string
-    text = " ".join(extracted_text)
+    parts: list[str] = []
+    links: dict[str, None] = {}
+    skipped = 0  # Depth inside boilerplate, text is only kept at depth 0
+    in_main = main is None
+    for event, element in etree.iterwalk(root, events=("start", "end", "comment", "pi")):
+        tag = element.tag
+        if event in ("comment", "pi"):
+            # Only the tail of a comment or processing instruction is text
+            if element.tail and not skipped and in_main:
+                parts.append(element.tail)
+        elif event == "start":
+            if tag == "a" and element.get("href") is not None:
+                links[element.get("href")] = None
+            if element is main:
+                in_main = True
+            if tag in BOILERPLATE_TAGS:
+                skipped += 1
+            elif tag in BLOCK_TAGS:
+                parts.append("\n\n")
+            elif tag == "br":
+                parts.append("\n")
+            if element.text and not skipped and in_main:
+                parts.append(element.text)
+        else:
+            if tag in BOILERPLATE_TAGS:
+                skipped -= 1
+            elif tag in BLOCK_TAGS:
+                parts.append("\n\n")
+            if element is main:
+                in_main = False
+            if element.tail and element is not root and not skipped and in_main:
+                parts.append(element.tail)
 
-    return text.strip()
+    # Collapse the whitespace within lines and keep at most one blank line between blocks
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    text = BLANK_LINES_PATTERN.sub("\n\n", "\n".join(lines)).strip()
+    if title and not text.startswith(title):
+        text = f"{title}\n\n{text}".strip()
+    return text, list(links)
@@ -0,0 +1,568 @@
+import json
+import os
+import threading
+import uuid
+from typing import Any, Callable, Iterable, List, Literal, Optional, Sequence
+
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.vectorstores.base import VectorStore
+
+LOCAL_INDEX_FOLDER = "local_index"
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.jsonl"
+IVF_FILE = "ivf.npz"
+QUANTIZED_FILE = "quantized.npz"
+
+# k-means is trained on a sample of the vectors, enough per list for stable centroids without using all of them
+TRAIN_POINTS_PER_LIST = 64
+MAX_TRAIN_POINTS = 100_000
+# Vectors are scored against the centroids in chunks, to bound the memory used by the score matrix
+ASSIGN_CHUNK_SIZE = 16_384
+# int8 codes are converted to float32 in chunks while scoring, to bound the memory used by the conversion
+QUANTIZED_CHUNK_SIZE = 4_096
+
+
+class LocalIndex:
+    """
+    An in-process vector index with the same interface as the parts of pinecone.Index that we use.
+
+    Vectors are normalized and stored as rows of a float32 matrix, so the cosine similarity of a query with every
+    vector is a single matrix-vector product. Saved indexes are memory-mapped when loaded, so only the pages that
+    are touched are read from disk and processes serving the same index share them through the page cache.
+    Changes are kept in memory until `save` is called.
+
+    For large indexes `build_ivf` adds an inverted file index: the vectors are clustered with k-means and stored
+    grouped by cluster, and with `nprobe` set a query only scores the vectors of the `nprobe` clusters whose
+    centroids are most similar to it. More probed clusters trade latency for recall.
+
+    `quantize` adds int8 or binary codes of the vectors, after `build_ivf` if both are used. The codes are loaded
+    into memory while the vectors stay on disk, and a query scores the codes and rescores the `rescore` * `top_k`
+    best candidates with the vectors, so only their rows are read from the memory map.
+    """
+
+    def __init__(self, folder: str, nprobe: Optional[int] = None, rescore: int = 4) -> None:
+        self.folder = folder
+        self.nprobe = nprobe
+        self.rescore = rescore
+        self._lock = threading.Lock()
+        # Rows beyond `_size` are spare capacity, rows of deleted vectors are marked invalid until the next save
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._ids: list[Optional[str]] = []
+        self._metadata: list[Optional[dict[str, Any]]] = []
+        self._rows: dict[str, int] = {}
+        # Centroids and the offsets of each cluster's rows, only valid until the index is changed
+        self._ivf: Optional[tuple[np.ndarray, np.ndarray]] = None
+        # Quantized codes of the saved rows, only valid until the index is changed
+        self._quantized: Optional[QuantizedVectors] = None
+        self._load()
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return None if self._vectors is None else self._vectors.shape[1]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def upsert(self, vectors: Iterable[tuple[str, Sequence[float], dict[str, Any]]], **_: Any) -> dict[str, int]:
+        """
+        Insert or update vectors.
+
+        Args:
+            vectors (Iterable[tuple[str, Sequence[float], dict[str, Any]]]): (ID, values, metadata) tuples.
+
+        Returns:
+            dict[str, int]: The number of upserted vectors, like the Pinecone response.
+        """
+        vectors = list(vectors)
+        if not vectors:
+            return {"upserted_count": 0}
+        values = _normalize(np.asarray([vector[1] for vector in vectors], dtype=np.float32))
+        with self._lock:
+            if self._vectors is not None and values.shape[1] != self._vectors.shape[1]:
+                raise ValueError(f"Expected vectors of dimension {self._vectors.shape[1]}, got {values.shape[1]}")
+            self._ivf, self._quantized = None, None
+            new_rows = sum(1 for vector in vectors if vector[0] not in self._rows)
+            self._reserve(self._size + new_rows, values.shape[1])
+            assert self._vectors is not None
+            for vector, row_values in zip(vectors, values):
+                vector_id, metadata = vector[0], vector[2]
+                row = self._rows.get(vector_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[vector_id] = row
+                    self._ids.append(vector_id)
+                    self._metadata.append(metadata)
+                else:
+                    self._metadata[row] = metadata
+                self._vectors[row] = row_values
+                self._valid[row] = True
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids: Optional[Iterable[str]] = None, delete_all: bool = False, **_: Any) -> dict:
+        """
+        Delete vectors by ID, or every vector.
+
+        Args:
+            ids (Optional[Iterable[str]]): The IDs of the vectors to delete.
+            delete_all (bool): Delete every vector in the index.
+
+        Returns:
+            dict: An empty response, like Pinecone.
+        """
+        with self._lock:
+            self._ivf, self._quantized = None, None
+            if delete_all:
+                self._vectors = None
+                self._valid = np.zeros(0, dtype=bool)
+                self._size = 0
+                self._ids, self._metadata, self._rows = [], [], {}
+                return {}
+            for vector_id in ids or []:
+                row = self._rows.pop(vector_id, None)
+                if row is not None:
+                    self._valid[row] = False
+                    self._ids[row] = None
+                    self._metadata[row] = None
+        return {}
+
+    def query(
+        self, vector: Sequence[float], top_k: int = 10, include_metadata: bool = True, **_: Any
+    ) -> dict[str, list[dict[str, Any]]]:
+        """
+        Find the vectors most similar to the query vector.
+
+        Args:
+            vector (Sequence[float]): The query vector.
+            top_k (int): The number of matches to return.
+            include_metadata (bool): Include the metadata of the matches.
+
+        Returns:
+            dict[str, list[dict[str, Any]]]: The matches, with ID, cosine similarity score and metadata,
+                from most to least similar.
+        """
+        # Queries run against a snapshot, so they don't block each other or the writer while computing scores
+        with self._lock:
+            vectors, valid, size, ids, metadata = self._vectors, self._valid, self._size, self._ids, self._metadata
+            ivf, quantized, count = self._ivf, self._quantized, len(self._rows)
+        if vectors is None or top_k <= 0:
+            return {"matches": []}
+
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+
+        def score_vectors(start: int, end: int) -> np.ndarray:
+            return vectors[start:end] @ query
+
+        scorer = quantized.scorer(query) if quantized is not None and self.rescore > 0 else score_vectors
+        if ivf is not None and self.nprobe:
+            rows, scores = _probe(scorer, ivf, query, self.nprobe)
+            candidates = len(rows)
+        else:
+            rows = np.arange(size)
+            scores = scorer(0, size)
+            scores[~valid[:size]] = -np.inf
+            candidates = count
+        top_k = min(top_k, candidates)
+        if top_k == 0:
+            return {"matches": []}
+        if quantized is not None and self.rescore > 0:
+            # Rescore the best candidates by the codes with their full-precision vectors, read in row order
+            shortlist = min(top_k * self.rescore, candidates)
+            top = np.argpartition(-scores, shortlist - 1)[:shortlist]
+            rows = np.sort(rows[top])
+            scores = vectors[rows] @ query
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+
+        matches = []
+        for row, score in zip(rows[top], scores[top]):
+            match: dict[str, Any] = {"id": ids[row], "score": float(score)}
+            if include_metadata:
+                match["metadata"] = metadata[row]
+            matches.append(match)
+        return {"matches": matches}
+
+    def describe_index_stats(self, **_: Any) -> dict[str, Any]:
+        with self._lock:
+            return {"dimension": self.dimension or 0, "total_vector_count": len(self._rows)}
+
+    def save(self) -> None:
+        """
+        Write the index to its folder, dropping deleted rows, and memory-map the saved vectors.
+        The files are replaced atomically, so processes that have the previous version mapped are unaffected.
+        An inverted file index built before is dropped, as it no longer matches the rows.
+        """
+        with self._lock:
+            self._write(np.flatnonzero(self._valid[: self._size]))
+        self._load()
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Save the index with an inverted file index, storing the vectors grouped by their nearest k-means centroid
+        so that the vectors of a cluster are read from one contiguous slice of the memory map.
+
+        Args:
+            n_lists (Optional[int]): The number of clusters, by default 4 * sqrt(number of vectors).
+            iterations (int): The number of k-means iterations.
+            seed (int): The seed of the random sampling and initialization.
+        """
+        self.save()
+        with self._lock:
+            if self._vectors is None:
+                return
+            n_lists = min(self._size, n_lists or max(1, int(4 * np.sqrt(self._size))))
+            centroids = kmeans(self._vectors, n_lists, iterations, seed)
+            labels = assign(self._vectors, centroids)
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_lists))])
+            self._write(np.argsort(labels, kind="stable"), (centroids, offsets))
+        self._load()
+
+    def quantize(self, kind: Literal["int8", "binary"]) -> None:
+        """
+        Save the index with quantized codes of the vectors, used to find candidates for queries.
+
+        int8 codes scale every dimension to [-127, 127] and take a quarter of the memory of the vectors, binary
+        codes keep the sign of every dimension and take a 32nd, at a larger loss of precision that more rescoring
+        makes up for.
+
+        Args:
+            kind (Literal["int8", "binary"]): The quantization.
+        """
+        # An index that is unchanged since it was loaded is not saved again, which would drop its inverted file index
+        with self._lock:
+            loaded = self._vectors is not None and not self._vectors.flags.writeable
+            unchanged = loaded and bool(self._valid[: self._size].all())
+        if not unchanged:
+            self.save()
+        with self._lock:
+            if self._vectors is None:
+                return
+            quantized = QuantizedVectors.build(self._vectors, kind)
+            quantized_path = os.path.join(self.folder, QUANTIZED_FILE)
+            with open(f"{quantized_path}.tmp", "wb") as f:
+                quantized.save(f)
+            os.replace(f"{quantized_path}.tmp", quantized_path)
+        self._load()
+
+    def _write(self, rows: np.ndarray, ivf: Optional[tuple[np.ndarray, np.ndarray]] = None) -> None:
+        # Writes the given rows in the given order, copying the vectors in chunks rather than all at once
+        os.makedirs(self.folder, exist_ok=True)
+        vectors_path = os.path.join(self.folder, VECTORS_FILE)
+        shape = (len(rows), self.dimension or 0)
+        out = np.lib.format.open_memmap(f"{vectors_path}.tmp", mode="w+", dtype=np.float32, shape=shape)
+        if self._vectors is not None:
+            for start in range(0, len(rows), ASSIGN_CHUNK_SIZE):
+                out[start : start + ASSIGN_CHUNK_SIZE] = self._vectors[rows[start : start + ASSIGN_CHUNK_SIZE]]
+        out.flush()
+        del out
+        metadata_path = os.path.join(self.folder, METADATA_FILE)
+        with open(f"{metadata_path}.tmp", "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps({"id": self._ids[row], "metadata": self._metadata[row]}) + "\n")
+
+        # Remove the stale inverted file index and codes first, a crash then leaves an index that is searched exactly
+        ivf_path = os.path.join(self.folder, IVF_FILE)
+        for stale_path in (ivf_path, os.path.join(self.folder, QUANTIZED_FILE)):
+            if os.path.isfile(stale_path):
+                os.remove(stale_path)
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        os.replace(f"{metadata_path}.tmp", metadata_path)
+        if ivf is not None:
+            with open(f"{ivf_path}.tmp", "wb") as f:
+                np.savez(f, centroids=ivf[0], offsets=ivf[1])
+            os.replace(f"{ivf_path}.tmp", ivf_path)
+
+    def _load(self) -> None:
+        vectors_path = os.path.join(self.folder, VECTORS_FILE)
+        metadata_path = os.path.join(self.folder, METADATA_FILE)
+        if not os.path.isfile(vectors_path) or not os.path.isfile(metadata_path):
+            return
+
+        vectors = np.load(vectors_path, mmap_mode="r")
+        ids, metadata = [], []
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                ids.append(entry["id"])
+                metadata.append(entry["metadata"])
+        if len(ids) != vectors.shape[0]:
+            raise ValueError(f"{metadata_path} has {len(ids)} entries but {vectors_path} has {vectors.shape[0]} rows")
+
+        ivf = None
+        ivf_path = os.path.join(self.folder, IVF_FILE)
+        if os.path.isfile(ivf_path):
+            with np.load(ivf_path) as ivf_file:
+                ivf = (ivf_file["centroids"], ivf_file["offsets"])
+            if ivf[1][-1] != len(ids):
+                raise ValueError(f"{ivf_path} covers {ivf[1][-1]} rows but {vectors_path} has {len(ids)} rows")
+
+        quantized = None
+        quantized_path = os.path.join(self.folder, QUANTIZED_FILE)
+        if os.path.isfile(quantized_path):
+            quantized = QuantizedVectors.load(quantized_path)
+            if len(quantized) != len(ids):
+                raise ValueError(f"{quantized_path} has {len(quantized)} rows but {vectors_path} has {len(ids)} rows")
+
+        with self._lock:
+            self._ivf = ivf
+            self._quantized = quantized
+            self._vectors = vectors if vectors.size else None
+            self._size = len(ids)
+            self._valid = np.ones(self._size, dtype=bool)
+            self._ids, self._metadata = ids, metadata
+            self._rows = {vector_id: row for row, vector_id in enumerate(ids)}
+
+    def _reserve(self, rows: int, dimension: int) -> None:
+        # Writes go to an in-memory copy of the (read-only) memory map, grown geometrically like a list
+        if self._vectors is not None and self._vectors.flags.writeable and self._vectors.shape[0] >= rows:
+            return
+        capacity = rows if self._vectors is None else max(rows, 2 * self._vectors.shape[0])
+        vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        valid = np.zeros(capacity, dtype=bool)
+        if self._vectors is not None:
+            vectors[: self._size] = self._vectors[: self._size]
+            valid[: self._size] = self._valid[: self._size]
+        self._vectors, self._valid = vectors, valid
+
+
+class QuantizedVectors:
+    """
+    Quantized codes of normalized vectors, that estimate their dot product with a query.
+
+    int8 codes are the vectors divided by a scale per dimension, so that the largest value of each dimension is 127,
+    and rounded. Binary codes are the signs of the dimensions packed into bits, and score a query by the number of
+    dimensions whose sign it shares, minus the number it doesn't. Binary codes only rank vectors, their scores are
+    not cosine similarities.
+    """
+
+    def __init__(self, kind: Literal["int8", "binary"], codes: np.ndarray, scale: np.ndarray) -> None:
+        self.kind = kind
+        self.codes = codes
+        self.scale = scale
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, kind: Literal["int8", "binary"]) -> "QuantizedVectors":
+        """
+        Quantize vectors, reading them in chunks.
+
+        Args:
+            vectors (np.ndarray): The normalized vectors, one per row.
+            kind (Literal["int8", "binary"]): The quantization.
+
+        Returns:
+            QuantizedVectors: The codes.
+        """
+        count, dimension = vectors.shape
+        if kind == "int8":
+            scale = np.zeros(dimension, dtype=np.float32)
+            for start in range(0, count, ASSIGN_CHUNK_SIZE):
+                np.maximum(scale, np.abs(vectors[start : start + ASSIGN_CHUNK_SIZE]).max(axis=0), out=scale)
+            scale = np.where(scale == 0, 1, scale) / 127
+            codes = np.empty((count, dimension), dtype=np.int8)
+            for start in range(0, count, ASSIGN_CHUNK_SIZE):
+                codes[start : start + ASSIGN_CHUNK_SIZE] = np.rint(vectors[start : start + ASSIGN_CHUNK_SIZE] / scale)
+            return cls(kind, codes, scale)
+        if kind == "binary":
+            # Whole 64-bit words per row, so that bits can be counted a word at a time
+            codes = np.zeros((count, -(-dimension // 64) * 8), dtype=np.uint8)
+            for start in range(0, count, ASSIGN_CHUNK_SIZE):
+                bits = np.packbits(vectors[start : start + ASSIGN_CHUNK_SIZE] > 0, axis=1)
+                codes[start : start + len(bits), : bits.shape[1]] = bits
+            return cls(kind, codes, np.zeros(0, dtype=np.float32))
+        raise ValueError(f"Unknown quantization: {kind}")
+
+    def scorer(self, query: np.ndarray) -> Callable[[int, int], np.ndarray]:
+        """
+        Score a query against the codes.
+
+        Args:
+            query (np.ndarray): The normalized query vector.
+
+        Returns:
+            Callable[[int, int], np.ndarray]: A function that scores the rows from start to end, higher is more
+                similar.
+        """
+        if self.kind == "int8":
+            scaled = query * self.scale
+
+            def score_int8(start: int, end: int) -> np.ndarray:
+                scores = np.empty(end - start, dtype=np.float32)
+                for offset in range(start, end, QUANTIZED_CHUNK_SIZE):
+                    chunk = self.codes[offset : min(offset + QUANTIZED_CHUNK_SIZE, end)]
+                    scores[offset - start : offset - start + len(chunk)] = chunk.astype(np.float32) @ scaled
+                return scores
+
+            return score_int8
+
+        bits = np.zeros(self.codes.shape[1], dtype=np.uint8)
+        query_bits = np.packbits(query > 0)
+        bits[: len(query_bits)] = query_bits
+        words = bits.view(np.uint64)
+        dimension = len(query)
+
+        def score_binary(start: int, end: int) -> np.ndarray:
+            differences = _popcount(self.codes[start:end].view(np.uint64) ^ words).sum(axis=1, dtype=np.int64)
+            return (dimension - 2 * differences).astype(np.float32)
+
+        return score_binary
+
+    def save(self, file: Any) -> None:
+        np.savez(file, kind=np.array(self.kind), codes=self.codes, scale=self.scale)
+
+    @classmethod
+    def load(cls, file_path: str) -> "QuantizedVectors":
+        with np.load(file_path) as quantized_file:
+            return cls(str(quantized_file["kind"]), quantized_file["codes"], quantized_file["scale"])  # type: ignore
+
+
+class LocalVectorStore(VectorStore):
+    """
+    A LangChain vector store backed by a LocalIndex, storing the text of a document in its metadata like the
+    Pinecone vector store does.
+    """
+
+    def __init__(self, index: LocalIndex, embedding: Embeddings, text_key: str = "text") -> None:
+        self.index = index
+        self._embedding = embedding
+        self.text_key = text_key
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        embeds = self._embedding.embed_documents(texts)
+        self.index.upsert(
+            [
+                (vector_id, embed, {**metadata, self.text_key: text})
+                for vector_id, embed, metadata, text in zip(ids, embeds, metadatas, texts)
+            ]
+        )
+        return ids
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, **_: Any
+    ) -> List[tuple[Document, float]]:
+        results = []
+        for match in self.index.query(embedding, top_k=k)["matches"]:
+            metadata = dict(match["metadata"])
+            text = metadata.pop(self.text_key, "")
+            results.append((Document(page_content=text, metadata=metadata), match["score"]))
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self) -> Any:
+        # Scores are cosine similarities, map them from [-1, 1] to [0, 1]
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        folder: str = LOCAL_INDEX_FOLDER,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(LocalIndex(folder), embedding)
+        store.add_texts(texts, metadatas)
+        store.index.save()
+        return store
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Cluster normalized vectors with spherical k-means, trained on a random sample of them.
+
+    Args:
+        vectors (np.ndarray): The normalized vectors, one per row.
+        n_clusters (int): The number of clusters.
+        iterations (int): The number of iterations.
+        seed (int): The seed of the random sampling and initialization.
+
+    Returns:
+        np.ndarray: The normalized centroids, one per row.
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), max(n_clusters, min(MAX_TRAIN_POINTS, n_clusters * TRAIN_POINTS_PER_LIST)))
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(sample, centroids)
+        counts = np.bincount(labels, minlength=n_clusters)
+        # Sum the points of each cluster as contiguous runs of the points sorted by cluster
+        nonempty = counts > 0
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(sample[np.argsort(labels, kind="stable")], starts, axis=0)
+        # Reseed empty clusters with random points, so that no list ends up unused
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Find the most similar centroid of every vector.
+
+    Args:
+        vectors (np.ndarray): The normalized vectors, one per row.
+        centroids (np.ndarray): The normalized centroids, one per row.
+
+    Returns:
+        np.ndarray: The index of the nearest centroid of each vector.
+    """
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE):
+        chunk = np.asarray(vectors[start : start + ASSIGN_CHUNK_SIZE])
+        labels[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return labels
+
+
+def _probe(
+    score: Callable[[int, int], np.ndarray], ivf: tuple[np.ndarray, np.ndarray], query: np.ndarray, nprobe: int
+) -> tuple[np.ndarray, np.ndarray]:
+    centroids, offsets = ivf
+    nprobe = min(nprobe, len(centroids))
+    lists = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+    rows = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in lists])
+    scores = np.concatenate([score(offsets[i], offsets[i + 1]) for i in lists])
+    return rows, scores
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    # Counts the set bits of every 64-bit word in parallel, summing pairs, nibbles and then bytes of bits
+    words = words - ((words >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    words = (words & np.uint64(0x3333333333333333)) + ((words >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    words = (words + (words >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (words * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
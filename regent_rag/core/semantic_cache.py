@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+INDEX_VERSION_FILE = "index_version"
+
+
+def write_index_version(file_path: str) -> None:
+    """
+    Writes a new version marker for the vector index, invalidating every SemanticCache watching the file.
+
+    Parameters:
+    file_path (str): The path of the version marker file.
+
+    Returns:
+    None
+    """
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+
+
+def read_index_version(file_path: Optional[str]) -> Optional[str]:
+    """
+    Reads the version marker of the vector index.
+
+    Parameters:
+    file_path (Optional[str]): The path of the version marker file.
+
+    Returns:
+    Optional[str]: The version, or None if there is no marker file.
+    """
+    if not file_path or not os.path.isfile(file_path):
+        return None
+    with open(file_path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+@dataclass
+class CacheStats:
+    """
+    Counters describing how well the cache is doing.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "hit_rate": self.hit_rate}
+
+
+class SemanticCache:
+    """
+    A thread-safe cache of answers keyed on the embedding of the question.
+
+    A lookup is a hit when a cached question has a cosine similarity of at least `threshold` with the new one.
+    Entries expire after `ttl` seconds, the least recently used entry is evicted when `max_size` is reached and
+    everything is dropped when the index version marker in `version_file` changes. The marker is read at most once
+    every `version_interval` seconds and outside the lock, so requests don't wait on the file system.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.97,
+        ttl: float = 86400,
+        max_size: int = 1024,
+        version_file: Optional[str] = None,
+        version_interval: float = 1.0,
+    ) -> None:
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.version_file = version_file
+        self.version_interval = version_interval
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        # One row per slot, allocated on the first store when the embedding dimension is known
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_size, dtype=bool)
+        # Slot -> (expires at, value), in least to most recently used order
+        self._entries: "OrderedDict[int, tuple[float, Any]]" = OrderedDict()
+        self._version = read_index_version(version_file)
+        self._version_checked_at = time.monotonic()
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(**{**asdict(self._stats), "size": len(self._entries)})
+
+    def lookup(self, embedding: Sequence[float]) -> Optional[Any]:
+        """
+        Find the answer to the most similar cached question.
+
+        Args:
+            embedding (Sequence[float]): The embedding of the question.
+
+        Returns:
+            Optional[Any]: The cached value, or None on a miss.
+        """
+        query = _normalize(embedding)
+        self._check_version()
+        with self._lock:
+            slot = self._best_slot(query)
+            if slot is not None:
+                expires_at, value = self._entries[slot]
+                if expires_at < time.monotonic():
+                    self._remove(slot)
+                    self._stats.expirations += 1
+                else:
+                    self._entries.move_to_end(slot)
+                    self._stats.hits += 1
+                    return value
+
+            self._stats.misses += 1
+            return None
+
+    def store(self, embedding: Sequence[float], value: Any) -> None:
+        """
+        Cache the answer to a question.
+
+        Args:
+            embedding (Sequence[float]): The embedding of the question.
+            value (Any): The answer to cache.
+        """
+        vector = _normalize(embedding)
+        self._check_version()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+
+            # Replace the entry of an equivalent question rather than storing it twice
+            slot = self._best_slot(vector)
+            if slot is None:
+                if len(self._entries) >= self.max_size:
+                    lru_slot = next(iter(self._entries))
+                    self._remove(lru_slot)
+                    self._stats.evictions += 1
+                slot = int(np.argmin(self._valid))
+
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._entries[slot] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(slot)
+
+    def clear(self) -> None:
+        """
+        Drop every cached answer.
+        """
+        with self._lock:
+            self._clear()
+
+    def _best_slot(self, query: np.ndarray) -> Optional[int]:
+        if self._vectors is None or not self._entries:
+            return None
+        similarities = self._vectors @ query
+        similarities[~self._valid] = -np.inf
+        slot = int(np.argmax(similarities))
+        return slot if similarities[slot] >= self.threshold else None
+
+    def _remove(self, slot: int) -> None:
+        del self._entries[slot]
+        self._valid[slot] = False
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._valid[:] = False
+
+    def _check_version(self) -> None:
+        now = time.monotonic()
+        if self.version_file is None or now - self._version_checked_at < self.version_interval:
+            return
+        # Concurrent requests may both read the marker, but only one of them clears the cache
+        self._version_checked_at = now
+        version = read_index_version(self.version_file)
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._clear()
+                self._version = version
+                self._stats.invalidations += 1
+
+
+def _normalize(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
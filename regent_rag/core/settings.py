@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -14,8 +15,32 @@ class Settings(BaseSettings):
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", frozen=True, extra="ignore")
 
+    async_executor_workers: int = 128  # ASYNC_EXECUTOR_WORKERS
+    batch_llm_concurrency: int = 8  # BATCH_LLM_CONCURRENCY
+    batch_max_queries: int = 100  # BATCH_MAX_QUERIES
+    batch_search_concurrency: int = 16  # BATCH_SEARCH_CONCURRENCY
+    attachment_max_bytes: int = 50_000_000  # ATTACHMENT_MAX_BYTES
+    attachment_timeout: float = 60.0  # ATTACHMENT_TIMEOUT
+    attachment_workers: int = 0  # ATTACHMENT_WORKERS
     curl_file: str = "./request.curl"  # CURL_FILE
+    embedding_batch_enabled: bool = True  # EMBEDDING_BATCH_ENABLED
+    embedding_batch_max_size: int = 16  # EMBEDDING_BATCH_MAX_SIZE
+    embedding_batch_window: float = 0.005  # EMBEDDING_BATCH_WINDOW
+    embedding_cache_enabled: bool = True  # EMBEDDING_CACHE_ENABLED
     embeddings_model: str = "text-embedding-ada-002"  # EMBEDDINGS_MODEL
+    hybrid_search_enabled: bool = False  # HYBRID_SEARCH_ENABLED
+    hybrid_search_fetch_k: int = 20  # HYBRID_SEARCH_FETCH_K
+    index_full_sync: bool = False  # INDEX_FULL_SYNC
+    ingest_backoff: float = 1.0  # INGEST_BACKOFF
+    ingest_batch_size: int = 128  # INGEST_BATCH_SIZE
+    ingest_batch_tokens: int = 16000  # INGEST_BATCH_TOKENS
+    ingest_concurrency: int = 8  # INGEST_CONCURRENCY
+    ingest_max_retries: int = 6  # INGEST_MAX_RETRIES
+    local_index_ivf_lists: int = 0  # LOCAL_INDEX_IVF_LISTS
+    local_index_ivf_probes: int = 16  # LOCAL_INDEX_IVF_PROBES
+    local_index_quantization: Literal["none", "int8", "binary"] = "none"  # LOCAL_INDEX_QUANTIZATION
+    local_index_rescore: int = 4  # LOCAL_INDEX_RESCORE
+    local_index_type: Literal["exact", "ivf"] = "exact"  # LOCAL_INDEX_TYPE
     log_level: str = "INFO"  # LOG_LEVEL
     openai_api_key: str = ""  # OPENAI_API_KEY
     openai_model: str = "gpt-3.5-turbo"  # OPENAI_MODEL
@@ -25,6 +50,24 @@ class Settings(BaseSettings):
     pinecone_environment: str = ""  # PINECONE_ENVIRONMENT
     pinecone_index_name: str = ""  # PINECONE_INDEX_NAME
     pinecone_text_field: str = "text"  # PINECONE_TEXT_FIELD
+    retrieval_mode: Literal["plain", "multi_query", "adaptive"] = "multi_query"  # RETRIEVAL_MODE
+    retrieval_score_threshold: float = 0.8  # RETRIEVAL_SCORE_THRESHOLD
+    scrape_async_concurrency: int = 200  # SCRAPE_ASYNC_CONCURRENCY
+    scrape_host_concurrency: int = 4  # SCRAPE_HOST_CONCURRENCY
+    scrape_host_delay: float = 0.0  # SCRAPE_HOST_DELAY
+    scrape_incremental: bool = True  # SCRAPE_INCREMENTAL
+    scrape_mode: Literal["threads", "async"] = "threads"  # SCRAPE_MODE
+    scrape_workers: int = 10  # SCRAPE_WORKERS
+    semantic_cache_enabled: bool = True  # SEMANTIC_CACHE_ENABLED
+    semantic_cache_max_size: int = 1024  # SEMANTIC_CACHE_MAX_SIZE
+    semantic_cache_threshold: float = 0.97  # SEMANTIC_CACHE_THRESHOLD
+    semantic_cache_ttl: float = 86400  # SEMANTIC_CACHE_TTL
+    semantic_cache_version_interval: float = 1.0  # SEMANTIC_CACHE_VERSION_INTERVAL
+    splits_boilerplate_fraction: float = 0.3  # SPLITS_BOILERPLATE_FRACTION
+    splits_dedup_threshold: float = 0.8  # SPLITS_DEDUP_THRESHOLD
+    splits_executor: Literal["threads", "processes"] = "processes"  # SPLITS_EXECUTOR
+    splits_workers: int = 0  # SPLITS_WORKERS
+    vector_store: Literal["pinecone", "local"] = "pinecone"  # VECTOR_STORE
     flask_app: str = "./regent_rag/app.py"  # FLASK_APP
 
 
@@ -37,8 +80,32 @@ def get_settings() -> Settings:
     """
     settings = Settings()
     logger.debug("#### SETTINGS ####")
+    logger.debug(f"async_executor_workers: {settings.async_executor_workers}")
+    logger.debug(f"batch_llm_concurrency: {settings.batch_llm_concurrency}")
+    logger.debug(f"batch_max_queries: {settings.batch_max_queries}")
+    logger.debug(f"batch_search_concurrency: {settings.batch_search_concurrency}")
+    logger.debug(f"attachment_max_bytes: {settings.attachment_max_bytes}")
+    logger.debug(f"attachment_timeout: {settings.attachment_timeout}")
+    logger.debug(f"attachment_workers: {settings.attachment_workers}")
     logger.debug(f"curl_file: {settings.curl_file}")
+    logger.debug(f"embedding_batch_enabled: {settings.embedding_batch_enabled}")
+    logger.debug(f"embedding_batch_max_size: {settings.embedding_batch_max_size}")
+    logger.debug(f"embedding_batch_window: {settings.embedding_batch_window}")
+    logger.debug(f"embedding_cache_enabled: {settings.embedding_cache_enabled}")
     logger.debug(f"embeddings_model: {settings.embeddings_model}")
+    logger.debug(f"hybrid_search_enabled: {settings.hybrid_search_enabled}")
+    logger.debug(f"hybrid_search_fetch_k: {settings.hybrid_search_fetch_k}")
+    logger.debug(f"index_full_sync: {settings.index_full_sync}")
+    logger.debug(f"ingest_backoff: {settings.ingest_backoff}")
+    logger.debug(f"ingest_batch_size: {settings.ingest_batch_size}")
+    logger.debug(f"ingest_batch_tokens: {settings.ingest_batch_tokens}")
+    logger.debug(f"ingest_concurrency: {settings.ingest_concurrency}")
+    logger.debug(f"ingest_max_retries: {settings.ingest_max_retries}")
+    logger.debug(f"local_index_ivf_lists: {settings.local_index_ivf_lists}")
+    logger.debug(f"local_index_ivf_probes: {settings.local_index_ivf_probes}")
+    logger.debug(f"local_index_quantization: {settings.local_index_quantization}")
+    logger.debug(f"local_index_rescore: {settings.local_index_rescore}")
+    logger.debug(f"local_index_type: {settings.local_index_type}")
     logger.debug(f"log_level: {settings.log_level}")
     logger.debug(f"openai_api_key: {mask_string(settings.openai_api_key)}")
     logger.debug(f"openai_model: {settings.openai_model}")
@@ -47,6 +114,24 @@ def get_settings() -> Settings:
     logger.debug(f"pinecone_api_key: {mask_string(settings.pinecone_api_key)}")
     logger.debug(f"pinecone_environment: {settings.pinecone_environment}")
     logger.debug(f"pinecone_index_name: {settings.pinecone_index_name}")
+    logger.debug(f"retrieval_mode: {settings.retrieval_mode}")
+    logger.debug(f"retrieval_score_threshold: {settings.retrieval_score_threshold}")
+    logger.debug(f"scrape_async_concurrency: {settings.scrape_async_concurrency}")
+    logger.debug(f"scrape_host_concurrency: {settings.scrape_host_concurrency}")
+    logger.debug(f"scrape_host_delay: {settings.scrape_host_delay}")
+    logger.debug(f"scrape_incremental: {settings.scrape_incremental}")
+    logger.debug(f"scrape_mode: {settings.scrape_mode}")
+    logger.debug(f"scrape_workers: {settings.scrape_workers}")
+    logger.debug(f"semantic_cache_enabled: {settings.semantic_cache_enabled}")
+    logger.debug(f"semantic_cache_max_size: {settings.semantic_cache_max_size}")
+    logger.debug(f"semantic_cache_threshold: {settings.semantic_cache_threshold}")
+    logger.debug(f"semantic_cache_ttl: {settings.semantic_cache_ttl}")
+    logger.debug(f"semantic_cache_version_interval: {settings.semantic_cache_version_interval}")
+    logger.debug(f"splits_boilerplate_fraction: {settings.splits_boilerplate_fraction}")
+    logger.debug(f"splits_dedup_threshold: {settings.splits_dedup_threshold}")
+    logger.debug(f"splits_executor: {settings.splits_executor}")
+    logger.debug(f"splits_workers: {settings.splits_workers}")
+    logger.debug(f"vector_store: {settings.vector_store}")
     logger.debug(f"flask_app: {settings.flask_app}")
     logger.debug("#### END OF SETTINGS ####")
     return settings
@@ -0,0 +1,16 @@
+import json
+from typing import Any
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Formats an event as a Server-Sent Events message.
+
+    Parameters:
+    event (str): The name of the event.
+    data (Any): The JSON serializable payload of the event.
+
+    Returns:
+    str: The event, ready to be written to a text/event-stream response.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,25 +1,58 @@
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Collection, Iterable, Iterator, Optional, Sequence, Sized, Union
+
 import jsonlines
 import openai
 import pinecone
 from tqdm.auto import tqdm
 
+from regent_rag.core.changes import SPLITS_CHANGES_FILE, SourceChanges, clear_pending_changes
+from regent_rag.core.dedup import duplicate_sources
+from regent_rag.core.embedding_cache import EMBEDDING_CACHE_FILE, EmbeddingCache
+from regent_rag.core.extractors import page_url
+from regent_rag.core.local_index import LOCAL_INDEX_FOLDER, LocalIndex
 from regent_rag.core.logging import logger
+from regent_rag.core.semantic_cache import INDEX_VERSION_FILE, write_index_version
 from regent_rag.core.settings import get_settings
+from regent_rag.ingest import (
+    INGEST_CHECKPOINT_FILE,
+    IngestCheckpoint,
+    IngestOptions,
+    IngestPipeline,
+    IngestStats,
+    Vector,
+    get_token_counter,
+    token_batches,
+)
+
+INDEX_MANIFEST_FILE = "index_manifest.json"
+DELETE_BATCH_SIZE = 1000
+# Pinecone's index stats lag behind writes, give them a while to catch up before calling the index inconsistent
+CONSISTENCY_CHECK_ATTEMPTS = 6
+CONSISTENCY_CHECK_DELAY = 5.0
+
+# Both are written to through the same upsert/delete/describe_index_stats calls
+VectorIndex = Union[pinecone.Index, LocalIndex]
 
 
-def load_data(file_path: str) -> list[dict[str, str]]:
+def load_data(file_path: str) -> Iterator[dict[str, str]]:
     """
-    Load data from a JSONL file.
+    Load data from a JSONL file lazily, one line at a time, so that memory does not grow with the file.
 
     Args:
         file_path (str): The path to the JSONL file.
 
-    Returns:
-        list[dict[str, str]]: A list of dictionaries containing the data from the file.
+    Yields:
+        dict[str, str]: The data of every line of the file.
     """
     with jsonlines.open(file_path) as f:
-        data = [item for item in f]
-    return data
+        yield from f
 
 
 def init_openai(api_key: str) -> str:
@@ -56,29 +89,72 @@ def init_pinecone(api_key: str, index_name: str, environment: str, dimension: in
     return pinecone.Index(index_name)
 
 
-def create_and_index_embeddings(data: list[dict[str, str]], model: str, index: pinecone.Index) -> None:
+def create_and_index_embeddings(
+    data: Iterable[dict[str, str]],
+    model: str,
+    index: VectorIndex,
+    cache: Optional[EmbeddingCache] = None,
+    options: Optional[IngestOptions] = None,
+    checkpoint: Optional[IngestCheckpoint] = None,
+) -> IngestStats:
     """
-    Create embeddings for the data and index them in Pinecone.
+    Create embeddings for the data and index them.
+
+    Batches are sized by token count and embedded concurrently, while a separate thread upserts the finished
+    batches, see IngestPipeline. The data is consumed lazily, only the batches in flight are held in memory.
 
     Args:
-        data (list[dict[str, str]]): The data to create embeddings for.
+        data (Iterable[dict[str, str]]): The data to create embeddings for.
         model (str): The name of the OpenAI model to use.
-        index (pinecone.Index): The Pinecone index to use.
+        index (VectorIndex): The Pinecone or local index to use.
+        cache (Optional[EmbeddingCache]): Cache of previously created embeddings, unchanged chunks are not re-embedded.
+        options (Optional[IngestOptions]): Concurrency and batching options.
+        checkpoint (Optional[IngestCheckpoint]): How many chunks at the start of the data were upserted by an
+            interrupted run, those are skipped and the checkpoint advances as batches are upserted.
+
+    Returns:
+        IngestStats: What happened during the run.
     """
-    batch_size = 32
-    for i in tqdm(range(0, len(data), batch_size)):
-        batch = data[i : i + batch_size]
-        source_batch = [item["source"] for item in batch]
+    options = options or IngestOptions()
+
+    def embed(batch: list[dict[str, str]]) -> list[Vector]:
+        # Chunks of PDF and PPTX files cite the page they are on
+        source_batch = [page_url(item["source"], item.get("page")) for item in batch]
         text_batch = [item["text"] for item in batch]
-        ids_batch = [str(n) for n in range(i, i + min(batch_size, len(data) - i))]
-        embeds, metadata_batch = create_embeddings_and_metadata(text_batch, source_batch, model)
-        to_upsert = zip(ids_batch, embeds, metadata_batch)
-        index.upsert(vectors=list(to_upsert))
+        ids_batch = [item["id"] for item in batch]
+        duplicates_batch = [duplicate_sources(item) for item in batch]
+        embeds, metadata_batch = create_embeddings_and_metadata(
+            text_batch, source_batch, model, cache, duplicates_batch
+        )
+        return list(zip(ids_batch, embeds, metadata_batch))
+
+    def upsert(vectors: list[Vector]) -> None:
+        index.upsert(vectors=vectors)
+
+    total = len(data) if isinstance(data, Sized) else None
+    on_upserted = None
+    if checkpoint is not None and checkpoint.offset:
+        logger.info(f"Resuming after the {checkpoint.offset} chunks upserted before the ingest was interrupted")
+        data = itertools.islice(data, checkpoint.offset, None)
+        total = max(total - checkpoint.offset, 0) if total is not None else None
+    batches = token_batches(data, get_token_counter(model), options.batch_tokens, options.batch_size)
+    if checkpoint is not None:
+        batches = checkpoint.track(batches)
+        on_upserted = checkpoint.upserted
+    with tqdm(total=total) as progress:
+        pipeline = IngestPipeline(embed, upsert, options, on_progress=progress.update, on_upserted=on_upserted)
+        stats = pipeline.run(batches)
+    logger.debug(f"Ingest stats: {stats}")
+    return stats
 
 
 def create_embeddings_and_metadata(
-    text_batch: list[str], source_batch: list[str], model: str
-) -> tuple[list[str], list[dict[str, str]]]:
+    text_batch: list[str],
+    source_batch: list[str],
+    model: str,
+    cache: Optional[EmbeddingCache] = None,
+    duplicates_batch: Optional[list[list[str]]] = None,
+) -> tuple[list[list[float]], list[dict[str, Any]]]:
     """
     Create embeddings and metadata for a batch of text.
 
@@ -86,19 +162,233 @@ def create_embeddings_and_metadata(
         text_batch (list[str]): The text to create embeddings for.
         source_batch (list[str]): The source of the text.
         model (str): The name of the OpenAI model to use.
+        cache (Optional[EmbeddingCache]): Cache of previously created embeddings, only cache misses are sent to OpenAI.
+        duplicates_batch (Optional[list[list[str]]]): The URLs of the duplicates of each text, see `duplicate_sources`.
+            Texts with duplicates get all their URLs in "sources".
 
     Returns:
-        tuple[list[str], list[dict[str, str]]]: A tuple containing the embeddings and metadata.
+        tuple[list[list[float]], list[dict[str, Any]]]: A tuple containing the embeddings and metadata.
     """
-    res = openai.Embedding.create(input=text_batch, engine=model)
-    embeds = [record["embedding"] for record in res["data"]]
-    metadata_batch = [{"text": text, "source": source} for text, source in zip(text_batch, source_batch)]
+    embeds = cache.get_many(text_batch, model) if cache is not None else [None] * len(text_batch)
+    missing = [i for i, embed in enumerate(embeds) if embed is None]
+    if missing:
+        res = openai.Embedding.create(input=[text_batch[i] for i in missing], engine=model)
+        new_embeds = [record["embedding"] for record in res["data"]]
+        for i, embed in zip(missing, new_embeds):
+            embeds[i] = embed
+        if cache is not None:
+            cache.put_many([text_batch[i] for i in missing], new_embeds, model)
+    metadata_batch: list[dict[str, Any]] = []
+    for text, source, duplicates in zip(text_batch, source_batch, duplicates_batch or [[]] * len(text_batch)):
+        metadata: dict[str, Any] = {"text": text, "source": source, "hash": content_hash(text, source, duplicates)}
+        if duplicates:
+            metadata["sources"] = [source, *duplicates]
+        metadata_batch.append(metadata)
     return embeds, metadata_batch
 
 
+def content_hash(text: str, source: str, duplicates: Sequence[str] = ()) -> str:
+    """
+    Hash the content of a chunk, used to detect chunks that changed since they were indexed.
+
+    Args:
+        text (str): The text of the chunk.
+        source (str): The source of the chunk.
+        duplicates (Sequence[str]): The URLs of the duplicates of the chunk, so that the chunk is indexed again when
+            they change. The hash of a chunk without duplicates doesn't depend on them.
+
+    Returns:
+        str: The hex digest of the chunk content.
+    """
+    content = f"{source}\0{text}"
+    if duplicates:
+        content += "\0" + "\0".join(sorted(duplicates))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class SyncReport:
+    """
+    The number of vectors touched by an index sync.
+    """
+
+    added: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+
+    @property
+    def total(self) -> int:
+        """
+        The number of chunks, and so of vectors that should be in the index after the sync.
+        """
+        return self.added + self.updated + self.unchanged
+
+
+def load_manifest(file_path: str) -> Optional[dict[str, str]]:
+    """
+    Load the manifest of the vectors in the index.
+
+    Args:
+        file_path (str): The path to the manifest file.
+
+    Returns:
+        Optional[dict[str, str]]: The content hash of every indexed chunk by ID, or None if there is no manifest.
+    """
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(file_path: str, manifest: dict[str, str]) -> None:
+    """
+    Save the manifest of the vectors in the index, replacing the previous one atomically.
+
+    Args:
+        file_path (str): The path to the manifest file.
+        manifest (dict[str, str]): The content hash of every indexed chunk by ID.
+    """
+    tmp_file_path = f"{file_path}.tmp"
+    with open(tmp_file_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file_path, file_path)
+
+
+def sync_index(
+    data: Iterable[dict[str, str]],
+    model: str,
+    index: VectorIndex,
+    manifest_path: str,
+    cache: Optional[EmbeddingCache] = None,
+    full: bool = False,
+    options: Optional[IngestOptions] = None,
+    sources: Optional[Collection[str]] = None,
+    checkpoint: Optional[IngestCheckpoint] = None,
+) -> SyncReport:
+    """
+    Bring the index in line with the data, upserting only new or changed chunks and deleting the vectors of
+    chunks that no longer exist.
+
+    Pinecone can't list the IDs in an index, so what has been indexed is tracked in a manifest next to it. The data
+    is read once, as a stream: chunks are compared with the manifest as they are read and the new or changed ones
+    are embedded and upserted on the way, so only the IDs and hashes of the chunks are held in memory.
+
+    Args:
+        data (Iterable[dict[str, str]]): The chunks that should be in the index.
+        model (str): The name of the OpenAI model to use.
+        index (VectorIndex): The Pinecone or local index to use.
+        manifest_path (str): The path to the manifest of the indexed chunks.
+        cache (Optional[EmbeddingCache]): Cache of previously created embeddings.
+        full (bool): Upsert every chunk, even if it is unchanged since the last sync.
+        options (Optional[IngestOptions]): Concurrency and batching options.
+        sources (Optional[Collection[str]]): The only sources whose chunks may have changed since the last sync, the
+            chunks of other sources are taken to be indexed as listed in the manifest. All chunks are compared if None.
+        checkpoint (Optional[IngestCheckpoint]): How far an interrupted sync of the same data got, counted in new
+            or changed chunks.
+
+    Returns:
+        SyncReport: The number of added, updated, deleted and unchanged vectors.
+    """
+    manifest = load_manifest(manifest_path)
+    if manifest is None:
+        stats = index.describe_index_stats()
+        if checkpoint is not None and checkpoint.offset:
+            # The vectors in the index were upserted by the interrupted first sync, after it cleared the index
+            logger.info("Resuming the first sync of the index")
+        elif stats["total_vector_count"] > 0:
+            # The vectors in the index can't be matched to chunks, start over so that none are left behind
+            logger.warning("No index manifest found, deleting all vectors in the index before syncing")
+            index.delete(delete_all=True)
+        manifest = {}
+
+    hashes: dict[str, str] = {}
+    report = SyncReport()
+
+    def to_upsert() -> Iterator[dict[str, str]]:
+        for item in data:
+            indexed_hash = manifest.get(item["id"])
+            if sources is not None and item["source"] not in sources and indexed_hash is not None:
+                item_hash = indexed_hash
+            else:
+                item_hash = content_hash(item["text"], item["source"], duplicate_sources(item))
+            hashes[item["id"]] = item_hash
+            if indexed_hash is None:
+                report.added += 1
+            elif indexed_hash != item_hash:
+                report.updated += 1
+            else:
+                report.unchanged += 1
+                if not full:
+                    continue
+            yield item
+
+    logger.info("Upserting new and changed vectors...")
+    create_and_index_embeddings(to_upsert(), model, index, cache, options, checkpoint)
+
+    to_delete = [vector_id for vector_id in manifest if vector_id not in hashes]
+    report.deleted = len(to_delete)
+    logger.info(f"Deleting {len(to_delete)} vectors...")
+    for i in range(0, len(to_delete), DELETE_BATCH_SIZE):
+        index.delete(ids=to_delete[i : i + DELETE_BATCH_SIZE])
+
+    if isinstance(index, LocalIndex):
+        # Persist the vectors before the manifest claims they are indexed
+        index.save()
+    save_manifest(manifest_path, hashes)
+    if checkpoint is not None:
+        checkpoint.clear()
+    return report
+
+
+def check_index_consistency(
+    index: VectorIndex,
+    expected: int,
+    attempts: int = CONSISTENCY_CHECK_ATTEMPTS,
+    delay: float = CONSISTENCY_CHECK_DELAY,
+) -> int:
+    """
+    Check that the index holds as many vectors as there are chunks, waiting for its stats to catch up with the sync.
+
+    Args:
+        index (VectorIndex): The Pinecone or local index.
+        expected (int): The number of chunks that were synced.
+        attempts (int): How many times to ask the index for its stats.
+        delay (float): Seconds between attempts.
+
+    Returns:
+        int: The number of vectors the index reported last, equal to `expected` if the index is consistent.
+    """
+    for attempt in range(attempts):
+        count = index.describe_index_stats()["total_vector_count"]
+        if count == expected:
+            break
+        if attempt < attempts - 1:
+            logger.debug(f"The index reports {count} vectors, expected {expected}, checking again in {delay}s")
+            time.sleep(delay)
+    return count
+
+
+def stream_key(*file_paths: str, full: bool = False) -> str:
+    """
+    Identify the stream of chunks a sync upserts, by the size and modification time of the files it is derived from.
+
+    Args:
+        *file_paths (str): The files the chunks and the choice of chunks to upsert come from.
+        full (bool): Whether every chunk is upserted.
+
+    Returns:
+        str: The key of the stream.
+    """
+    stats = [
+        (os.stat(path).st_size, os.stat(path).st_mtime_ns) if os.path.isfile(path) else None for path in file_paths
+    ]
+    return hashlib.sha256(json.dumps([stats, full]).encode("utf-8")).hexdigest()[:16]
+
+
 def main() -> None:
     """
-    Main function to create embeddings and index them in Pinecone.
+    Main function to create embeddings and index them in Pinecone or the local index.
     """
     settings = get_settings()
     openai_api_key = settings.openai_api_key
@@ -108,21 +398,81 @@ def main() -> None:
     output_folder = settings.output_folder
     training_file_path = f"{output_folder}/train.jsonl"
 
-    logger.info("Loading training data...")
-    training_data = load_data(training_file_path)
-    logger.debug(f"Loaded {len(training_data)} training examples from {training_file_path}")
-
     logger.info("Initializing OpenAI model...")
     model = init_openai(openai_api_key)
-    sample_embedding = openai.Embedding.create(input="Doesn't matter", engine=model)["data"][0]["embedding"]
-    embedding_dimension = len(sample_embedding)
 
-    logger.info("Initializing Pinecone index...")
-    pinecone_index = init_pinecone(pinecone_api_key, pinecone_index_name, pinecone_environment, embedding_dimension)
+    if settings.vector_store == "local":
+        logger.info("Loading local vector index...")
+        index: VectorIndex = LocalIndex(f"{output_folder}/{LOCAL_INDEX_FOLDER}")
+        manifest_path = f"{output_folder}/{LOCAL_INDEX_FOLDER}/{INDEX_MANIFEST_FILE}"
+    else:
+        sample_embedding = openai.Embedding.create(input="Doesn't matter", engine=model)["data"][0]["embedding"]
+        embedding_dimension = len(sample_embedding)
+
+        logger.info("Initializing Pinecone index...")
+        index = init_pinecone(pinecone_api_key, pinecone_index_name, pinecone_environment, embedding_dimension)
+        manifest_path = f"{output_folder}/{INDEX_MANIFEST_FILE}"
+
+    cache = None
+    if settings.embedding_cache_enabled:
+        logger.info("Opening embedding cache...")
+        cache = EmbeddingCache(f"{output_folder}/{EMBEDDING_CACHE_FILE}")
+        logger.debug(f"Embedding cache holds {len(cache)} embeddings")
+
+    # Only the chunks of the pages that changed since the last sync need to be compared with the index
+    changes_path = f"{output_folder}/{SPLITS_CHANGES_FILE}"
+    changes = None if settings.index_full_sync else SourceChanges.load(changes_path)
+    if changes is not None:
+        logger.info(f"Syncing the chunks of {len(changes.sources)} changed or removed pages...")
+
+    checkpoint = None
+    # The local index is only saved at the end of a sync, so the vectors it got before a crash are lost with it
+    if settings.vector_store != "local":
+        # Until the sync finishes, the index manifest and pending changes stay as they are, so an interrupted sync
+        # of the same training data upserts the same chunks in the same order and can resume where it stopped
+        key = stream_key(training_file_path, changes_path, manifest_path, full=settings.index_full_sync)
+        checkpoint = IngestCheckpoint(f"{output_folder}/{INGEST_CHECKPOINT_FILE}", key)
+
+    logger.info(f"Creating embeddings from {training_file_path} and syncing index...")
+    report = sync_index(
+        load_data(training_file_path),
+        model,
+        index,
+        manifest_path,
+        cache,
+        full=settings.index_full_sync,
+        options=IngestOptions.from_settings(settings),
+        sources=changes.sources if changes is not None else None,
+        checkpoint=checkpoint,
+    )
+    clear_pending_changes(changes_path)
+    logger.info(
+        f"Added {report.added}, updated {report.updated}, deleted {report.deleted} "
+        f"and left {report.unchanged} vectors unchanged"
+    )
+
+    logger.info("Checking the index against the chunks...")
+    indexed = check_index_consistency(index, report.total)
+    consistent = indexed == report.total
+    if not consistent:
+        # Vectors were lost or written behind the manifest's back
+        fix = "set INDEX_FULL_SYNC=true to upsert" if indexed < report.total else f"delete {manifest_path} to rebuild"
+        logger.error(f"The index holds {indexed} vectors but there are {report.total} chunks, {fix} the index")
+    if cache is not None:
+        cache.close()
+
+    if isinstance(index, LocalIndex) and settings.local_index_type == "ivf":
+        logger.info("Building inverted file index...")
+        index.build_ivf(settings.local_index_ivf_lists or None)
+    if isinstance(index, LocalIndex) and settings.local_index_quantization != "none":
+        logger.info(f"Quantizing vectors to {settings.local_index_quantization}...")
+        index.quantize(settings.local_index_quantization)
 
-    logger.info("Creating embeddings and populating index...")
-    create_and_index_embeddings(training_data, model, pinecone_index)
+    # Let running servers know that the answers they have cached may be stale
+    write_index_version(f"{output_folder}/{INDEX_VERSION_FILE}")
 
+    if not consistent:
+        sys.exit(1)
     logger.info("All done!")
 
 
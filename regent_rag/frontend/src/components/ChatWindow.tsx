@@ -7,7 +7,6 @@ import {
   SendButton,
 } from "./ChatWindow.styles";
 import Message from "./Message";
-import axios from "axios";
 import { ClipLoader } from "react-spinners";
 
 interface ChatMessage {
@@ -36,26 +35,64 @@ const ChatWindow = () => {
     setIsLoading(true);
 
     const userMessage: ChatMessage = { sender: "user", content: userInput };
+    const history = [...chatHistory, userMessage];
 
     // Add the user's message to the chat history
-    setChatHistory([...chatHistory, userMessage]);
+    setChatHistory(history);
+
+    // Update the bot's message in place as events arrive
+    let botMessage: ChatMessage = { sender: "bot", content: "" };
+    const showBotMessage = (update: Partial<ChatMessage>) => {
+      botMessage = { ...botMessage, ...update };
+      setChatHistory([...history, botMessage]);
+    };
 
     try {
-      // Make a POST request to the backend
-      const response = await axios.post("http://localhost:5000/chat", {
-        query: userInput,
+      // Make a POST request to the streaming endpoint of the backend
+      const response = await fetch("http://localhost:5000/chat/stream", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ query: userInput }),
       });
+      if (!response.ok || !response.body) {
+        throw new Error(`Unexpected response status ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+          break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-Sent Events are separated by a blank line
+        const events = buffer.split("\n\n");
+        buffer = events.pop() ?? "";
 
-      // Assume the bot's response is in a field called 'response' in the returned JSON
-      const botResponse = response.data.answer;
+        for (const rawEvent of events) {
+          const lines = rawEvent.split("\n");
+          const event = lines.find((line) => line.startsWith("event: "))?.slice(7);
+          const data = lines.find((line) => line.startsWith("data: "))?.slice(6);
+          if (!event || data === undefined) {
+            continue;
+          }
+          const payload = JSON.parse(data);
 
-      // Add the bot's message to the chat history
-      const botMessage: ChatMessage = {
-        sender: "bot",
-        content: botResponse,
-        sources: response.data.sources,
-      };
-      setChatHistory([...chatHistory, userMessage, botMessage]);
+          if (event === "sources") {
+            // Sources are known as soon as retrieval finishes
+            showBotMessage({ sources: payload });
+          } else if (event === "token") {
+            showBotMessage({ content: botMessage.content + payload });
+          } else if (event === "answer") {
+            // The final answer has the sources cited by the LLM split off
+            showBotMessage({ content: payload.answer, sources: payload.sources });
+          }
+        }
+      }
     } catch (error) {
       console.error("There was an error sending the message:", error);
     }
@@ -0,0 +1,379 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import openai
+import pinecone
+import tiktoken
+import urllib3
+
+from regent_rag.core.logging import logger
+from regent_rag.core.settings import Settings
+
+Vector = tuple[str, list[float], dict[str, Any]]
+
+# Errors worth retrying, the rate limit errors also lower the number of concurrent requests
+RETRYABLE_ERRORS: tuple[type[Exception], ...] = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+)
+RATE_LIMIT_ERRORS: tuple[type[Exception], ...] = (openai.error.RateLimitError,)
+# Errors of the index worth retrying an upsert for: server errors, dropped connections and timeouts
+RETRYABLE_UPSERT_ERRORS: tuple[type[Exception], ...] = (
+    pinecone.exceptions.ServiceException,
+    pinecone.exceptions.PineconeProtocolError,
+    urllib3.exceptions.HTTPError,
+    ConnectionError,
+    TimeoutError,
+)
+
+INGEST_CHECKPOINT_FILE = "ingest_checkpoint.json"
+
+
+@dataclass(frozen=True)
+class IngestOptions:
+    """
+    Tuning knobs of the ingest pipeline.
+    """
+
+    concurrency: int = 8
+    batch_size: int = 128
+    batch_tokens: int = 16000
+    upsert_batch_size: int = 100
+    max_retries: int = 6
+    backoff: float = 1.0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "IngestOptions":
+        return cls(
+            concurrency=settings.ingest_concurrency,
+            batch_size=settings.ingest_batch_size,
+            batch_tokens=settings.ingest_batch_tokens,
+            max_retries=settings.ingest_max_retries,
+            backoff=settings.ingest_backoff,
+        )
+
+
+@dataclass
+class IngestStats:
+    """
+    What happened during an ingest run.
+    """
+
+    batches: int = 0
+    vectors: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    upsert_retries: int = 0
+    concurrency: int = 0
+
+
+def get_token_counter(model: str) -> Callable[[str], int]:
+    """
+    Get a function counting the tokens of a text for the embedding model.
+
+    Args:
+        model (str): The name of the embedding model.
+
+    Returns:
+        Callable[[str], int]: The token counter.
+    """
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def token_batches(
+    items: Iterable[dict[str, str]], count_tokens: Callable[[str], int], max_tokens: int, max_items: int
+) -> Iterator[list[dict[str, str]]]:
+    """
+    Group chunks into batches of at most `max_items` chunks and `max_tokens` tokens.
+    A chunk that is larger than `max_tokens` on its own gets a batch of its own.
+
+    Args:
+        items (Iterable[dict[str, str]]): The chunks to group.
+        count_tokens (Callable[[str], int]): Counts the tokens of a text.
+        max_tokens (int): The maximum number of tokens per batch.
+        max_items (int): The maximum number of chunks per batch.
+
+    Yields:
+        list[dict[str, str]]: The batches.
+    """
+    batch: list[dict[str, str]] = []
+    batch_tokens = 0
+    for item in items:
+        tokens = count_tokens(item["text"])
+        if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+class AdaptiveLimiter:
+    """
+    Limits the number of concurrent requests, halving the limit on every rate limit error
+    and raising it by one again after a run of successful requests (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1) -> None:
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max_limit
+        self._active = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self) -> "AdaptiveLimiter":
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    def on_success(self) -> None:
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify()
+
+    def on_rate_limit(self) -> None:
+        with self._condition:
+            self.limit = max(self.min_limit, self.limit // 2)
+            self._successes = 0
+
+
+class IngestPipeline:
+    """
+    Embeds batches of chunks with a bounded, adaptive number of concurrent requests and hands the vectors
+    to a separate upsert thread through a queue, so embedding and upserting overlap.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[list[dict[str, str]]], list[Vector]],
+        upsert: Callable[[list[Vector]], None],
+        options: IngestOptions = IngestOptions(),
+        retryable_errors: tuple[type[Exception], ...] = RETRYABLE_ERRORS,
+        rate_limit_errors: tuple[type[Exception], ...] = RATE_LIMIT_ERRORS,
+        retryable_upsert_errors: tuple[type[Exception], ...] = RETRYABLE_UPSERT_ERRORS,
+        on_progress: Optional[Callable[[int], None]] = None,
+        on_upserted: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        self._embed = embed
+        self._upsert = upsert
+        self.options = options
+        self._retryable_errors = retryable_errors
+        self._rate_limit_errors = rate_limit_errors
+        self._retryable_upsert_errors = retryable_upsert_errors
+        self._on_progress = on_progress
+        # Called with the position of a batch among the batches once all of its vectors are upserted
+        self._on_upserted = on_upserted
+        self._limiter = AdaptiveLimiter(options.concurrency)
+        self._stats = IngestStats()
+        self._stats_lock = threading.Lock()
+        # Bounded, so that embedding can't run arbitrarily far ahead of a slow index
+        self._upsert_queue: "queue.Queue[Optional[tuple[int, list[Vector]]]]" = queue.Queue(
+            maxsize=options.concurrency * 2
+        )
+        self._upsert_error: Optional[BaseException] = None
+
+    def run(self, batches: Iterable[list[dict[str, str]]]) -> IngestStats:
+        """
+        Embed and upsert every batch.
+
+        Args:
+            batches (Iterable[list[dict[str, str]]]): The batches of chunks to ingest.
+
+        Returns:
+            IngestStats: What happened during the run.
+        """
+        upserter = threading.Thread(target=self._upsert_worker, name="upsert", daemon=True)
+        upserter.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.options.concurrency, thread_name_prefix="embed") as executor:
+                pending: set[Future] = set()
+                for position, batch in enumerate(batches):
+                    # Keep a few batches queued per worker without reading all batches up front
+                    if len(pending) >= self.options.concurrency * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        self._enqueue(done)
+                    pending.add(executor.submit(self._embed_batch, position, batch))
+                self._enqueue(as_completed(pending))
+        finally:
+            self._upsert_queue.put(None)
+            upserter.join()
+
+        if self._upsert_error is not None:
+            raise self._upsert_error
+        self._stats.concurrency = self._limiter.limit
+        return self._stats
+
+    def _enqueue(self, futures: Iterable[Future]) -> None:
+        for future in futures:
+            position, vectors = future.result()
+            if self._upsert_error is not None:
+                raise self._upsert_error
+            self._upsert_queue.put((position, vectors))
+
+    def _embed_batch(self, position: int, batch: list[dict[str, str]]) -> tuple[int, list[Vector]]:
+        return position, self._embed_with_retry(batch)
+
+    def _embed_with_retry(self, batch: list[dict[str, str]]) -> list[Vector]:
+        attempt = 0
+        while True:
+            with self._limiter:
+                try:
+                    vectors = self._embed(batch)
+                except self._retryable_errors as e:
+                    if attempt >= self.options.max_retries:
+                        raise
+                    rate_limited = isinstance(e, self._rate_limit_errors)
+                    if rate_limited:
+                        self._limiter.on_rate_limit()
+                    self._count(retries=1, rate_limited=int(rate_limited))
+                    logger.debug(f"Embedding batch failed with {e!r}, retrying (attempt {attempt + 1})")
+                else:
+                    self._limiter.on_success()
+                    return vectors
+            # Back off outside of the limiter, so other requests may proceed
+            self._back_off(attempt)
+            attempt += 1
+
+    def _upsert_with_retry(self, vectors: list[Vector]) -> None:
+        attempt = 0
+        while True:
+            try:
+                self._upsert(vectors)
+                return
+            except self._retryable_upsert_errors as e:
+                if attempt >= self.options.max_retries:
+                    raise
+                self._count(upsert_retries=1)
+                logger.debug(f"Upserting batch failed with {e!r}, retrying (attempt {attempt + 1})")
+            self._back_off(attempt)
+            attempt += 1
+
+    def _back_off(self, attempt: int) -> None:
+        # Exponentially, with jitter so that retries of concurrent requests spread out
+        time.sleep(self.options.backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+    def _upsert_worker(self) -> None:
+        while (item := self._upsert_queue.get()) is not None:
+            position, vectors = item
+            if self._upsert_error is not None:
+                # Drain the queue so that producers don't block after a failure
+                continue
+            try:
+                for i in range(0, len(vectors), self.options.upsert_batch_size):
+                    self._upsert_with_retry(vectors[i : i + self.options.upsert_batch_size])
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self._upsert_error = e
+                continue
+            self._count(batches=1, vectors=len(vectors))
+            if self._on_progress:
+                self._on_progress(len(vectors))
+            if self._on_upserted:
+                self._on_upserted(position)
+
+    def _count(self, **counts: int) -> None:
+        with self._stats_lock:
+            for name, value in counts.items():
+                setattr(self._stats, name, getattr(self._stats, name) + value)
+
+
+class IngestCheckpoint:
+    """
+    Tracks how many chunks at the start of a stream have been upserted, so that an interrupted ingest can resume
+    after them instead of embedding them again.
+
+    Batches are upserted out of order, so the checkpoint only moves past a batch once every batch before it is
+    upserted too. It is saved with a key identifying the stream, a checkpoint saved for another stream is ignored.
+    """
+
+    def __init__(self, file_path: str, key: str) -> None:
+        self.file_path = file_path
+        self.key = key
+        self.offset = self._load()
+        self._sizes: dict[int, int] = {}
+        self._upserted: set[int] = set()
+        self._next_position = 0
+        self._lock = threading.Lock()
+
+    def track(self, batches: Iterable[list[dict[str, str]]]) -> Iterator[list[dict[str, str]]]:
+        """
+        Pass batches through, remembering their sizes to advance the offset by once they are upserted.
+
+        Args:
+            batches (Iterable[list[dict[str, str]]]): The batches of the chunks after the offset.
+
+        Yields:
+            list[dict[str, str]]: The same batches.
+        """
+        for position, batch in enumerate(batches):
+            with self._lock:
+                self._sizes[position] = len(batch)
+            yield batch
+
+    def upserted(self, position: int) -> None:
+        """
+        Mark a batch as upserted, saving the checkpoint if the offset moved.
+
+        Args:
+            position (int): The position of the batch among the tracked batches.
+        """
+        with self._lock:
+            self._upserted.add(position)
+            offset = self.offset
+            while self._next_position in self._upserted:
+                self._upserted.remove(self._next_position)
+                self.offset += self._sizes.pop(self._next_position)
+                self._next_position += 1
+            if self.offset != offset:
+                self._save()
+
+    def clear(self) -> None:
+        """
+        Remove the saved checkpoint, once the whole stream is ingested.
+        """
+        if os.path.isfile(self.file_path):
+            os.remove(self.file_path)
+
+    def _load(self) -> int:
+        if not os.path.isfile(self.file_path):
+            return 0
+        with open(self.file_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("key") != self.key:
+            logger.info("Ignoring the ingest checkpoint of another run")
+            return 0
+        return checkpoint["offset"]
+
+    def _save(self) -> None:
+        tmp_file_path = f"{self.file_path}.tmp"
+        with open(tmp_file_path, "w", encoding="utf-8") as f:
+            json.dump({"key": self.key, "offset": self.offset}, f)
+            # The checkpoint must not claim more than the index has, even if the machine goes down right after
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file_path, self.file_path)
@@ -0,0 +1,473 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
+from langchain.schema import BaseRetriever, Document
+from langchain.schema.embeddings import Embeddings
+from langchain.vectorstores.base import VectorStore
+
+from regent_rag.core.embedding_batcher import BatchingEmbeddings
+from regent_rag.core.logging import logger
+from regent_rag.core.semantic_cache import INDEX_VERSION_FILE, SemanticCache
+from regent_rag.core.settings import Settings, get_settings
+from regent_rag.retrieval import get_chain, get_embeddings, get_llm, get_retriever_from_vectordb, get_vectordb
+
+
+@dataclass(frozen=True)
+class PipelineComponents:
+    """
+    The long-lived clients that make up a RAG pipeline, built together from one Settings instance.
+    """
+
+    settings: Settings
+    llm: Any
+    embeddings: Embeddings
+    vectordb: VectorStore
+    retriever: BaseRetriever
+    chain: Any
+    cache: Optional[SemanticCache] = None
+
+
+def build_components(settings: Settings) -> PipelineComponents:
+    """
+    Build the LLM, embeddings client, vector store handle, retriever and chain for the given settings.
+
+    Args:
+        settings (Settings): The settings to build the components from.
+
+    Returns:
+        PipelineComponents: The freshly built components.
+    """
+    llm = get_llm(settings)
+    embeddings = get_batching_embeddings(settings, get_embeddings(settings))
+    vectordb = get_vectordb(settings, embeddings)
+    retriever = get_retriever_from_vectordb(settings, vectordb, llm)
+    chain = get_chain(llm, retriever)
+    return PipelineComponents(
+        settings=settings,
+        llm=llm,
+        embeddings=embeddings,
+        vectordb=vectordb,
+        retriever=retriever,
+        chain=chain,
+        cache=get_semantic_cache(settings),
+    )
+
+
+def get_semantic_cache(settings: Settings) -> Optional[SemanticCache]:
+    if not settings.semantic_cache_enabled:
+        return None
+    logger.info("Setting up semantic cache...")
+    return SemanticCache(
+        threshold=settings.semantic_cache_threshold,
+        ttl=settings.semantic_cache_ttl,
+        max_size=settings.semantic_cache_max_size,
+        version_file=f"{settings.output_folder}/{INDEX_VERSION_FILE}",
+        version_interval=settings.semantic_cache_version_interval,
+    )
+
+
+def get_batching_embeddings(settings: Settings, embeddings: Embeddings) -> Embeddings:
+    if not settings.embedding_batch_enabled:
+        return embeddings
+    logger.info("Setting up query embedding batching...")
+    return BatchingEmbeddings(
+        embeddings, window=settings.embedding_batch_window, max_size=settings.embedding_batch_max_size
+    )
+
+
+class TokenQueueHandler(BaseCallbackHandler):
+    """
+    Callback handler that puts every new LLM token on a queue.
+    """
+
+    def __init__(self, tokens: "queue.Queue[Optional[str]]") -> None:
+        self.tokens = tokens
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.tokens.put(token)
+
+
+class AsyncTokenQueueHandler(AsyncCallbackHandler):
+    """
+    Callback handler that puts every new LLM token on an asyncio queue.
+    """
+
+    def __init__(self, tokens: "asyncio.Queue[Optional[str]]") -> None:
+        self.tokens = tokens
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.tokens.put_nowait(token)
+
+
+def get_document_sources(docs: list[Document]) -> list[str]:
+    """
+    Get the unique sources of the documents, in retrieval order, with the URLs of the duplicates of every document
+    after its own source.
+
+    Args:
+        docs (list[Document]): The retrieved documents.
+
+    Returns:
+        list[str]: The unique sources.
+    """
+    sources = (doc.metadata.get("sources") or [doc.metadata["source"]] for doc in docs if "source" in doc.metadata)
+    return list(dict.fromkeys(source for doc_sources in sources for source in doc_sources))
+
+
+def batch_queries_error(body: Any, max_queries: int) -> Optional[str]:
+    """
+    Check the body of a batch request before any of its questions is answered.
+
+    Args:
+        body (Any): The decoded JSON body of the request.
+        max_queries (int): The maximum number of questions in a batch, no limit if 0.
+
+    Returns:
+        Optional[str]: Why the request is rejected, None if it is valid.
+    """
+    queries = body.get("queries") if isinstance(body, dict) else None
+    if not isinstance(queries, list):
+        return 'The body must be a JSON object with a "queries" list'
+    if not all(isinstance(query, str) and query.strip() for query in queries):
+        return "Every query must be a non-empty string"
+    if max_queries and len(queries) > max_queries:
+        return f"At most {max_queries} queries can be asked in one batch"
+    return None
+
+
+class RagPipeline:
+    """
+    A thread-safe RAG pipeline that is built once and shared by every request in the process.
+
+    The components are swapped atomically on `reload`, so a request that is already running keeps using the
+    components it started with while new requests pick up the rebuilt ones.
+    """
+
+    def __init__(
+        self,
+        settings: Optional[Settings] = None,
+        builder: Callable[[Settings], PipelineComponents] = build_components,
+    ) -> None:
+        self._builder = builder
+        self._lock = threading.Lock()
+        logger.info("Building RAG pipeline...")
+        self._components = self._builder(settings or get_settings())
+
+    @property
+    def components(self) -> PipelineComponents:
+        """
+        The components currently in use.
+        """
+        with self._lock:
+            return self._components
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        The hit-rate counters of the semantic cache.
+        """
+        cache = self.components.cache
+        if cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **cache.stats.to_dict()}
+
+    def embedding_batch_stats(self) -> Dict[str, Any]:
+        """
+        The batch fill counters of the query embeddings.
+        """
+        embeddings = self.components.embeddings
+        if not isinstance(embeddings, BatchingEmbeddings):
+            return {"enabled": False}
+        return {"enabled": True, **embeddings.stats.to_dict()}
+
+    def ask(self, query: str) -> Dict[str, Any]:
+        """
+        Answer a question using the shared chain, or the semantic cache if a similar question was answered before.
+
+        Args:
+            query (str): The question to answer.
+
+        Returns:
+            Dict[str, Any]: The chain output, containing at least "answer" and "sources".
+        """
+        components = self.components
+        embedding = components.embeddings.embed_query(query) if components.cache else None
+        cached = _lookup(components, query, embedding)
+        if cached is not None:
+            return cached
+
+        logger.info("Making query...")
+        result = components.chain(query)
+        _store(components, embedding, result)
+        return result
+
+    async def aask(self, query: str) -> Dict[str, Any]:
+        """
+        Answer a question using the shared chain, awaiting the LLM and retrieval calls instead of blocking.
+
+        Args:
+            query (str): The question to answer.
+
+        Returns:
+            Dict[str, Any]: The chain output, containing at least "answer" and "sources".
+        """
+        components = self.components
+        embedding = await components.embeddings.aembed_query(query) if components.cache else None
+        cached = _lookup(components, query, embedding)
+        if cached is not None:
+            return cached
+
+        logger.info("Making async query...")
+        result = await components.chain.acall(query)
+        _store(components, embedding, result)
+        return result
+
+    def stream(self, query: str) -> Iterator[Tuple[str, Any]]:
+        """
+        Answer a question, yielding the sources as soon as retrieval finishes and then the answer tokens
+        as the LLM generates them. Uses the same retriever and chain as `ask`.
+
+        Args:
+            query (str): The question to answer.
+
+        Yields:
+            Tuple[str, Any]: ("sources", list of urls) first, then ("token", str) for every answer token and finally
+            ("answer", {"answer", "sources"}) with the same shape as the /chat response.
+            On a semantic cache hit only the "answer" event is sent.
+        """
+        components = self.components
+        embedding = components.embeddings.embed_query(query) if components.cache else None
+        cached = _lookup(components, query, embedding)
+        if cached is not None:
+            yield "answer", {"answer": cached["answer"], "sources": cached["sources"]}
+            return
+
+        chain = components.chain
+        logger.info("Making streaming query...")
+        docs = chain.retriever.get_relevant_documents(query)
+        yield "sources", get_document_sources(docs)
+
+        tokens: "queue.Queue[Optional[str]]" = queue.Queue()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(
+                chain.combine_documents_chain.run,
+                input_documents=docs,
+                callbacks=[TokenQueueHandler(tokens)],
+                **{chain.question_key: query},
+            )
+            future.add_done_callback(lambda _: tokens.put(None))
+            while (token := tokens.get()) is not None:
+                yield "token", token
+
+            # pylint: disable=protected-access
+            answer, sources = chain._split_sources(future.result())
+        _store(components, embedding, {"answer": answer, "sources": sources})
+        yield "answer", {"answer": answer, "sources": sources}
+
+    async def astream(self, query: str) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Async version of `stream`.
+
+        Args:
+            query (str): The question to answer.
+
+        Yields:
+            Tuple[str, Any]: The same events as `stream`.
+        """
+        components = self.components
+        embedding = await components.embeddings.aembed_query(query) if components.cache else None
+        cached = _lookup(components, query, embedding)
+        if cached is not None:
+            yield "answer", {"answer": cached["answer"], "sources": cached["sources"]}
+            return
+
+        chain = components.chain
+        logger.info("Making async streaming query...")
+        docs = await chain.retriever.aget_relevant_documents(query)
+        yield "sources", get_document_sources(docs)
+
+        tokens: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        task = asyncio.create_task(
+            chain.combine_documents_chain.arun(
+                input_documents=docs,
+                callbacks=[AsyncTokenQueueHandler(tokens)],
+                **{chain.question_key: query},
+            )
+        )
+        task.add_done_callback(lambda _: tokens.put_nowait(None))
+        while (token := await tokens.get()) is not None:
+            yield "token", token
+
+        # pylint: disable=protected-access
+        answer, sources = chain._split_sources(await task)
+        _store(components, embedding, {"answer": answer, "sources": sources})
+        yield "answer", {"answer": answer, "sources": sources}
+
+    def ask_batch(self, queries: List[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Answer many questions, yielding every answer as soon as it is ready rather than in the order of the questions.
+
+        The questions are embedded in one call, for the semantic cache and the first vector search. Up to
+        `batch_search_concurrency` questions are searched at a time, and up to `batch_llm_concurrency` answers are
+        generated at a time from the documents found, so that searching the next questions overlaps with answering
+        the previous ones without flooding the LLM. Questions that are not consumed are cancelled when the generator
+        is closed.
+
+        Args:
+            queries (List[str]): The questions to answer.
+
+        Yields:
+            Dict[str, Any]: The "index" of the question in `queries`, the "query" and either the "answer" and
+            "sources", with the same shape as the /chat response, or the "error" the question failed with.
+        """
+        if not queries:
+            return
+        components = self.components
+        settings, chain = components.settings, components.chain
+        vectors = components.embeddings.embed_documents(queries)
+        results: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        search_pool = ThreadPoolExecutor(max_workers=settings.batch_search_concurrency)
+        llm_pool = ThreadPoolExecutor(max_workers=settings.batch_llm_concurrency)
+
+        def answer(index: int, docs: List[Document]) -> None:
+            query = queries[index]
+            try:
+                output = chain.combine_documents_chain.run(input_documents=docs, **{chain.question_key: query})
+                answer, sources = chain._split_sources(output)  # pylint: disable=protected-access
+                _store(components, vectors[index], {"answer": answer, "sources": sources})
+                results.put({"index": index, "query": query, "answer": answer, "sources": sources})
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                results.put({"index": index, "query": query, "error": repr(e)})
+
+        def search(index: int) -> None:
+            query = queries[index]
+            try:
+                cached = _lookup(components, query, vectors[index])
+                if cached is not None:
+                    results.put(
+                        {"index": index, "query": query, "answer": cached["answer"], "sources": cached["sources"]}
+                    )
+                    return
+                docs = chain.retriever.get_relevant_documents(query)
+                llm_pool.submit(answer, index, docs)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                results.put({"index": index, "query": query, "error": repr(e)})
+
+        logger.info(f"Answering {len(queries)} questions...")
+        with _primed(components.embeddings, queries, vectors):
+            try:
+                for index in range(len(queries)):
+                    search_pool.submit(search, index)
+                for _ in queries:
+                    yield results.get()
+            finally:
+                search_pool.shutdown(cancel_futures=True)
+                llm_pool.shutdown(cancel_futures=True)
+
+    async def aask_batch(self, queries: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async version of `ask_batch`.
+
+        Args:
+            queries (List[str]): The questions to answer.
+
+        Yields:
+            Dict[str, Any]: The same results as `ask_batch`.
+        """
+        if not queries:
+            return
+        components = self.components
+        settings, chain = components.settings, components.chain
+        vectors = await components.embeddings.aembed_documents(queries)
+        searches = asyncio.Semaphore(settings.batch_search_concurrency)
+        completions = asyncio.Semaphore(settings.batch_llm_concurrency)
+
+        async def ask(index: int) -> Dict[str, Any]:
+            query = queries[index]
+            try:
+                cached = _lookup(components, query, vectors[index])
+                if cached is not None:
+                    return {"index": index, "query": query, "answer": cached["answer"], "sources": cached["sources"]}
+                async with searches:
+                    docs = await chain.retriever.aget_relevant_documents(query)
+                async with completions:
+                    output = await chain.combine_documents_chain.arun(
+                        input_documents=docs, **{chain.question_key: query}
+                    )
+                answer, sources = chain._split_sources(output)  # pylint: disable=protected-access
+                _store(components, vectors[index], {"answer": answer, "sources": sources})
+                return {"index": index, "query": query, "answer": answer, "sources": sources}
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                return {"index": index, "query": query, "error": repr(e)}
+
+        logger.info(f"Answering {len(queries)} questions asynchronously...")
+        with _primed(components.embeddings, queries, vectors):
+            tasks = [asyncio.create_task(ask(index)) for index in range(len(queries))]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    yield await task
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    def reload(self, settings: Optional[Settings] = None) -> None:
+        """
+        Rebuild every component, e.g. after the settings or the index have changed.
+
+        Args:
+            settings (Optional[Settings]): The settings to rebuild from. Defaults to freshly read settings.
+        """
+        if settings is None:
+            get_settings.cache_clear()
+            settings = get_settings()
+
+        logger.info("Reloading RAG pipeline...")
+        # Build outside the lock so that requests are not blocked while the new clients are set up
+        components = self._builder(settings)
+        with self._lock:
+            self._components = components
+
+
+def _primed(embeddings: Embeddings, queries: List[str], vectors: List[List[float]]) -> AbstractContextManager:
+    # Lets the searches for the questions use the vectors embedded in bulk, instead of embedding them again
+    if isinstance(embeddings, BatchingEmbeddings):
+        return embeddings.primed(queries, vectors)
+    return nullcontext()
+
+
+def _lookup(components: PipelineComponents, query: str, embedding: Optional[list[float]]) -> Optional[Dict[str, Any]]:
+    if components.cache is None:
+        return None
+    cached = components.cache.lookup(embedding)
+    if cached is None:
+        return None
+    logger.info("Answering from semantic cache...")
+    return {components.chain.question_key: query, **cached}
+
+
+def _store(components: PipelineComponents, embedding: Optional[list[float]], result: Dict[str, Any]) -> None:
+    if components.cache is not None:
+        components.cache.store(embedding, {"answer": result["answer"], "sources": result["sources"]})
+
+
+_pipeline: Optional[RagPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> RagPipeline:
+    """
+    This function returns the process wide RagPipeline, building it on first use.
+    """
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = RagPipeline()
+    return _pipeline
@@ -1,31 +1,217 @@
 import logging
-from typing import Any, Dict
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
 import pinecone
-from langchain.chains import RetrievalQAWithSourcesChain
+from langchain.callbacks.manager import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain.chains import LLMChain, RetrievalQAWithSourcesChain
 from langchain.chat_models import ChatOpenAI
 from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.retrievers.multi_query import MultiQueryRetriever
+from langchain.pydantic_v1 import PrivateAttr
+from langchain.retrievers.multi_query import DEFAULT_QUERY_PROMPT, LineListOutputParser, MultiQueryRetriever
+from langchain.schema import BaseRetriever, Document
+from langchain.schema.embeddings import Embeddings
 from langchain.vectorstores import Pinecone
+from langchain.vectorstores.base import VectorStore, VectorStoreRetriever
 
+from regent_rag.core.bm25 import BM25_FOLDER, Bm25Index
+from regent_rag.core.dedup import duplicate_sources
+from regent_rag.core.extractors import page_url
+from regent_rag.core.local_index import LOCAL_INDEX_FOLDER, LocalIndex, LocalVectorStore
 from regent_rag.core.logging import logger
-from regent_rag.core.settings import Settings, get_settings
+from regent_rag.core.settings import Settings
 
 
-def get_retriever(settings: Settings, llm: Any) -> MultiQueryRetriever:
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing the hits of a vector search with the hits of a BM25 keyword search by reciprocal rank fusion.
+
+    Exact terms like certificate numbers, font names and file names are found by the keyword search even when
+    their embeddings are not close to the question, without asking an LLM to rephrase the question.
+    """
+
+    vectordb: VectorStore
+    bm25: Bm25Index
+    k: int = 4
+    fetch_k: int = 20
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector_docs = self.vectordb.similarity_search(query, k=self.fetch_k)
+        keyword_docs = [keyword_document(self.bm25.documents[i]) for i, _ in self.bm25.search(query, k=self.fetch_k)]
+        return reciprocal_rank_fusion([vector_docs, keyword_docs])[: self.k]
+
+
+def keyword_document(document: Dict[str, Any]) -> Document:
+    """
+    Turn a chunk found by the keyword search into a document with the same metadata as the vector search gives it.
+
+    Args:
+        document (Dict[str, Any]): The chunk, as stored in the keyword index.
+
+    Returns:
+        Document: The document.
+    """
+    metadata: Dict[str, Any] = {"source": page_url(document["source"], document.get("page"))}
+    duplicates = duplicate_sources(document)
+    if duplicates:
+        metadata["sources"] = [metadata["source"], *duplicates]
+    return Document(page_content=document["text"], metadata=metadata)
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = 60) -> List[Document]:
+    """
+    Merge rankings of documents, scoring each document by the sum of 1 / (k + rank) over the rankings it is in.
+
+    Args:
+        rankings (List[List[Document]]): The rankings, best document first.
+        k (int): Dampens the weight of the top ranks, 60 is the value from the original paper.
+
+    Returns:
+        List[Document]: The documents of all rankings, best first.
+    """
+    scores: Dict[tuple[str, str], float] = {}
+    documents: Dict[tuple[str, str], Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            # Documents from different searches only share their text and source
+            key = (doc.metadata.get("source", ""), doc.page_content)
+            scores[key] = scores.get(key, 0.0) + 1 / (k + rank)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.__getitem__, reverse=True)]
+
+
+class AdaptiveMultiQueryRetriever(MultiQueryRetriever):
+    """
+    MultiQueryRetriever that remembers the query variants generated for a question and runs the searches for the
+    variants concurrently.
+
+    With a `score_threshold` it only expands the question when a first vector search finds no chunk with at least
+    that similarity score, so most questions are answered without the extra LLM round trip.
+    """
+
+    vectordb: Optional[VectorStore] = None
+    score_threshold: Optional[float] = None
+    max_workers: int = 4
+    cache_size: int = 1024
+    _variants: "OrderedDict[str, List[str]]" = PrivateAttr(default_factory=OrderedDict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if self.score_threshold is not None and self.vectordb is not None:
+            scored = self.vectordb.similarity_search_with_score(query, k=self._first_pass_k())
+            if scored and scored[0][1] >= self.score_threshold:
+                return self._first_pass_documents(query, scored, run_manager)
+        return super()._get_relevant_documents(query, run_manager=run_manager)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.score_threshold is not None and self.vectordb is not None:
+            scored = await self.vectordb.asimilarity_search_with_score(query, k=self._first_pass_k())
+            if scored and scored[0][1] >= self.score_threshold:
+                if self._is_plain_vector_search():
+                    return [doc for doc, _ in scored]
+                return await self.retriever.aget_relevant_documents(query, callbacks=run_manager.get_child())
+        return await super()._aget_relevant_documents(query, run_manager=run_manager)
+
+    def generate_queries(self, question: str, run_manager: CallbackManagerForRetrieverRun) -> List[str]:
+        cached = self._cached_variants(question)
+        if cached is not None:
+            return cached
+        variants = super().generate_queries(question, run_manager)
+        self._cache_variants(question, variants)
+        return list(variants)
+
+    async def agenerate_queries(self, question: str, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[str]:
+        cached = self._cached_variants(question)
+        if cached is not None:
+            return cached
+        variants = await super().agenerate_queries(question, run_manager)
+        self._cache_variants(question, variants)
+        return list(variants)
+
+    def retrieve_documents(self, queries: List[str], run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        def retrieve(query: str) -> List[Document]:
+            return self.retriever.get_relevant_documents(query, callbacks=run_manager.get_child())
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(queries)))) as executor:
+            document_lists = list(executor.map(retrieve, queries))
+        return [doc for docs in document_lists for doc in docs]
+
+    def _first_pass_k(self) -> int:
+        if isinstance(self.retriever, VectorStoreRetriever):
+            return self.retriever.search_kwargs.get("k", 4)
+        return 1
+
+    def _is_plain_vector_search(self) -> bool:
+        # The first pass then already is what the retriever would return for the question
+        if not isinstance(self.retriever, VectorStoreRetriever):
+            return False
+        return self.retriever.vectorstore is self.vectordb and self.retriever.search_type == "similarity"
+
+    def _first_pass_documents(
+        self, query: str, scored: List[tuple[Document, float]], run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self._is_plain_vector_search():
+            return [doc for doc, _ in scored]
+        return self.retriever.get_relevant_documents(query, callbacks=run_manager.get_child())
+
+    def _cached_variants(self, question: str) -> Optional[List[str]]:
+        with self._lock:
+            variants = self._variants.get(question.strip())
+            if variants is None:
+                return None
+            self._variants.move_to_end(question.strip())
+            return list(variants)
+
+    def _cache_variants(self, question: str, variants: List[str]) -> None:
+        with self._lock:
+            self._variants[question.strip()] = list(variants)
+            self._variants.move_to_end(question.strip())
+            while len(self._variants) > self.cache_size:
+                self._variants.popitem(last=False)
+
+
+def get_retriever(settings: Settings, llm: Any) -> BaseRetriever:
+    embeddings = get_embeddings(settings)
+    vectordb = get_vectordb(settings, embeddings)
+    return get_retriever_from_vectordb(settings, vectordb, llm)
+
+
+def get_retriever_from_vectordb(settings: Settings, vectordb: VectorStore, llm: Any) -> BaseRetriever:
     logger.info("Getting retriever...")
     log_level = settings.log_level
-    if log_level == logging.DEBUG:
+    if log_level == logging.DEBUG and settings.vector_store == "pinecone":
         index = pinecone.Index(settings.pinecone_index_name)
         logger.debug(f'Pinecone stats for index "{settings.pinecone_index_name}\n{index.describe_index_stats()}"')
 
-    embeddings = get_embeddings(settings)
-    vectordb = get_vectordb(settings, embeddings)
+    retriever: BaseRetriever = vectordb.as_retriever()
+    if settings.hybrid_search_enabled:
+        bm25 = get_bm25_index(settings)
+        if bm25 is not None:
+            retriever = HybridRetriever(vectordb=vectordb, bm25=bm25, fetch_k=settings.hybrid_search_fetch_k)
+        else:
+            logger.warning("No BM25 index found, run the splits step to build it. Falling back to vector search")
 
-    # You can return the db itself as a basic retriever
-    # return vectordb.as_retriever()
+    if settings.retrieval_mode == "plain":
+        return retriever
 
-    return MultiQueryRetriever.from_llm(retriever=vectordb.as_retriever(), llm=llm)
+    llm_chain = LLMChain(llm=llm, prompt=DEFAULT_QUERY_PROMPT, output_parser=LineListOutputParser())
+    if settings.retrieval_mode == "adaptive":
+        # The question itself was searched in the first pass, keep its results when expanding
+        return AdaptiveMultiQueryRetriever(
+            retriever=retriever,
+            llm_chain=llm_chain,
+            vectordb=vectordb,
+            score_threshold=settings.retrieval_score_threshold,
+            include_original=True,
+        )
+    return AdaptiveMultiQueryRetriever(retriever=retriever, llm_chain=llm_chain)
 
 
 def get_llm(settings: Settings) -> Any:
@@ -34,6 +220,8 @@ def get_llm(settings: Settings) -> Any:
         openai_api_key=settings.openai_api_key,
         model=settings.openai_model,
         temperature=settings.openai_temperature,
+        # Stream tokens from OpenAI so that /chat/stream can forward them as they are generated
+        streaming=True,
     )
     return llm
 
@@ -44,7 +232,18 @@ def get_embeddings(settings: Settings) -> OpenAIEmbeddings:
     return embeddings
 
 
-def get_vectordb(settings: Settings, embeddings: OpenAIEmbeddings) -> Pinecone:
+def get_vectordb(settings: Settings, embeddings: Embeddings) -> VectorStore:
+    if settings.vector_store == "local":
+        logger.info("Loading local vector index...")
+        # Without probes the index is searched exactly, even if an inverted file index was built
+        nprobe = settings.local_index_ivf_probes if settings.local_index_type == "ivf" else None
+        # Quantized codes are used whenever they were saved with the index, to find candidates to rescore
+        index = LocalIndex(
+            f"{settings.output_folder}/{LOCAL_INDEX_FOLDER}", nprobe=nprobe, rescore=settings.local_index_rescore
+        )
+        logger.debug(f"Local vector index stats: {index.describe_index_stats()}")
+        return LocalVectorStore(index, embeddings, settings.pinecone_text_field)
+
     logger.info("Initializing Pinecone...")
     pinecone_index_name = settings.pinecone_index_name
     pinecone_api_key = settings.pinecone_api_key
@@ -56,23 +255,24 @@ def get_vectordb(settings: Settings, embeddings: OpenAIEmbeddings) -> Pinecone:
     return vectordb
 
 
-def get_chain(llm: Any, retriever: MultiQueryRetriever) -> Any:
+def get_bm25_index(settings: Settings) -> Optional[Bm25Index]:
+    logger.info("Loading BM25 index...")
+    return Bm25Index.load(f"{settings.output_folder}/{BM25_FOLDER}")
+
+
+def get_chain(llm: Any, retriever: BaseRetriever) -> Any:
     logger.info("Setting up chain...")
     chain = RetrievalQAWithSourcesChain.from_chain_type(llm=llm, chain_type="stuff", retriever=retriever)
     return chain
 
 
 def retrieve_answer(query: str) -> Dict[str, Any]:
-    settings = get_settings()
-    llm = get_llm(settings)
-    multi_query_retriever = get_retriever(settings, llm)
-    chain = get_chain(llm, multi_query_retriever)
-    # You can get the unique docs that are retrieved in query
-    # unique_docs = multi_query_retriever.get_relevant_documents(query)
-    # logger.info(unique_docs)
-
-    logger.info("Making query...")
-    return chain(query)
+    # Imported here as the pipeline is built from the functions in this module
+    # pylint: disable=import-outside-toplevel
+    from regent_rag.pipeline import get_pipeline
+
+    # The chain is built once per process and shared between calls
+    return get_pipeline().ask(query)
 
 
 def main() -> None:
@@ -1,93 +1,340 @@
+import asyncio
 import json
 import os
-import re
 import sys
-import urllib.parse
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional
+from typing import Any, Callable, Optional
 from urllib.parse import urlparse
 
+import aiohttp
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
+from regent_rag.core.attachments import AttachmentExtractor, Pages, extract_pages
+from regent_rag.core.changes import SCRAPE_CHANGES_FILE, add_pending_changes, clear_pending_changes
 from regent_rag.core.cookies import get_cookies_and_user_agent_from_file
-from regent_rag.core.extractors import extract_text_from_pdf, extract_text_from_pptx
+from regent_rag.core.crawl_manifest import CRAWL_MANIFEST_FILE, CrawlEntry, CrawlManifest, scrape_filename, text_hash
+from regent_rag.core.crawler import (
+    AsyncCrawlFrontier,
+    AsyncHostLimiter,
+    CrawlAborted,
+    CrawlFrontier,
+    CrawlStats,
+    FetchFailed,
+    HostLimiter,
+)
+from regent_rag.core.extractors import extract_text_and_links_from_html, join_pages
 from regent_rag.core.logging import logger
 from regent_rag.core.path import ensure_dir
 from regent_rag.core.settings import get_settings
 
 CURL_FILE = get_settings().curl_file
 SCRAPE_FOLDER = f"{get_settings().output_folder}/scrape"
+ROOT_URL = "https://intern.regent.se/en/intranat-english"
+NOT_MODIFIED = 304
+GONE_STATUSES = (404, 410)
 
 
-def scrape_website(
-    session: requests.Session,
+def is_file_url(url: str) -> bool:
+    """
+    Check whether a URL points to a file whose text is extracted, rather than to an HTML page.
+
+    Args:
+        url (str): The URL.
+
+    Returns:
+        bool: Whether the URL is a PDF or PowerPoint file.
+    """
+    return url.endswith((".pdf", ".pptx"))
+
+
+def conditional_headers(url: str, manifest: Optional[CrawlManifest]) -> dict[str, str]:
+    """
+    Mark a page as visited by the crawl and get the headers that let the server answer 304 if it did not change.
+
+    Args:
+        url (str): The URL to download.
+        manifest (Optional[CrawlManifest]): The pages saved by the previous crawls, if the crawl is incremental.
+
+    Returns:
+        dict[str, str]: The request headers.
+    """
+    if manifest is None:
+        return {}
+    headers = manifest.visit(url)
+    # Without the saved page there is nothing to keep when the server answers 304
+    return headers if os.path.isfile(scrape_filename(SCRAPE_FOLDER, url)) else {}
+
+
+def failed_links(manifest: Optional[CrawlManifest]) -> Optional[Callable[[str], list[str]]]:
+    """
+    Get the links to follow from pages that failed to download: the links found when they were last downloaded,
+    so that a failing page does not cut the pages below it off the crawl.
+
+    Args:
+        manifest (Optional[CrawlManifest]): The pages saved by the previous crawls, if the crawl is incremental.
+
+    Returns:
+        Optional[Callable[[str], list[str]]]: The links of a failed page by URL, None without a manifest.
+    """
+    return manifest.not_modified if manifest is not None else None
+
+
+def skip_response(url: str, status: int, manifest: Optional[CrawlManifest]) -> Optional[list[str]]:
+    """
+    Check whether a response has no content to save, because the page did not change or no longer exists. Any other
+    error, e.g. 403 Forbidden or 503 Service Unavailable, fails the download so that the saved page is kept.
+
+    Args:
+        url (str): The URL that was downloaded.
+        status (int): The status code of the response.
+        manifest (Optional[CrawlManifest]): The pages saved by the previous crawls, if the crawl is incremental.
+
+    Returns:
+        Optional[list[str]]: The links on the page if the response is skipped, otherwise None.
+
+    Raises:
+        FetchFailed: If the server answered with an error other than 404 or 410.
+    """
+    if manifest is not None and status == NOT_MODIFIED:
+        return manifest.not_modified(url)
+    if status in GONE_STATUSES:
+        logger.warning(f"{url} answered {status}, skipping it")
+        if manifest is not None:
+            manifest.gone(url)
+        return []
+    if status >= 400:
+        raise FetchFailed(f"{url} answered {status}")
+    return None
+
+
+def save_page(
+    url: str,
+    content: bytes,
+    text: str,
+    manifest: Optional[CrawlManifest] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    extractor: Optional[AttachmentExtractor] = None,
+) -> list[str]:
+    """
+    Save the content of a downloaded page or file, unless it is unchanged since the previous crawl.
+
+    Args:
+        url (str): The URL the content was downloaded from.
+        content (bytes): The body of the response.
+        text (str): The body of the response decoded as text, only used for HTML pages.
+        manifest (Optional[CrawlManifest]): The pages saved by the previous crawls, if the crawl is incremental.
+        etag (Optional[str]): The ETag header of the response.
+        last_modified (Optional[str]): The Last-Modified header of the response.
+        extractor (Optional[AttachmentExtractor]): Extracts files in the background, files are saved once their
+            text is extracted. Files are extracted in the calling thread if None.
+
+    Returns:
+        list[str]: The links on the page, as written in the HTML.
+    """
+    # Files are not scanned for links
+    if is_file_url(url):
+        if extractor is not None:
+            extractor.submit(url, content, lambda pages: save_file(url, pages, manifest, etag, last_modified))
+        else:
+            save_file(url, extract_pages(url, content), manifest, etag, last_modified)
+        return []
+
+    # The clean text of the page and its links, in a single parse
+    text_content, links = extract_text_and_links_from_html(text)
+    save_text(url, {"url": url, "content": text_content}, manifest, etag, last_modified, links)
+
+    # If scraping root page and login link was found, stop the crawl
+    if url == ROOT_URL and any("https://intern.regent.se/wp-login.php" in link for link in links):
+        logger.critical("Login link found on root page. You are not authenticated properly!")
+        raise CrawlAborted("Not authenticated")
+
+    return links
+
+
+def save_file(
     url: str,
-    visited: Optional[set[str]] = None,
-    domain: Optional[str] = None,
-    executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=10),
+    pages: Pages,
+    manifest: Optional[CrawlManifest] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
 ) -> None:
-    visited = visited or set()
-    domain = domain or urlparse(url).netloc
+    """
+    Save the text of a PDF or PPTX file, with where each of its pages starts in the text.
 
-    logger.info(f"Downloading {url}...")
+    Args:
+        url (str): The URL the file was downloaded from.
+        pages (Pages): The number and text of every page of the file with text.
+        manifest (Optional[CrawlManifest]): The pages saved by the previous crawls, if the crawl is incremental.
+        etag (Optional[str]): The ETag header of the response.
+        last_modified (Optional[str]): The Last-Modified header of the response.
+    """
+    text_content, page_starts = join_pages(iter(pages))
+    data = {"url": url, "content": text_content, "pages": page_starts}
+    save_text(url, data, manifest, etag, last_modified)
 
+
+def save_text(
+    url: str,
+    data: dict[str, Any],
+    manifest: Optional[CrawlManifest] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    links: Optional[list[str]] = None,
+) -> None:
+    """
+    Write the extracted text of a page or file, unless it is unchanged since the previous crawl.
+
+    Args:
+        url (str): The URL of the page or file.
+        data (dict[str, Any]): What to save, with the extracted text as "content".
+        manifest (Optional[CrawlManifest]): The pages saved by the previous crawls, if the crawl is incremental.
+        etag (Optional[str]): The ETag header of the response.
+        last_modified (Optional[str]): The Last-Modified header of the response.
+        links (Optional[list[str]]): The links on the page.
+    """
     # Parse the URL to create a filename
-    filename = os.path.join(SCRAPE_FOLDER, f"{urllib.parse.quote_plus(url)}.json")
-
-    # Download the HTML content of the webpage
-    response = session.get(url)
-    is_file = False
-
-    if url.endswith(".pdf"):
-        text_content = extract_text_from_pdf(response.content)
-        is_file = True
-    elif url.endswith(".pptx"):
-        text_content = extract_text_from_pptx(response.content)
-        is_file = True
-    else:
-        raw_soup = BeautifulSoup(response.text, "html.parser")
-        soup = BeautifulSoup(response.text, "html.parser")
-        # Remove script and style elements
-        for script_or_style in soup(["script", "style", "link", "header", "footer"]):
-            script_or_style.decompose()
+    filename = scrape_filename(SCRAPE_FOLDER, url)
+
+    # Only rewrite the file when the content changed, so that later stages can skip the page
+    entry = CrawlEntry(text_hash(data["content"]), etag, last_modified, links or [])
+    changed = manifest is None or manifest.record(url, entry)
+    if changed or not os.path.isfile(filename):
+        # Write the URL and the extracted content as a JSON object
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
 
-        text_content = re.sub(r"[\n\t]", "", str(soup))
+def scrape_page(
+    session: requests.Session,
+    url: str,
+    manifest: Optional[CrawlManifest] = None,
+    extractor: Optional[AttachmentExtractor] = None,
+) -> list[str]:
+    """
+    Download a page or file and save its content.
 
-    # Save the URL and the downloaded content into a JSON object
-    data = {"url": url, "content": text_content}
+    Args:
+        session (requests.Session): The authenticated session.
+        url (str): The URL to download.
+        manifest (Optional[CrawlManifest]): The pages saved by the previous crawls, if the crawl is incremental.
+        extractor (Optional[AttachmentExtractor]): Extracts files in the background.
 
-    # Write the JSON object to a file
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f)
+    Returns:
+        list[str]: The links on the page, as written in the HTML.
+    """
+    logger.info(f"Downloading {url}...")
+    response = session.get(url, headers=conditional_headers(url, manifest))
+    links = skip_response(url, response.status_code, manifest)
+    if links is not None:
+        return links
+    return save_page(
+        url,
+        response.content,
+        response.text,
+        manifest,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+        extractor,
+    )
 
-    # Add the URL to the set of visited pages
-    visited.add(url)
 
-    # If the URL was a file, return early, do not scan for links
-    if is_file:
-        return
+async def scrape_page_async(
+    session: aiohttp.ClientSession,
+    url: str,
+    manifest: Optional[CrawlManifest] = None,
+    extractor: Optional[AttachmentExtractor] = None,
+) -> list[str]:
+    """
+    Download a page or file and save its content, without blocking the event loop.
 
-    # Find all links on the webpage
-    links = list({a["href"] for a in raw_soup.find_all("a") if a.has_attr("href")})
+    Args:
+        session (aiohttp.ClientSession): The authenticated session.
+        url (str): The URL to download.
+        manifest (Optional[CrawlManifest]): The pages saved by the previous crawls, if the crawl is incremental.
+        extractor (Optional[AttachmentExtractor]): Extracts files in the background.
 
-    # If scraping root page and login link was found, log critical error and exit
-    if url == "https://intern.regent.se/en/intranat-english" and any(
-        "https://intern.regent.se/wp-login.php" in link for link in links
-    ):
-        logger.critical("Login link found on root page. You are not authenticated properly!")
-        sys.exit(1)
+    Returns:
+        list[str]: The links on the page, as written in the HTML.
+    """
+    logger.info(f"Downloading {url}...")
+    async with session.get(url, headers=conditional_headers(url, manifest)) as response:
+        links = skip_response(url, response.status, manifest)
+        if links is not None:
+            return links
+        content = await response.read()
+        text = "" if is_file_url(url) else await response.text(errors="replace")
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+    # Parsing and writing the page is blocking, keep the event loop free to drive the other downloads
+    return await asyncio.get_running_loop().run_in_executor(
+        None, save_page, url, content, text, manifest, etag, last_modified, extractor
+    )
 
-    for href in links:
-        # Make sure the URL is not None
-        if href is not None:
-            link_domain = urlparse(href).netloc
-            # Make sure the URL is not already visited and in the right domain
-            if href not in visited and link_domain == domain:
-                # Handle relative URLs
-                href = urllib.parse.urljoin(url, href)
-                # Recursively scrape the linked webpage
-                executor.submit(scrape_website, session, href, visited, domain, executor)
+
+def scrape_website(
+    session: requests.Session,
+    url: str,
+    workers: int = 10,
+    host_limiter: Optional[HostLimiter] = None,
+    manifest: Optional[CrawlManifest] = None,
+    extractor: Optional[AttachmentExtractor] = None,
+) -> CrawlStats:
+    """
+    Crawl every page on the domain of `url` that can be reached from it, each page exactly once.
+
+    Args:
+        session (requests.Session): The authenticated session.
+        url (str): The URL to start from.
+        workers (int): The number of pages downloaded concurrently.
+        host_limiter (Optional[HostLimiter]): Politeness limits of the requests to the domain.
+        manifest (Optional[CrawlManifest]): The pages saved by the previous crawls, if the crawl is incremental.
+        extractor (Optional[AttachmentExtractor]): Extracts files in the background, close it to wait for the files
+            still being extracted when the crawl returns.
+
+    Returns:
+        CrawlStats: Counters describing the crawl.
+    """
+    frontier = CrawlFrontier([urlparse(url).netloc], host_limiter, failed_links(manifest))
+    frontier.add(url)
+    return frontier.crawl(lambda page_url: scrape_page(session, page_url, manifest, extractor), workers=workers)
+
+
+async def scrape_website_async(
+    cookies: dict[str, str],
+    user_agent: str,
+    url: str,
+    concurrency: int = 200,
+    host_limiter: Optional[AsyncHostLimiter] = None,
+    manifest: Optional[CrawlManifest] = None,
+    extractor: Optional[AttachmentExtractor] = None,
+) -> CrawlStats:
+    """
+    Crawl every page on the domain of `url` that can be reached from it, each page exactly once, with up to
+    `concurrency` downloads in flight on a single event loop.
+
+    Args:
+        cookies (dict[str, str]): The cookies of the authenticated session.
+        user_agent (str): The User-Agent of the authenticated session.
+        url (str): The URL to start from.
+        concurrency (int): The number of pages downloaded concurrently.
+        host_limiter (Optional[AsyncHostLimiter]): Politeness limits of the requests to the domain.
+        manifest (Optional[CrawlManifest]): The pages saved by the previous crawls, if the crawl is incremental.
+        extractor (Optional[AttachmentExtractor]): Extracts files in the background, close it to wait for the files
+            still being extracted when the crawl returns.
+
+    Returns:
+        CrawlStats: Counters describing the crawl.
+    """
+    # Keep-alive connections are pooled per host and reused across downloads, at most one per concurrent download
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=30)
+    async with aiohttp.ClientSession(
+        connector=connector, cookies=cookies, headers={"User-Agent": user_agent}
+    ) as session:
+        frontier = AsyncCrawlFrontier([urlparse(url).netloc], host_limiter, failed_links(manifest))
+        frontier.add(url)
+        return await frontier.crawl(
+            lambda page_url: scrape_page_async(session, page_url, manifest, extractor), concurrency=concurrency
+        )
 
 
 def main() -> None:
@@ -102,10 +349,55 @@ def main() -> None:
     ensure_dir(SCRAPE_FOLDER)
 
     # Start scraping
-    with requests.Session() as session:
-        session.cookies.update(cookies)
-        session.headers.update({"User-Agent": user_agent})
-        scrape_website(session, "https://intern.regent.se/en/intranat-english")
+    settings = get_settings()
+    manifest = CrawlManifest(f"{settings.output_folder}/{CRAWL_MANIFEST_FILE}") if settings.scrape_incremental else None
+    # PDF and PPTX files are extracted on a process pool, leaving the crawl threads or event loop to the downloads
+    extractor = AttachmentExtractor(
+        settings.attachment_workers or None, settings.attachment_max_bytes, settings.attachment_timeout
+    )
+    with extractor:
+        if settings.scrape_mode == "async":
+            async_limiter = AsyncHostLimiter(settings.scrape_host_concurrency, settings.scrape_host_delay)
+            try:
+                stats = asyncio.run(
+                    scrape_website_async(
+                        cookies,
+                        user_agent,
+                        ROOT_URL,
+                        settings.scrape_async_concurrency,
+                        async_limiter,
+                        manifest,
+                        extractor,
+                    )
+                )
+            except CrawlAborted:
+                sys.exit(1)
+        else:
+            with requests.Session() as session:
+                session.cookies.update(cookies)
+                session.headers.update({"User-Agent": user_agent})
+                # Keep a connection per worker, the default pool of 10 would drop connections with more workers
+                adapter = HTTPAdapter(pool_maxsize=settings.scrape_workers)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+
+                host_limiter = HostLimiter(settings.scrape_host_concurrency, settings.scrape_host_delay)
+                try:
+                    stats = scrape_website(
+                        session, ROOT_URL, settings.scrape_workers, host_limiter, manifest, extractor
+                    )
+                except CrawlAborted:
+                    sys.exit(1)
+        logger.info("Waiting for the last files to be extracted...")
+    logger.info(f"Downloaded {stats.fetched} pages, {stats.failed} failed")
+    logger.info(f"Extracted {extractor.extracted} files, skipped {extractor.skipped}")
+
+    # Tell `make splits` which pages to re-split, or, without a manifest, that every page may have changed
+    changes_path = f"{settings.output_folder}/{SCRAPE_CHANGES_FILE}"
+    if manifest is not None:
+        add_pending_changes(changes_path, manifest.finish(SCRAPE_FOLDER))
+    else:
+        clear_pending_changes(changes_path)
 
 
 if __name__ == "__main__":
@@ -1,33 +1,170 @@
+import bisect
 import hashlib
 import json
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any
+import signal
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import AbstractSet, Any, Iterable, Iterator, Literal, Optional, Sequence
 
+import numpy as np
 import tiktoken
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from tqdm.auto import tqdm
 
+from regent_rag.core.bm25 import BM25_FOLDER, Bm25Index
+from regent_rag.core.boilerplate import BlockCounter, strip_blocks
+from regent_rag.core.changes import (
+    SCRAPE_CHANGES_FILE,
+    SPLITS_CHANGES_FILE,
+    SourceChanges,
+    add_pending_changes,
+    clear_pending_changes,
+)
+from regent_rag.core.crawl_manifest import scrape_filename
+from regent_rag.core.dedup import NearDuplicateIndex
 from regent_rag.core.logging import logger
 from regent_rag.core.settings import get_settings
 
 tokenizer = tiktoken.get_encoding("cl100k_base")
 
+# Every chunk of every page, before duplicates are removed, that the next incremental run starts from
+CHUNKS_FILE = "chunks.jsonl"
+# The chunks without duplicates, that are indexed
+TRAIN_FILE = "train.jsonl"
+# The hashes of the boilerplate blocks the chunks were split without
+BOILERPLATE_FILE = "boilerplate.json"
+# A block is only boilerplate if it is on at least this many pages, however small the site
+BOILERPLATE_MIN_PAGES = 10
+
 
 def tiktoken_len(text: str) -> int:
     tokens = tokenizer.encode(text, disallowed_special=())
     return len(tokens)
 
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=600,
-    chunk_overlap=100,
-    length_function=tiktoken_len,
-    separators=["\n\n", "\n", " ", ""],
-)
+class TokenSplitter:
+    """
+    Splits text into chunks of at most `chunk_size` tokens that overlap by up to `chunk_overlap` tokens.
+
+    The text is encoded once and cut on token offsets, rather than re-encoding candidate substrings while
+    recursing over separators. A chunk ends at the last separator that leaves it at least half full, trying the
+    separators in order (paragraphs, then lines, then words) and cutting after exactly `chunk_size` tokens if none
+    is found. The overlap with the previous chunk starts at a separator as well.
+    """
+
+    def __init__(
+        self,
+        encoding: tiktoken.Encoding,
+        chunk_size: int = 600,
+        chunk_overlap: int = 100,
+        separators: Sequence[str] = ("\n\n", "\n", " "),
+    ) -> None:
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators
+        # The length in bytes of every token, so that the offsets of all tokens are a single cumulative sum
+        self._token_lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+        for token in range(encoding.n_vocab):
+            try:
+                self._token_lengths[token] = len(encoding.decode_single_token_bytes(token))
+            except KeyError:
+                # The vocabulary has a few unused IDs below the special tokens
+                pass
+
+    def split_text(self, text: str) -> list[str]:
+        """
+        Splits text into chunks.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            list[str]: The chunks, without leading or trailing whitespace.
+        """
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def split_spans(self, text: str) -> list[tuple[int, int]]:
+        """
+        Splits text into chunks, returning where each chunk is in the text.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            list[tuple[int, int]]: The start and end character offset of every chunk, without leading or trailing
+                whitespace.
+        """
+        tokens = self.encoding.encode(text, disallowed_special=())
+        offsets = self._char_offsets(text, tokens)
 
+        spans = []
+        start = 0
+        while start < len(tokens):
+            end = len(tokens) if len(tokens) - start <= self.chunk_size else self._cut(text, offsets, start)
+            span_start, span_end = offsets[start], offsets[end]
+            while span_start < span_end and text[span_start].isspace():
+                span_start += 1
+            while span_end > span_start and text[span_end - 1].isspace():
+                span_end -= 1
+            if span_start < span_end:
+                spans.append((span_start, span_end))
+            if end == len(tokens):
+                break
+            start = max(self._overlap_start(text, offsets, end), start + 1)
+        return spans
 
-def process_file(file_path: str) -> list[Any]:
+    def _char_offsets(self, text: str, tokens: list[int]) -> list[int]:
+        # The character offset of every token, and of the end of the text, as in `decode_with_offsets`. Tokens cover
+        # the UTF-8 bytes of the text, and a token starting inside a character starts at that character.
+        byte_offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum(self._token_lengths[np.asarray(tokens, dtype=np.int64)], out=byte_offsets[1:])
+        data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+        byte_chars = np.empty(len(data) + 1, dtype=np.int64)
+        np.cumsum((data & 0xC0) != 0x80, out=byte_chars[:-1])
+        byte_chars[:-1] -= 1
+        byte_chars[-1] = len(text)
+        return byte_chars[byte_offsets].tolist()
+
+    def _cut(self, text: str, offsets: list[int], start: int) -> int:
+        limit = start + self.chunk_size
+        for separator in self.separators:
+            for end in range(limit, start + self.chunk_size // 2, -1):
+                if self._at_separator(text, offsets[end], separator):
+                    return end
+        return limit
+
+    def _overlap_start(self, text: str, offsets: list[int], end: int) -> int:
+        overlap_start = max(end - self.chunk_overlap, 0)
+        for start in range(overlap_start, end):
+            if any(self._at_separator(text, offsets[start], separator) for separator in self.separators):
+                return start
+        return overlap_start
+
+    @staticmethod
+    def _at_separator(text: str, offset: int, separator: str) -> bool:
+        # Separators are usually merged into the token before or after them, e.g. ".\n\n" or " word"
+        return text.startswith(separator, offset) or text.startswith(separator, max(offset - len(separator), 0))
+
+
+text_splitter = TokenSplitter(tokenizer, chunk_size=600, chunk_overlap=100)
+
+
+def init_worker() -> None:
+    """
+    Prepare a worker process of the process pool.
+
+    The tokenizer and splitter are module globals, so each worker loads them once, when it imports this module or
+    inherits it from the parent, rather than once per file.
+    """
+    # Let the parent handle Ctrl-C and shut the pool down, instead of every worker printing a traceback
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    tiktoken_len("")
+
+
+def process_file(file_path: str, boilerplate: AbstractSet[int] = frozenset()) -> list[Any]:
     documents = []
 
     try:
@@ -40,12 +177,24 @@ def process_file(file_path: str) -> list[Any]:
         m.update(file_path.encode("utf-8"))
         uid = m.hexdigest()[:12]
 
-        # Split the content into chunks
-        chunks = text_splitter.split_text(content["content"])
+        # Split the content into chunks, without the blocks that repeat on many pages
+        text = content["content"]
+        stripped, segments = strip_blocks(text, boilerplate)
+        spans = text_splitter.split_spans(stripped)
+
+        # PDF and PPTX files list where each of their pages starts
+        pages = content.get("pages", [])
+        page_starts = [page["start"] for page in pages]
 
-        # Create document data
-        for i, chunk in enumerate(chunks):
-            documents.append({"id": f"{uid}-{i}", "text": chunk, "source": content["url"]})
+        # Create document data, with where each chunk is in the page
+        for i, (start, end) in enumerate(spans):
+            page_start, page_end = page_offset(start, segments), page_offset(end - 1, segments) + 1
+            doc = {"id": f"{uid}-{i}", "text": stripped[start:end], "source": content["url"]}
+            doc.update(start=page_start, end=page_end)
+            if pages:
+                # The page the chunk starts on
+                doc["page"] = pages[max(bisect.bisect_right(page_starts, page_start) - 1, 0)]["page"]
+            documents.append(doc)
 
     except FileNotFoundError:
         logger.error(f"File not found: {file_path}")
@@ -59,32 +208,375 @@ def process_file(file_path: str) -> list[Any]:
     return documents
 
 
-def process_json_files(folder_path: str, output_folder_path: str) -> list[Any]:
-    # Get all files in the folder
-    all_files = os.listdir(folder_path)
+def page_offset(offset: int, segments: list[tuple[int, int]]) -> int:
+    """
+    Maps a character offset in the text without boilerplate back to the page, see `strip_blocks`.
+
+    Args:
+        offset (int): The offset in the text without boilerplate.
+        segments (list[tuple[int, int]]): Where every remaining block starts in that text and in the page.
+
+    Returns:
+        int: The offset in the page.
+    """
+    index = max(bisect.bisect_right(segments, offset, key=lambda segment: segment[0]) - 1, 0)
+    stripped_start, page_start = segments[index]
+    return page_start + offset - stripped_start
+
+
+def find_boilerplate(folder_path: str, fraction: float, min_pages: int = BOILERPLATE_MIN_PAGES) -> frozenset[int]:
+    """
+    Find the blocks that repeat on many scraped pages, like menus, sidebars and cookie banners, in a single pass that
+    reads one page at a time and keeps only the hashes of their blocks, see `BlockCounter`.
+
+    Args:
+        folder_path (str): The folder with the scraped pages.
+        fraction (float): The fraction of the pages a block must occur on to be boilerplate.
+        min_pages (int): The number of pages a block must occur on at least.
+
+    Returns:
+        frozenset[int]: The hashes of the boilerplate blocks.
+    """
+    counter = BlockCounter()
+    for file in sorted(os.listdir(folder_path)):
+        if not file.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(folder_path, file), "r", encoding="utf-8") as f:
+                counter.add(json.load(f)["content"])
+        except (OSError, json.JSONDecodeError, KeyError):
+            # process_file logs the pages that can't be read
+            continue
+    return counter.boilerplate(fraction, min_pages)
+
+
+def load_boilerplate(file_path: str) -> Optional[frozenset[int]]:
+    """
+    Load the hashes of the boilerplate blocks the chunks of the last run were split without.
+
+    Args:
+        file_path (str): The path of the file.
+
+    Returns:
+        Optional[frozenset[int]]: The hashes, or None if the file doesn't exist.
+    """
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, "r", encoding="utf-8") as f:
+        return frozenset(int(value, 16) for value in json.load(f))
+
+
+def save_boilerplate(file_path: str, boilerplate: AbstractSet[int]) -> None:
+    """
+    Save the hashes of the boilerplate blocks the chunks were split without.
+
+    Args:
+        file_path (str): The path of the file.
+        boilerplate (AbstractSet[int]): The hashes.
+    """
+    with open(f"{file_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump([f"{value:016x}" for value in sorted(boilerplate)], f, indent=2)
+    os.replace(f"{file_path}.tmp", file_path)
+
+
+def process_json_files(
+    folder_path: str,
+    output_folder_path: str,
+    executor: Literal["threads", "processes"] = "processes",
+    workers: Optional[int] = None,
+    dedup_threshold: float = 0.0,
+    boilerplate: AbstractSet[int] = frozenset(),
+) -> int:
+    # Get all files in the folder, sorted so that the same chunks are kept of duplicates on every run
+    all_files = sorted(os.listdir(folder_path))
 
     # Filter out JSON files
     json_files = [file for file in all_files if file.endswith(".json")]
 
-    documents = []
+    file_paths = [os.path.join(folder_path, file) for file in json_files]
+    documents = iter_split_files(file_paths, executor, workers, boilerplate)
+    return save_documents(documents, output_folder_path, dedup_threshold)
+
+
+def update_json_files(
+    folder_path: str,
+    output_folder_path: str,
+    changes: SourceChanges,
+    executor: Literal["threads", "processes"] = "processes",
+    workers: Optional[int] = None,
+    dedup_threshold: float = 0.0,
+    boilerplate: AbstractSet[int] = frozenset(),
+) -> int:
+    """
+    Re-split only the pages that changed since the last run, keeping the chunks of every other page.
+
+    The chunks of the last run are read from `chunks.jsonl`, which still has the duplicates removed from
+    `train.jsonl`, so that a page keeps its chunks when the page they duplicated changes.
+
+    Args:
+        folder_path (str): The folder with the scraped pages.
+        output_folder_path (str): The folder with the `chunks.jsonl` of the last run.
+        changes (SourceChanges): The pages that changed or were removed since the last run.
+        executor (Literal["threads", "processes"]): Whether to split the files on threads or processes.
+        workers (Optional[int]): The number of threads or processes, by default one process per core.
+        dedup_threshold (float): The similarity above which chunks are duplicates, see `deduplicate_documents`.
+        boilerplate (AbstractSet[int]): The hashes of the blocks to remove before splitting, the same as in the last
+            run for the chunks of the changed and unchanged pages to match.
+
+    Returns:
+        int: The number of chunks written to `train.jsonl`, those of unchanged pages first.
+    """
+    file_paths = [scrape_filename(folder_path, url) for url in sorted(changes.changed)]
+    file_paths = [file_path for file_path in file_paths if os.path.isfile(file_path)]
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        future_to_file = {executor.submit(process_file, os.path.join(folder_path, file)): file for file in json_files}
-        for future in tqdm(as_completed(future_to_file), total=len(json_files)):
-            documents.extend(future.result())
+    def documents() -> Iterator[Any]:
+        # The previous chunks are streamed from the file that is being replaced, which is only renamed over at the end
+        previous = load_documents(output_folder_path, CHUNKS_FILE)
+        yield from (doc for doc in previous if doc["source"] not in changes.sources)
+        yield from iter_split_files(file_paths, executor, workers, boilerplate)
 
-    # Save the documents to a JSONL file
-    with open(f"{output_folder_path}/train.jsonl", "w", encoding="utf-8") as f:
+    return save_documents(documents(), output_folder_path, dedup_threshold)
+
+
+def split_files(
+    file_paths: list[str],
+    executor: Literal["threads", "processes"] = "processes",
+    workers: Optional[int] = None,
+    boilerplate: AbstractSet[int] = frozenset(),
+) -> list[Any]:
+    """
+    Split files into chunks in parallel, see `iter_split_files`.
+
+    Args:
+        file_paths (list[str]): The scraped pages to split.
+        executor (Literal["threads", "processes"]): Whether to split the files on threads or processes.
+        workers (Optional[int]): The number of threads or processes, by default one process per core or 4 threads.
+        boilerplate (AbstractSet[int]): The hashes of the blocks to remove before splitting, see `find_boilerplate`.
+
+    Returns:
+        list[Any]: The chunks of all files, in the order of the files.
+    """
+    return list(iter_split_files(file_paths, executor, workers, boilerplate))
+
+
+def iter_split_files(
+    file_paths: list[str],
+    executor: Literal["threads", "processes"] = "processes",
+    workers: Optional[int] = None,
+    boilerplate: AbstractSet[int] = frozenset(),
+) -> Iterator[Any]:
+    """
+    Split files into chunks in parallel, yielding the chunks as they are produced instead of collecting them.
+
+    Tokenizing is CPU-bound and holds the GIL, so only a process pool scales with the number of cores. Files are
+    sent to the processes in batches and the chunks of each batch are streamed back as soon as it is done, rather
+    than pickled back as one list at the end.
+
+    Args:
+        file_paths (list[str]): The scraped pages to split.
+        executor (Literal["threads", "processes"]): Whether to split the files on threads or processes.
+        workers (Optional[int]): The number of threads or processes, by default one process per core or 4 threads.
+        boilerplate (AbstractSet[int]): The hashes of the blocks to remove before splitting, see `find_boilerplate`.
+
+    Yields:
+        Any: The chunks of all files, in the order of the files.
+    """
+    if not file_paths:
+        return
+
+    pool: Executor
+    if executor == "processes":
+        workers = workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+    else:
+        workers = workers or 4
+        pool = ThreadPoolExecutor(max_workers=workers)
+    # A few batches per worker keeps them all busy without a round trip per file
+    chunksize = min(64, max(1, len(file_paths) // (workers * 4)))
+
+    with pool:
+        split = partial(process_file, boilerplate=boilerplate)
+        for file_documents in tqdm(pool.map(split, file_paths, chunksize=chunksize), total=len(file_paths)):
+            yield from file_documents
+
+
+def load_documents(output_folder_path: str, file_name: str = TRAIN_FILE) -> Iterator[Any]:
+    """
+    Read chunks back from `train.jsonl` or `chunks.jsonl`, one line at a time.
+
+    Args:
+        output_folder_path (str): The folder with the file.
+        file_name (str): The file to read.
+
+    Yields:
+        Any: The chunks, in the order they were written.
+    """
+    with open(f"{output_folder_path}/{file_name}", "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def save_documents(documents: Iterable[Any], output_folder_path: str, dedup_threshold: float = 0.0) -> int:
+    """
+    Write chunks to `chunks.jsonl` as they come, then without duplicates to `train.jsonl`, and build the keyword
+    index over the written file.
+
+    The chunks go to temporary files that replace the previous ones once they are all written, so that a crash
+    leaves the previous files in place and the chunks never have to be held in memory together.
+
+    Args:
+        documents (Iterable[Any]): The chunks.
+        output_folder_path (str): The folder to write the files to.
+        dedup_threshold (float): The similarity above which chunks are duplicates, see `deduplicate_documents`.
+
+    Returns:
+        int: The number of chunks written to `train.jsonl`.
+    """
+    file_path = f"{output_folder_path}/{CHUNKS_FILE}"
+    with open(f"{file_path}.tmp", "w", encoding="utf-8") as f:
         for doc in documents:
             f.write(json.dumps(doc) + "\n")
+    os.replace(f"{file_path}.tmp", file_path)
 
-    return documents
+    report = deduplicate_documents(output_folder_path, dedup_threshold)
+    if report.removed:
+        logger.info(f"Removed {report.removed} of {report.chunks} chunks as duplicates, {report.removed_tokens} tokens")
+
+    # Build the keyword index over the same chunks, used by hybrid retrieval next to the vector index
+    logger.info("Building BM25 index...")
+    Bm25Index.build(load_documents(output_folder_path)).save(f"{output_folder_path}/{BM25_FOLDER}")
+    return report.chunks - report.removed
+
+
+@dataclass
+class DedupReport:
+    """
+    How many chunks were read and how many of them, and of their tokens, were removed as duplicates.
+    """
+
+    chunks: int = 0
+    removed: int = 0
+    removed_tokens: int = 0
+
+
+def deduplicate_documents(output_folder_path: str, threshold: float) -> DedupReport:
+    """
+    Write the chunks of `chunks.jsonl` to `train.jsonl`, keeping one chunk of every group of duplicates.
+
+    Pages often repeat each other, like the print version of a page or the same notice on many pages, and their
+    chunks would fill the retrieved context with the same text. Chunks whose word shingles are at least `threshold`
+    similar are grouped, see `NearDuplicateIndex`. Of each group the chunk of the shortest URL is kept, with the URLs
+    of all chunks of the group in "sources", which is a list of the chunk's own URL for chunks without duplicates.
+
+    The file is read twice, first to group the chunks, keeping only their signatures and group in memory, then to
+    write the kept chunks.
+
+    Args:
+        output_folder_path (str): The folder with `chunks.jsonl`, to write `train.jsonl` to.
+        threshold (float): The estimated Jaccard similarity above which chunks are duplicates, 0 keeps every chunk.
+
+    Returns:
+        DedupReport: How many chunks and tokens were removed.
+    """
+    index = NearDuplicateIndex(threshold) if threshold > 0 else None
+    groups = array("q")
+    # The chunk kept of every group, as (length of the URL, URL, position), and the URLs of groups of duplicates
+    kept: list[tuple[int, str, int]] = []
+    sources: dict[int, list[str]] = {}
+    for position, doc in enumerate(load_documents(output_folder_path, CHUNKS_FILE)):
+        group = index.add(doc["text"]) if index is not None else position
+        groups.append(group)
+        key = (len(doc["source"]), doc["source"], position)
+        if group == len(kept):
+            kept.append(key)
+        else:
+            sources.setdefault(group, [kept[group][1]]).append(doc["source"])
+            kept[group] = min(kept[group], key)
+
+    report = DedupReport(chunks=len(groups))
+    file_path = f"{output_folder_path}/{TRAIN_FILE}"
+    with open(f"{file_path}.tmp", "w", encoding="utf-8") as f:
+        for position, doc in enumerate(load_documents(output_folder_path, CHUNKS_FILE)):
+            group = groups[position]
+            if kept[group][2] != position:
+                report.removed += 1
+                report.removed_tokens += tiktoken_len(doc["text"])
+                continue
+            doc["sources"] = list(dict.fromkeys([doc["source"], *sources.get(group, [])]))
+            f.write(json.dumps(doc) + "\n")
+    os.replace(f"{file_path}.tmp", file_path)
+    return report
+
+
+def load_duplicate_sources(output_folder_path: str) -> dict[str, tuple[str, frozenset[str]]]:
+    """
+    Read which chunks of `train.jsonl` were kept for duplicates on other pages.
+
+    Args:
+        output_folder_path (str): The folder with `train.jsonl`.
+
+    Returns:
+        dict[str, tuple[str, frozenset[str]]]: The source and the URLs of the duplicates of every such chunk by ID,
+        empty if there is no `train.jsonl` yet.
+    """
+    if not os.path.isfile(f"{output_folder_path}/{TRAIN_FILE}"):
+        return {}
+    return {
+        doc["id"]: (doc["source"], frozenset(doc["sources"]))
+        for doc in load_documents(output_folder_path)
+        if len(doc.get("sources", ())) > 1
+    }
+
+
+def regrouped_sources(
+    before: dict[str, tuple[str, frozenset[str]]], after: dict[str, tuple[str, frozenset[str]]]
+) -> set[str]:
+    """
+    Find the pages with a chunk whose duplicates changed, like a chunk that a page which was just added duplicates.
+
+    Args:
+        before (dict[str, tuple[str, frozenset[str]]]): The chunks with duplicates before splitting, see
+            `load_duplicate_sources`.
+        after (dict[str, tuple[str, frozenset[str]]]): The chunks with duplicates after splitting.
+
+    Returns:
+        set[str]: The sources of the chunks whose duplicates changed.
+    """
+    return {source for _, (source, _) in before.items() ^ after.items()}
 
 
 def main() -> None:
-    output_folder = get_settings().output_folder
+    settings = get_settings()
+    output_folder = settings.output_folder
+    executor, workers = settings.splits_executor, settings.splits_workers or None
+    dedup_threshold = settings.splits_dedup_threshold
     scrape_folder = f"{output_folder}/scrape"
-    process_json_files(scrape_folder, output_folder)
+    scrape_changes_path = f"{output_folder}/{SCRAPE_CHANGES_FILE}"
+    splits_changes_path = f"{output_folder}/{SPLITS_CHANGES_FILE}"
+    boilerplate_path = f"{output_folder}/{BOILERPLATE_FILE}"
+
+    boilerplate: frozenset[int] = frozenset()
+    if settings.splits_boilerplate_fraction > 0:
+        logger.info("Finding boilerplate blocks...")
+        boilerplate = find_boilerplate(scrape_folder, settings.splits_boilerplate_fraction)
+        logger.info(f"Found {len(boilerplate)} blocks on at least {settings.splits_boilerplate_fraction:.0%} of pages")
+
+    changes = SourceChanges.load(scrape_changes_path)
+    # The chunks of unchanged pages can only be kept if they were split without the same boilerplate
+    same_boilerplate = load_boilerplate(boilerplate_path) == boilerplate
+    if changes is not None and os.path.isfile(f"{output_folder}/{CHUNKS_FILE}") and same_boilerplate:
+        logger.info(f"Splitting {len(changes.changed)} changed pages, dropping {len(changes.removed)} removed pages...")
+        duplicates = load_duplicate_sources(output_folder)
+        update_json_files(scrape_folder, output_folder, changes, executor, workers, dedup_threshold, boilerplate)
+        # The chunks of unchanged pages whose duplicates changed have to be indexed again too, with their new sources
+        regrouped = regrouped_sources(duplicates, load_duplicate_sources(output_folder))
+        # Tell `make embeddings` which pages to re-index
+        add_pending_changes(splits_changes_path, SourceChanges(changed=regrouped).merge(changes))
+    else:
+        process_json_files(scrape_folder, output_folder, executor, workers, dedup_threshold, boilerplate)
+        clear_pending_changes(splits_changes_path)
+    save_boilerplate(boilerplate_path, boilerplate)
+    clear_pending_changes(scrape_changes_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,356 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable, List, Optional
+
+from aiohttp import web
+from langchain.llms.base import LLM
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.vectorstores.base import VectorStore
+
+from regent_rag.core.semantic_cache import SemanticCache
+from regent_rag.core.settings import Settings
+from regent_rag.pipeline import PipelineComponents
+from regent_rag.retrieval import get_chain, get_retriever_from_vectordb
+
+FAKE_ANSWER = "The lease time for a staff car is 36 months.\nSOURCES: https://intern.regent.se/en/staff-car/"
+
+
+class FakeLLM(LLM):
+    """
+    An LLM that answers every prompt with the same text after a fixed latency,
+    reporting each word as a new token like a streaming ChatOpenAI does.
+    """
+
+    answer: str = FAKE_ANSWER
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency"
+
+    def _tokens(self) -> List[str]:
+        return re.findall(r"\S+\s*", self.answer)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        time.sleep(self.latency)
+        if run_manager:
+            for token in self._tokens():
+                run_manager.on_llm_new_token(token)
+        return self.answer
+
+    async def _acall(
+        self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> str:
+        await asyncio.sleep(self.latency)
+        if run_manager:
+            for token in self._tokens():
+                await run_manager.on_llm_new_token(token)
+        return self.answer
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic hash based embeddings with a fixed latency per call.
+    """
+
+    def __init__(self, size: int = 64, latency: float = 0.0) -> None:
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [digest[i % len(digest)] / 255 for i in range(self.size)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._embed(text)
+
+
+class FakeVectorStore(VectorStore):
+    """
+    A vector store that returns the same documents for every query after a fixed, blocking latency,
+    like the network round trip of the Pinecone client.
+    """
+
+    def __init__(
+        self, embedding: Embeddings, documents: List[Document], latency: float = 0.0, score: float = 0.9
+    ) -> None:
+        self._embedding = embedding
+        self.documents = documents
+        self.latency = latency
+        self.score = score
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[tuple[Document, float]]:
+        self._embedding.embed_query(query)
+        time.sleep(self.latency)
+        return [(doc, self.score) for doc in self.documents[:k]]
+
+    @classmethod
+    def from_texts(
+        cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any
+    ) -> "FakeVectorStore":
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas or [])]
+        return cls(embedding, documents)
+
+
+class FakeEmbeddingServer:
+    """
+    A local HTTP server speaking the OpenAI embeddings API, with a latency per request and per input.
+    Requests beyond `capacity` concurrent ones are answered with 429, like a rate limited account.
+    """
+
+    def __init__(
+        self, size: int = 64, latency: float = 0.05, input_latency: float = 0.0005, capacity: int = 16
+    ) -> None:
+        self.embeddings = FakeEmbeddings(size=size)
+        self.latency = latency
+        self.input_latency = input_latency
+        self.capacity = capacity
+        self.requests = 0
+        self.rate_limited = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "FakeEmbeddingServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def embed(self, texts: List[str]) -> Optional[List[List[float]]]:
+        with self._lock:
+            self.requests += 1
+            if self._active >= self.capacity:
+                self.rate_limited += 1
+                return None
+            self._active += 1
+        try:
+            time.sleep(self.latency + self.input_latency * len(texts))
+            return self.embeddings.embed_documents(texts)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            # pylint: disable=invalid-name
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                embeds = server.embed(texts) if self.path.endswith("/embeddings") else None
+                if embeds is None:
+                    self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}})
+                else:
+                    data = [{"object": "embedding", "index": i, "embedding": e} for i, e in enumerate(embeds)]
+                    self._send(200, {"object": "list", "data": data, "model": body.get("model", "fake")})
+
+            def _send(self, status: int, payload: dict) -> None:
+                content = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+class FakeSite:
+    """
+    A local website of `pages` interlinked HTML pages, answering every request after `latency` seconds.
+
+    It is served by aiohttp on an event loop in a background thread, so that it can hold thousands of keep-alive
+    connections, and records the client connections, cookies and user agents it has seen. Pages carry an ETag and
+    are answered with 304 when it matches; bump `revisions[number]` to change a page, add it to `removed` to answer
+    404 for it and to `failing` to answer 503.
+    """
+
+    def __init__(self, pages: int = 1000, links: int = 5, latency: float = 0.05) -> None:
+        self.pages = pages
+        self.links = links
+        self.latency = latency
+        self.revisions: dict[int, int] = {}
+        self.removed: set[int] = set()
+        self.failing: set[int] = set()
+        self.requests = 0
+        self.not_modified = 0
+        self.connections: set[tuple] = set()
+        self.cookies: set[Optional[str]] = set()
+        self.user_agents: set[Optional[str]] = set()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._runner: Optional[web.AppRunner] = None
+        self._port = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._port}/page/0"
+
+    def __enter__(self) -> "FakeSite":
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if self._runner is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def page(self, number: int) -> str:
+        # Every page links to the next one, so all of them are reachable, and to a few pseudo-random others,
+        # written in the different ways a URL appears in real HTML
+        targets = [(number + 1) % self.pages] + [(number * 31 + i * 17) % self.pages for i in range(self.links - 1)]
+        links = "".join(
+            f'<li><a href="{href}">Page {target}</a></li>'
+            for i, target in enumerate(targets)
+            for href in [f"/page/{target}#top" if i % 2 else f"{target}"]
+        )
+        text = (
+            " ".join(f"word{(number * 7 + i) % 997}" for i in range(200)) + f" revision {self.revisions.get(number, 0)}"
+        )
+        return (
+            f"<html><head><style>p {{ margin: 0; }}</style><script>var page = {number};</script></head>"
+            f"<body><header>Synthetic site</header><h1>Page {number}</h1><p>{text}</p><ul>{links}</ul>"
+            "<footer>Footer</footer></body></html>"
+        )
+
+    async def _start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/page/{number}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+        self._port = self._runner.addresses[0][1]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        # Handlers all run on the loop thread of the site, the counters need no lock
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info("peername") if request.transport else None)
+        self.cookies.add(request.cookies.get("session"))
+        self.user_agents.add(request.headers.get("User-Agent"))
+        await asyncio.sleep(self.latency)
+        number = int(request.match_info["number"])
+        if number >= self.pages or number in self.removed:
+            raise web.HTTPNotFound()
+        if number in self.failing:
+            raise web.HTTPServiceUnavailable()
+        page = self.page(number)
+        etag = f'"{hashlib.md5(page.encode("utf-8")).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(text=page, content_type="text/html", headers={"ETag": etag})
+
+
+class FakeIndex:
+    """
+    An in-memory stand-in for pinecone.Index with a fixed, blocking latency per upsert.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.vectors: dict[str, tuple[List[float], dict]] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: List[tuple], **_: Any) -> dict:
+        time.sleep(self.latency)
+        with self._lock:
+            for vector_id, values, metadata in vectors:
+                self.vectors[vector_id] = (values, metadata)
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids: List[str], **_: Any) -> dict:
+        with self._lock:
+            for vector_id in ids:
+                self.vectors.pop(vector_id, None)
+        return {}
+
+    def describe_index_stats(self, **_: Any) -> dict:
+        with self._lock:
+            return {"total_vector_count": len(self.vectors)}
+
+
+def fake_documents(count: int = 4) -> List[Document]:
+    return [
+        Document(
+            page_content=f"Staff cars are leased for 36 months. Excerpt {i}.",
+            metadata={"source": f"https://intern.regent.se/en/staff-car/{i}"},
+        )
+        for i in range(count)
+    ]
+
+
+def fake_builder(
+    llm_latency: float = 0.0,
+    search_latency: float = 0.0,
+    embed_latency: float = 0.0,
+    cache: Optional[SemanticCache] = None,
+) -> Any:
+    """
+    Create a pipeline builder that uses fake local backends but the real retriever and chain construction.
+    """
+
+    def build(settings: Settings) -> PipelineComponents:
+        llm = FakeLLM(latency=llm_latency)
+        embeddings = FakeEmbeddings(latency=embed_latency)
+        vectordb = FakeVectorStore(embeddings, fake_documents(), latency=search_latency)
+        retriever = get_retriever_from_vectordb(settings, vectordb, llm)
+        chain = get_chain(llm, retriever)
+        return PipelineComponents(
+            settings=settings,
+            llm=llm,
+            embeddings=embeddings,
+            vectordb=vectordb,
+            retriever=retriever,
+            chain=chain,
+            cache=cache,
+        )
+
+    return build
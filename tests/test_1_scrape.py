@@ -1,13 +1,19 @@
+import asyncio
 import json
 import os
 import tempfile
 import urllib.parse
-from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from unittest.mock import MagicMock, patch
 
 import pytest
+import requests
+from reportlab.pdfgen import canvas
 
 from regent_rag import scrape
+from regent_rag.core.attachments import AttachmentExtractor
+from regent_rag.core.crawl_manifest import CrawlManifest
+from tests.fakes import FakeSite
 
 URL_ROOT = "https://intern.regent.se/en/intranat-english"
 URL_LINK_HREF = "https://intern.regent.se/en/link1"
@@ -19,7 +25,6 @@ class TestScrapeWebsite:
         self.url = URL_ROOT
         self.cookies = {"cookie1": "value1"}
         self.user_agent = "test_agent"
-        self.visited: set[str] = set()
         self.domain = "intern.regent.se"
 
         # Create temporary directory for output
@@ -37,39 +42,36 @@ class TestScrapeWebsite:
 
     @patch.object(scrape, "logger")
     @patch.object(scrape, "requests")
-    @patch.object(scrape, "BeautifulSoup")
     def test_scrape_website(
         self,
-        mock_soup: MagicMock,
         mock_get: MagicMock,
         _: MagicMock,
     ):
         # Set up the mocked responses
         mock_response = MagicMock()
+        mock_response.status_code = 200
 
-        mock_response.text = f"<html><body><a href='{URL_LINK_HREF}'>Link1</a></body></html>"
+        mock_response.text = (
+            "<html><head><title>Staff car</title><script>var page = 1;</script></head><body>"
+            f"<header><a href='{URL_LINK_HREF}'>Link1</a></header><h1>Staff car</h1>"
+            "<p class='lead'>Lease time is <b>36</b> months.</p><footer>Regent</footer></body></html>"
+        )
         mock_get.get.return_value = mock_response
 
-        mock_link = MagicMock()
-        mock_link.has_attr.return_value = True
-        mock_link.__getitem__.return_value = URL_LINK_HREF
-
-        mock_soup.return_value.find_all.return_value = [mock_link]
-
         # Run the function
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            scrape.scrape_website(mock_get, self.url, executor=executor)
+        stats = scrape.scrape_website(mock_get, self.url, workers=2)
+
+        # The link on the linked page points back to itself, every page is downloaded once
+        assert stats.fetched == 2
+        assert mock_get.get.call_count == 2
 
         # Check that the requests.get function was called with the correct arguments
         expected_calls = [
-            ((self.url,),),
-            ((URL_LINK_HREF,),),
+            ((self.url,), {"headers": {}}),
+            ((URL_LINK_HREF,), {"headers": {}}),
         ]
         assert all(call in mock_get.get.call_args_list for call in expected_calls)
 
-        # Check that the BeautifulSoup function was called with the correct arguments
-        mock_soup.assert_called_with(mock_response.text, "html.parser")
-
         # Check that the output files were created and contain the correct data
         for url in [self.url, URL_LINK_HREF]:
             filename = os.path.join(self.output_dir.name, f"{urllib.parse.quote_plus(url)}.json")
@@ -77,4 +79,109 @@ class TestScrapeWebsite:
 
             with open(filename, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                assert data == {"url": url, "content": str(mock_soup.return_value)}
+                # Only the text of the page is kept, without markup or boilerplate
+                assert data == {"url": url, "content": "Staff car\n\nLease time is 36 months."}
+
+    @patch.object(scrape, "logger")
+    def test_scrape_website_async(self, _: MagicMock):
+        with FakeSite(pages=20, links=3, latency=0.01) as site:
+            stats = asyncio.run(
+                scrape.scrape_website_async({"session": "value1"}, self.user_agent, site.url, concurrency=4)
+            )
+
+        # Every page is downloaded once over at most one keep-alive connection per concurrent download,
+        # with the cookies and user agent of the authenticated session
+        assert (stats.fetched, stats.failed) == (20, 0)
+        assert site.requests == 20
+        assert len(site.connections) <= 4
+        assert site.cookies == {"value1"}
+        assert site.user_agents == {self.user_agent}
+        assert len(os.listdir(self.output_dir.name)) == 20
+
+        filename = os.path.join(self.output_dir.name, f"{urllib.parse.quote_plus(site.url)}.json")
+        with open(filename, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        assert data["url"] == site.url
+        assert data["content"].startswith("Page 0\n\nword0 word1")
+        assert "var page" not in data["content"] and "Synthetic site" not in data["content"]
+
+    @patch.object(scrape, "logger")
+    def test_incremental_recrawl(self, _: MagicMock):
+        with (
+            FakeSite(pages=10, links=3, latency=0) as site,
+            requests.Session() as session,
+            tempfile.TemporaryDirectory() as manifest_dir,
+        ):
+            manifest_path = os.path.join(manifest_dir, "crawl_manifest.json")
+            manifest = CrawlManifest(manifest_path)
+            scrape.scrape_website(session, site.url, workers=2, manifest=manifest)
+            first = manifest.finish(self.output_dir.name)
+
+            site.revisions[3] = 1
+            site.removed.add(5)
+            manifest = CrawlManifest(manifest_path)
+            stats = scrape.scrape_website(session, site.url, workers=2, manifest=manifest)
+            second = manifest.finish(self.output_dir.name)
+
+        page_url = site.url[: -len("0")]
+        assert len(first.changed) == 10 and not first.removed
+        # Unchanged pages are answered 304 and keep their links, so the whole site is still reached
+        assert site.not_modified == 8
+        assert stats.fetched == 10
+        assert (second.changed, second.removed) == ({f"{page_url}3"}, {f"{page_url}5"})
+        assert not os.path.isfile(os.path.join(self.output_dir.name, f"{urllib.parse.quote_plus(page_url)}5.json"))
+        assert len(os.listdir(self.output_dir.name)) == 9
+
+    @patch.object(scrape, "logger")
+    def test_failed_pages_keep_their_subtree(self, _: MagicMock):
+        with (
+            FakeSite(pages=10, links=3, latency=0) as site,
+            requests.Session() as session,
+            tempfile.TemporaryDirectory() as manifest_dir,
+        ):
+            manifest_path = os.path.join(manifest_dir, "crawl_manifest.json")
+            manifest = CrawlManifest(manifest_path)
+            scrape.scrape_website(session, site.url, workers=2, manifest=manifest)
+            manifest.finish(self.output_dir.name)
+
+            # The hub every other page is reached from answers 503, in both crawl modes
+            site.failing.add(0)
+            manifest = CrawlManifest(manifest_path)
+            stats = scrape.scrape_website(session, site.url, workers=2, manifest=manifest)
+            changes = manifest.finish(self.output_dir.name)
+            manifest = CrawlManifest(manifest_path)
+            async_stats = asyncio.run(
+                scrape.scrape_website_async({}, self.user_agent, site.url, concurrency=2, manifest=manifest)
+            )
+            async_changes = manifest.finish(self.output_dir.name)
+
+        # The links saved for the hub are followed, nothing is removed and the hub keeps its content
+        assert (stats.fetched, stats.failed) == (async_stats.fetched, async_stats.failed) == (9, 1)
+        assert not changes.changed and not changes.removed
+        assert not async_changes.changed and not async_changes.removed
+        assert len(os.listdir(self.output_dir.name)) == 10
+        with open(
+            os.path.join(self.output_dir.name, f"{urllib.parse.quote_plus(site.url)}.json"), encoding="utf-8"
+        ) as f:
+            assert json.load(f)["content"].startswith("Page 0")
+
+    @patch.object(scrape, "logger")
+    def test_files_are_extracted_in_the_background(self, _: MagicMock):
+        url = "https://intern.regent.se/wp-content/uploads/handbook.pdf"
+        pdf_file = BytesIO()
+        c = canvas.Canvas(pdf_file)
+        for text in ["Lease time is 36 months.", "Fonts are Arial."]:
+            c.drawString(100, 750, text)
+            c.showPage()
+        c.save()
+
+        with AttachmentExtractor(workers=1) as extractor:
+            # The crawl thread only hands the file over, files have no links to follow
+            assert not scrape.save_page(url, pdf_file.getvalue(), "", extractor=extractor)
+
+        with open(os.path.join(self.output_dir.name, f"{urllib.parse.quote_plus(url)}.json"), encoding="utf-8") as f:
+            assert json.load(f) == {
+                "url": url,
+                "content": "Lease time is 36 months.\n\nFonts are Arial.",
+                "pages": [{"page": 1, "start": 0}, {"page": 2, "start": 26}],
+            }
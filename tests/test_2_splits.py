@@ -0,0 +1,189 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+from regent_rag import splits
+from regent_rag.core.changes import SourceChanges
+from regent_rag.core.crawl_manifest import scrape_filename
+
+URL_A = "https://intern.regent.se/en/a"
+URL_B = "https://intern.regent.se/en/b"
+URL_C = "https://intern.regent.se/en/c"
+
+
+class TestUpdateJsonFiles:
+    @pytest.fixture(autouse=True)
+    def setup_and_teardown(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.scrape_folder = os.path.join(self.output_dir.name, "scrape")
+        os.makedirs(self.scrape_folder)
+
+        yield
+
+        self.output_dir.cleanup()
+
+    def write_page(self, url: str, content: str) -> None:
+        with open(scrape_filename(self.scrape_folder, url), "w", encoding="utf-8") as f:
+            json.dump({"url": url, "content": content}, f)
+
+    def test_only_changed_pages_are_split(self):
+        self.write_page(URL_A, "Lease time is 36 months")
+        self.write_page(URL_B, "Fonts")
+        assert splits.process_json_files(self.scrape_folder, self.output_dir.name) == 2
+        before = list(splits.load_documents(self.output_dir.name))
+
+        self.write_page(URL_A, "Lease time is 48 months")
+        os.remove(scrape_filename(self.scrape_folder, URL_B))
+        self.write_page(URL_C, "Logo")
+        self.write_page("https://intern.regent.se/en/untouched", "Not in the changes")
+        changes = SourceChanges(changed={URL_A, URL_C}, removed={URL_B})
+        assert splits.update_json_files(self.scrape_folder, self.output_dir.name, changes) == 2
+        after = list(splits.load_documents(self.output_dir.name))
+
+        assert sorted((doc["source"], doc["text"]) for doc in after) == [
+            (URL_A, "Lease time is 48 months"),
+            (URL_C, "Logo"),
+        ]
+        # Chunk IDs stay the same as when the page is split in a full run
+        assert {doc["id"] for doc in after if doc["source"] == URL_A} == {
+            doc["id"] for doc in before if doc["source"] == URL_A
+        }
+        # The chunks are streamed to temporary files that replace chunks.jsonl and train.jsonl
+        assert set(os.listdir(self.output_dir.name)) == {"bm25", "chunks.jsonl", "scrape", "train.jsonl"}
+
+    def test_duplicates_are_removed_but_kept_for_updates(self):
+        notice = "The office is closed on Friday. " * 40
+        self.write_page(URL_A, notice)
+        self.write_page(URL_B, notice.replace("Friday", "Friday,", 1))
+        self.write_page(URL_C, "Logo")
+        assert splits.process_json_files(self.scrape_folder, self.output_dir.name, dedup_threshold=0.8) == 2
+        kept = list(splits.load_documents(self.output_dir.name))
+
+        assert [(doc["source"], doc["sources"]) for doc in kept] == [(URL_A, [URL_A, URL_B]), (URL_C, [URL_C])]
+        assert len(list(splits.load_documents(self.output_dir.name, splits.CHUNKS_FILE))) == 3
+
+        # B was a duplicate of A, and is indexed again once A changes
+        self.write_page(URL_A, "Lease time is 48 months")
+        changes = SourceChanges(changed={URL_A}, removed=set())
+        assert splits.update_json_files(self.scrape_folder, self.output_dir.name, changes, dedup_threshold=0.8) == 3
+        after = list(splits.load_documents(self.output_dir.name))
+
+        assert sorted(doc["source"] for doc in after) == [URL_A, URL_B, URL_C]
+        assert all(doc["sources"] == [doc["source"]] for doc in after)
+
+    def test_chunks_whose_duplicates_change_are_synced_again(self):
+        notice = "The office is closed on Friday. " * 40
+        self.write_page(URL_A, notice)
+        self.write_page(URL_C, "Logo")
+        splits.process_json_files(self.scrape_folder, self.output_dir.name, dedup_threshold=0.8)
+        before = splits.load_duplicate_sources(self.output_dir.name)
+
+        # C becomes a duplicate of A, whose own page is unchanged
+        self.write_page(URL_C, notice)
+        changes = SourceChanges(changed={URL_C}, removed=set())
+        splits.update_json_files(self.scrape_folder, self.output_dir.name, changes, dedup_threshold=0.8)
+        after = splits.load_duplicate_sources(self.output_dir.name)
+
+        assert before == {}
+        assert list(after.values()) == [(URL_A, frozenset({URL_A, URL_C}))]
+        assert splits.regrouped_sources(before, after) == {URL_A}
+        assert splits.regrouped_sources(after, after) == set()
+
+    def test_dedup_report(self):
+        self.write_page(URL_A, "Lease time is 36 months")
+        self.write_page(URL_B, "Lease time is 36 months")
+        self.write_page(URL_C, "Lease time is 36 months")
+        splits.process_json_files(self.scrape_folder, self.output_dir.name)
+
+        report = splits.deduplicate_documents(self.output_dir.name, 0.8)
+
+        assert report == splits.DedupReport(
+            chunks=3, removed=2, removed_tokens=2 * splits.tiktoken_len("Lease time is 36 months")
+        )
+        assert [doc["sources"] for doc in splits.load_documents(self.output_dir.name)] == [[URL_A, URL_B, URL_C]]
+
+    def test_process_pool_matches_thread_pool(self):
+        for i in range(6):
+            self.write_page(
+                f"https://intern.regent.se/en/page-{i}", "\n\n".join(f"Paragraph {j} " * 150 for j in range(i))
+            )
+        file_paths = sorted(
+            scrape_filename(self.scrape_folder, f"https://intern.regent.se/en/page-{i}") for i in range(6)
+        )
+
+        in_processes = splits.split_files(file_paths, "processes", workers=2)
+
+        assert in_processes == splits.split_files(file_paths, "threads", workers=2)
+        # Chunks come back in the order of the files, whichever worker split them
+        assert [doc["source"] for doc in in_processes] == sorted(doc["source"] for doc in in_processes)
+        assert len(in_processes) > 6
+
+    def test_chunks_of_files_know_their_page(self):
+        url = "https://intern.regent.se/wp-content/uploads/handbook.pdf"
+        pages = ["Lease time is 36 months. " * 150, "Fonts are Arial and Georgia. " * 150, "Logo"]
+        content = "\n\n".join(pages)
+        starts = [0, len(pages[0]) + 2, len(pages[0]) + len(pages[1]) + 4]
+        with open(scrape_filename(self.scrape_folder, url), "w", encoding="utf-8") as f:
+            json.dump(
+                {"url": url, "content": content, "pages": [{"page": p, "start": s} for p, s in zip([1, 2, 4], starts)]},
+                f,
+            )
+
+        documents = splits.process_file(scrape_filename(self.scrape_folder, url))
+
+        # Every chunk is on the page its first character is on
+        assert [doc["page"] for doc in documents] == sorted(doc["page"] for doc in documents)
+        assert {doc["page"] for doc in documents} == {1, 2}
+        for doc in documents:
+            page_text = pages[[1, 2, 4].index(doc["page"])]
+            assert doc["text"][:20] in page_text
+        # The short last page is in the chunk that starts on the page before it
+        assert documents[-1]["text"].endswith("Georgia. \n\nLogo")
+
+    def test_boilerplate_is_removed_before_splitting(self):
+        menu = "Start\nNews\nStaff car\nBrand"
+        cookies = "We use cookies to improve the intranet."
+        for i in range(4):
+            self.write_page(f"https://intern.regent.se/en/page-{i}", f"Page {i}\n\n{menu}\n\nText {i}\n\n{cookies}")
+        self.write_page(URL_A, f"Staff car\n\n{menu}\n\n" + "Lease time is 36 months. " * 200)
+
+        boilerplate = splits.find_boilerplate(self.scrape_folder, 0.5, min_pages=3)
+        documents = splits.split_files([scrape_filename(self.scrape_folder, URL_A)], "threads", 1, boilerplate)
+
+        assert len(boilerplate) == 2
+        assert all("News" not in doc["text"] for doc in documents)
+        assert documents[0]["text"].startswith("Staff car\n\nLease time")
+        # Offsets are in the scraped page, boilerplate included
+        with open(scrape_filename(self.scrape_folder, URL_A), encoding="utf-8") as f:
+            content = json.load(f)["content"]
+        assert documents[0]["start"] == 0
+        for doc in documents[1:]:
+            assert content[doc["start"] : doc["end"]] == doc["text"]
+
+
+class TestTokenSplitter:
+    def test_chunks_fit_and_overlap(self):
+        splitter = splits.TokenSplitter(splits.tokenizer, chunk_size=50, chunk_overlap=10)
+        paragraphs = [" ".join(f"word{i}-{j}" for j in range(12)) + "." for i in range(12)]
+        text = "\n\n".join(paragraphs) + "\n\n" + "Ünïcode 😀 " * 40
+
+        spans = splitter.split_spans(text)
+
+        assert len(spans) > 3
+        for (start, end), (next_start, _) in zip(spans, spans[1:]):
+            chunk = text[start:end]
+            assert splits.tiktoken_len(chunk) <= 50
+            assert chunk == chunk.strip()
+            # Consecutive chunks overlap, and the overlap starts on a word
+            assert start < next_start < end
+            assert text[next_start - 1].isspace()
+        # Chunks end at paragraph breaks where there are any
+        assert text[spans[0][1] : spans[0][1] + 2] == "\n\n"
+        assert splitter.split_text(text) == [text[start:end] for start, end in spans]
+        assert text[spans[-1][0] : spans[-1][1]].endswith("😀")
+
+    def test_short_text_is_one_chunk(self):
+        assert splits.text_splitter.split_text("  Lease time is 36 months\n") == ["Lease time is 36 months"]
+        assert splits.text_splitter.split_text(" \n ") == []
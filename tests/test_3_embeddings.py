@@ -0,0 +1,184 @@
+import json
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from regent_rag import embeddings
+from regent_rag.core.embedding_cache import EMBEDDING_CACHE_FILE, EmbeddingCache
+from regent_rag.core.local_index import LocalIndex
+from regent_rag.ingest import INGEST_CHECKPOINT_FILE, IngestCheckpoint, IngestOptions
+
+
+def fake_embedding_create(input: list[str], **_: str) -> dict:  # pylint: disable=redefined-builtin
+    return {"data": [{"embedding": [float(len(text)), 1.0]} for text in input]}
+
+
+def chunk(uid: str, text: str) -> dict[str, str]:
+    return {"id": uid, "text": text, "source": "https://intern.regent.se/en/staff-car/"}
+
+
+class TestSyncIndex:
+    @pytest.fixture(autouse=True)
+    def setup_and_teardown(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.output_dir.name, embeddings.INDEX_MANIFEST_FILE)
+        self.index = MagicMock()
+        self.index.describe_index_stats.return_value = {"total_vector_count": 0}
+
+        # Count characters rather than tokens, so that no tokenizer has to be downloaded
+        with (
+            patch.object(embeddings.openai.Embedding, "create", side_effect=fake_embedding_create),
+            patch.object(embeddings, "get_token_counter", return_value=len),
+        ):
+            yield
+
+        self.output_dir.cleanup()
+
+    def upserted_ids(self) -> list[str]:
+        return [vector[0] for call in self.index.upsert.call_args_list for vector in call.kwargs["vectors"]]
+
+    def test_first_sync_adds_everything_with_stable_ids(self):
+        data = [chunk("abc-0", "Lease time is 36 months"), chunk("abc-1", "Fonts")]
+
+        report = embeddings.sync_index(data, "text-embedding-ada-002", self.index, self.manifest_path)
+
+        assert report == embeddings.SyncReport(added=2)
+        assert self.upserted_ids() == ["abc-0", "abc-1"]
+        metadata = self.index.upsert.call_args.kwargs["vectors"][0][2]
+        assert metadata["hash"] == embeddings.content_hash("Lease time is 36 months", data[0]["source"])
+
+    def test_resync_only_touches_the_delta(self):
+        data = [chunk("abc-0", "Lease time is 36 months"), chunk("abc-1", "Fonts"), chunk("def-0", "Logo")]
+        embeddings.sync_index(data, "text-embedding-ada-002", self.index, self.manifest_path)
+        self.index.reset_mock()
+
+        new_data = [chunk("abc-0", "Lease time is 36 months"), chunk("abc-1", "Fonts: Arial"), chunk("ghi-0", "ISO")]
+        report = embeddings.sync_index(new_data, "text-embedding-ada-002", self.index, self.manifest_path)
+
+        assert report == embeddings.SyncReport(added=1, updated=1, deleted=1, unchanged=1)
+        assert self.upserted_ids() == ["abc-1", "ghi-0"]
+        self.index.delete.assert_called_once_with(ids=["def-0"])
+
+    def test_resync_of_changed_sources(self):
+        other = {"id": "def-0", "text": "Logo", "source": "https://intern.regent.se/en/brand/"}
+        data = [chunk("abc-0", "Lease time is 36 months"), chunk("abc-1", "Fonts"), other]
+        embeddings.sync_index(data, "text-embedding-ada-002", self.index, self.manifest_path)
+        self.index.reset_mock()
+
+        new_data = [chunk("abc-0", "Lease time is 48 months"), dict(other, text="Logo")]
+        report = embeddings.sync_index(
+            new_data, "text-embedding-ada-002", self.index, self.manifest_path, sources={chunk("", "")["source"]}
+        )
+
+        # The chunks of other sources are not hashed again, chunks that disappeared are still deleted
+        assert report == embeddings.SyncReport(updated=1, deleted=1, unchanged=1)
+        assert self.upserted_ids() == ["abc-0"]
+        self.index.delete.assert_called_once_with(ids=["abc-1"])
+
+    def test_duplicates_are_indexed_with_their_sources(self):
+        other = "https://intern.regent.se/en/print/staff-car/"
+        data = [dict(chunk("abc-0", "Lease time is 36 months"), sources=[chunk("", "")["source"], other])]
+        embeddings.sync_index(data, "text-embedding-ada-002", self.index, self.manifest_path)
+        metadata = self.index.upsert.call_args.kwargs["vectors"][0][2]
+        self.index.reset_mock()
+
+        # The duplicate is gone, the chunk's own source is changed too when it is split again
+        new_data = [dict(data[0], sources=[data[0]["source"]])]
+        report = embeddings.sync_index(
+            new_data, "text-embedding-ada-002", self.index, self.manifest_path, sources={data[0]["source"]}
+        )
+
+        assert metadata["sources"] == [data[0]["source"], other]
+        assert metadata["hash"] != embeddings.content_hash(data[0]["text"], data[0]["source"])
+        assert report == embeddings.SyncReport(updated=1)
+        assert "sources" not in self.index.upsert.call_args.kwargs["vectors"][0][2]
+
+    def test_full_resync_reuses_cached_embeddings(self):
+        cache_path = os.path.join(self.output_dir.name, EMBEDDING_CACHE_FILE)
+        data = [chunk("abc-0", "Lease time is 36 months"), chunk("abc-1", "Fonts")]
+        cache = EmbeddingCache(cache_path)
+        embeddings.sync_index(data, "text-embedding-ada-002", self.index, self.manifest_path, cache=cache)
+        cache.close()
+        self.index.reset_mock()
+
+        # The cache starts empty, the first sync must still fill it
+        cache = EmbeddingCache(cache_path)
+        report = embeddings.sync_index(data, "text-embedding-ada-002", self.index, self.manifest_path, cache, full=True)
+
+        assert len(cache) == 2
+        cache.close()
+        assert report == embeddings.SyncReport(unchanged=2)
+        assert self.upserted_ids() == ["abc-0", "abc-1"]
+        assert embeddings.openai.Embedding.create.call_count == 1
+
+    def test_missing_manifest_clears_legacy_vectors(self):
+        self.index.describe_index_stats.return_value = {"total_vector_count": 3}
+
+        embeddings.sync_index([chunk("abc-0", "Fonts")], "text-embedding-ada-002", self.index, self.manifest_path)
+
+        self.index.delete.assert_called_once_with(delete_all=True)
+
+    def test_sync_to_local_index(self):
+        folder = os.path.join(self.output_dir.name, "local_index")
+        manifest_path = os.path.join(folder, embeddings.INDEX_MANIFEST_FILE)
+        data = [chunk("abc-0", "Lease time is 36 months"), chunk("abc-1", "Fonts")]
+        embeddings.sync_index(data, "text-embedding-ada-002", LocalIndex(folder), manifest_path)
+
+        index = LocalIndex(folder)
+        report = embeddings.sync_index(data[:1], "text-embedding-ada-002", index, manifest_path)
+
+        assert report == embeddings.SyncReport(deleted=1, unchanged=1)
+        assert LocalIndex(folder).describe_index_stats()["total_vector_count"] == 1
+
+    def test_streamed_sync_resumes_from_checkpoint(self):
+        train_path = os.path.join(self.output_dir.name, "train.jsonl")
+        with open(train_path, "w", encoding="utf-8") as f:
+            for i in range(6):
+                f.write(json.dumps(chunk(f"abc-{i}", f"Chunk {i}")) + "\n")
+        checkpoint_path = os.path.join(self.output_dir.name, INGEST_CHECKPOINT_FILE)
+        options = IngestOptions(concurrency=1, batch_size=2)
+
+        # The first sync dies while upserting the third batch
+        self.index.upsert.side_effect = [None, None, RuntimeError("Connection reset")]
+        checkpoint = IngestCheckpoint(checkpoint_path, "train")
+        with pytest.raises(RuntimeError):
+            embeddings.sync_index(
+                embeddings.load_data(train_path),
+                "text-embedding-ada-002",
+                self.index,
+                self.manifest_path,
+                options=options,
+                checkpoint=checkpoint,
+            )
+        assert IngestCheckpoint(checkpoint_path, "train").offset == 4
+        assert not os.path.isfile(self.manifest_path)
+
+        # The next sync doesn't clear the index again and only embeds the chunks after the checkpoint
+        self.index.reset_mock()
+        self.index.upsert.side_effect = None
+        self.index.describe_index_stats.return_value = {"total_vector_count": 4}
+        report = embeddings.sync_index(
+            embeddings.load_data(train_path),
+            "text-embedding-ada-002",
+            self.index,
+            self.manifest_path,
+            options=options,
+            checkpoint=IngestCheckpoint(checkpoint_path, "train"),
+        )
+
+        assert report == embeddings.SyncReport(added=6)
+        assert self.upserted_ids() == ["abc-4", "abc-5"]
+        self.index.delete.assert_not_called()
+        assert not os.path.isfile(checkpoint_path)
+        assert sorted(embeddings.load_manifest(self.manifest_path)) == [f"abc-{i}" for i in range(6)]
+
+    def test_consistency_check_waits_for_index_stats(self):
+        self.index.describe_index_stats.side_effect = [{"total_vector_count": count} for count in (1, 2, 3)]
+
+        assert embeddings.check_index_consistency(self.index, 3, attempts=3, delay=0) == 3
+
+        self.index.describe_index_stats.side_effect = None
+        self.index.describe_index_stats.return_value = {"total_vector_count": 2}
+        assert embeddings.check_index_consistency(self.index, 3, attempts=2, delay=0) == 2
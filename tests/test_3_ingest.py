@@ -0,0 +1,129 @@
+import os
+import tempfile
+import threading
+
+import openai
+import pytest
+
+from regent_rag.ingest import AdaptiveLimiter, IngestCheckpoint, IngestOptions, IngestPipeline, token_batches
+
+
+def chunk(uid: str, text: str) -> dict[str, str]:
+    return {"id": uid, "text": text, "source": "https://intern.regent.se/en/staff-car/"}
+
+
+def test_token_batches_respects_token_and_item_limits():
+    items = [chunk(str(i), "x" * size) for i, size in enumerate([3, 3, 3, 9, 1, 1, 1])]
+
+    batches = list(token_batches(items, len, max_tokens=7, max_items=2))
+
+    assert [[item["id"] for item in batch] for batch in batches] == [["0", "1"], ["2"], ["3"], ["4", "5"], ["6"]]
+
+
+def test_limiter_halves_on_rate_limit_and_recovers():
+    limiter = AdaptiveLimiter(max_limit=8)
+
+    limiter.on_rate_limit()
+    limiter.on_rate_limit()
+    assert limiter.limit == 2
+
+    for _ in range(2):
+        limiter.on_success()
+    assert limiter.limit == 3
+
+
+class TestIngestPipeline:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.upserted: list[str] = []
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def upsert(self, vectors):
+        self.upserted.extend(vector[0] for vector in vectors)
+
+    def embed(self, batch):
+        return [(item["id"], [1.0], {"text": item["text"]}) for item in batch]
+
+    def test_embeds_and_upserts_every_batch(self):
+        batches = [[chunk(f"{i}-{j}", "text") for j in range(3)] for i in range(20)]
+
+        stats = IngestPipeline(self.embed, self.upsert, IngestOptions(concurrency=4)).run(batches)
+
+        assert sorted(self.upserted) == sorted(item["id"] for batch in batches for item in batch)
+        assert (stats.batches, stats.vectors) == (20, 60)
+
+    def test_retries_rate_limited_batches(self):
+        def flaky_embed(batch):
+            with self.lock:
+                self.calls += 1
+                calls = self.calls
+            if calls <= 2:
+                raise openai.error.RateLimitError("Rate limit reached")
+            return self.embed(batch)
+
+        options = IngestOptions(concurrency=4, backoff=0.001)
+        stats = IngestPipeline(flaky_embed, self.upsert, options).run([[chunk("a-0", "text")], [chunk("b-0", "text")]])
+
+        assert sorted(self.upserted) == ["a-0", "b-0"]
+        assert stats.rate_limited == 2
+        assert stats.concurrency < 4
+
+    def test_gives_up_after_max_retries(self):
+        def failing_embed(batch):
+            raise openai.error.RateLimitError("Rate limit reached")
+
+        options = IngestOptions(concurrency=2, max_retries=2, backoff=0.001)
+        with pytest.raises(openai.error.RateLimitError):
+            IngestPipeline(failing_embed, self.upsert, options).run([[chunk("a-0", "text")]])
+
+    def test_retries_failed_upserts(self):
+        failures = [ConnectionError("Connection reset"), TimeoutError("Read timed out")]
+
+        def flaky_upsert(vectors):
+            if failures:
+                raise failures.pop()
+            self.upsert(vectors)
+
+        options = IngestOptions(concurrency=2, backoff=0.001)
+        stats = IngestPipeline(self.embed, flaky_upsert, options).run([[chunk("a-0", "text")], [chunk("b-0", "text")]])
+
+        assert sorted(self.upserted) == ["a-0", "b-0"]
+        assert (stats.batches, stats.upsert_retries) == (2, 2)
+
+    def test_reports_upserted_batches_until_an_upsert_fails(self):
+        def failing_upsert(vectors):
+            if vectors[0][0] == "b-0":
+                raise ValueError("Vector dimension 1 does not match the dimension of the index 1536")
+            self.upsert(vectors)
+
+        upserted_positions: list[int] = []
+        options = IngestOptions(concurrency=1, backoff=0.001)
+        pipeline = IngestPipeline(self.embed, failing_upsert, options, on_upserted=upserted_positions.append)
+        # Errors that retrying won't fix fail the run right away
+        with pytest.raises(ValueError):
+            pipeline.run([[chunk("a-0", "text")], [chunk("b-0", "text")], [chunk("c-0", "text")]])
+
+        assert upserted_positions == [0]
+
+
+def test_checkpoint_advances_over_contiguous_batches():
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = os.path.join(folder, "ingest_checkpoint.json")
+        checkpoint = IngestCheckpoint(file_path, "train-1")
+        batches = [[chunk(f"{i}-{j}", "text") for j in range(i + 1)] for i in range(3)]
+        assert list(checkpoint.track(batches)) == batches
+
+        # The third batch is upserted first, the offset only moves once the batches before it are upserted
+        checkpoint.upserted(2)
+        assert checkpoint.offset == 0 and not os.path.isfile(file_path)
+        checkpoint.upserted(0)
+        assert checkpoint.offset == 1
+        assert IngestCheckpoint(file_path, "train-1").offset == 1
+        checkpoint.upserted(1)
+        assert IngestCheckpoint(file_path, "train-1").offset == 6
+
+        # A checkpoint of another stream is ignored
+        assert IngestCheckpoint(file_path, "train-2").offset == 0
+        checkpoint.clear()
+        assert IngestCheckpoint(file_path, "train-1").offset == 0
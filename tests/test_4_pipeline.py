@@ -0,0 +1,164 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from unittest.mock import MagicMock, patch
+
+from regent_rag.core.embedding_batcher import BatchingEmbeddings
+from regent_rag.core.semantic_cache import SemanticCache
+from regent_rag.core.settings import Settings
+from regent_rag.pipeline import PipelineComponents, RagPipeline, get_batching_embeddings
+from tests.fakes import FAKE_ANSWER, FakeEmbeddings, FakeLLM, FakeVectorStore, fake_builder, fake_documents
+
+
+def make_builder(answer: str) -> MagicMock:
+    def build(settings: Settings) -> PipelineComponents:
+        chain = MagicMock(return_value={"answer": answer, "sources": "https://intern.regent.se/en/staff-car/"})
+        return PipelineComponents(
+            settings=settings,
+            llm=MagicMock(),
+            embeddings=MagicMock(),
+            vectordb=MagicMock(),
+            retriever=MagicMock(),
+            chain=chain,
+        )
+
+    return MagicMock(side_effect=build)
+
+
+class TestRagPipeline:
+    def test_builds_once_and_reuses_chain(self):
+        builder = make_builder("36 months")
+        pipeline = RagPipeline(Settings(), builder=builder)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(pipeline.ask, ["How long is the lease time for a staff car?"] * 8))
+
+        assert builder.call_count == 1
+        assert all(result["answer"] == "36 months" for result in results)
+        assert pipeline.components.chain.call_count == 8
+
+    def test_reload_swaps_components(self):
+        builder = make_builder("36 months")
+        pipeline = RagPipeline(Settings(), builder=builder)
+        old_chain = pipeline.components.chain
+
+        new_settings = Settings(openai_model="gpt-4")
+        pipeline.reload(new_settings)
+
+        assert builder.call_count == 2
+        assert pipeline.components.settings is new_settings
+        assert pipeline.components.chain is not old_chain
+
+    def test_embedding_batch_stats(self):
+        def build(settings: Settings) -> PipelineComponents:
+            components = make_builder("36 months")(settings)
+            embeddings = get_batching_embeddings(settings, FakeEmbeddings())
+            return replace(components, embeddings=embeddings)
+
+        assert RagPipeline(Settings(), builder=make_builder("")).embedding_batch_stats() == {"enabled": False}
+        pipeline = RagPipeline(Settings(embedding_batch_window=0.0, embedding_batch_max_size=8), builder=build)
+        pipeline.components.embeddings.embed_query("How long is the lease time for a staff car?")
+
+        stats = pipeline.embedding_batch_stats()
+        assert stats["enabled"] and stats["batches"] == 1 and stats["fill_rate"] == 1 / 8
+
+
+class TestRagPipelineStreaming:
+    def test_stream_sends_sources_before_tokens(self):
+        pipeline = RagPipeline(Settings(), builder=fake_builder())
+
+        events = list(pipeline.stream("How long is the lease time for a staff car?"))
+
+        assert events[0] == ("sources", [doc.metadata["source"] for doc in fake_documents()])
+        tokens = [data for event, data in events if event == "token"]
+        assert "".join(tokens) == FAKE_ANSWER
+        assert events[-1] == (
+            "answer",
+            {
+                "answer": "The lease time for a staff car is 36 months.\n",
+                "sources": "https://intern.regent.se/en/staff-car/",
+            },
+        )
+
+    def test_astream_matches_stream(self):
+        pipeline = RagPipeline(Settings(), builder=fake_builder())
+
+        async def collect() -> list:
+            return [event async for event in pipeline.astream("How long is the lease time for a staff car?")]
+
+        assert asyncio.run(collect()) == list(pipeline.stream("How long is the lease time for a staff car?"))
+
+    def test_cache_hit_skips_llm(self):
+        pipeline = RagPipeline(Settings(), builder=fake_builder(cache=SemanticCache()))
+        question = "How long is the lease time for a staff car?"
+
+        first = pipeline.ask(question)
+        with patch.object(FakeLLM, "_call", side_effect=AssertionError("LLM should not be called")):
+            second = pipeline.ask(question)
+            streamed = list(pipeline.stream(question))
+
+        assert second == first
+        assert streamed == [("answer", {"answer": first["answer"], "sources": first["sources"]})]
+        assert pipeline.cache_stats()["hits"] == 2
+
+
+QUESTIONS = [f"How long is the lease time for staff car {i}?" for i in range(6)]
+
+
+class TestRagPipelineBatch:
+    def test_ask_batch_answers_every_question(self):
+        settings = Settings(batch_llm_concurrency=2)
+        pipeline = RagPipeline(settings, builder=fake_builder(llm_latency=0.05))
+
+        start = time.perf_counter()
+        results = list(pipeline.ask_batch(QUESTIONS))
+        elapsed = time.perf_counter() - start
+
+        assert sorted(result["index"] for result in results) == list(range(len(QUESTIONS)))
+        assert all(result["query"] == QUESTIONS[result["index"]] for result in results)
+        assert all(result["answer"] == "The lease time for a staff car is 36 months.\n" for result in results)
+        # Six answers two at a time take at least three LLM latencies
+        assert elapsed >= 3 * 0.05
+
+    def test_aask_batch_matches_ask_batch(self):
+        pipeline = RagPipeline(Settings(), builder=fake_builder())
+
+        async def collect() -> list:
+            return [result async for result in pipeline.aask_batch(QUESTIONS)]
+
+        def by_index(results: list) -> list:
+            return sorted(results, key=lambda result: result["index"])
+
+        assert by_index(asyncio.run(collect())) == by_index(list(pipeline.ask_batch(QUESTIONS)))
+
+    def test_ask_batch_reports_errors_per_question(self):
+        pipeline = RagPipeline(Settings(), builder=fake_builder())
+
+        with patch.object(FakeVectorStore, "similarity_search_with_score", side_effect=RuntimeError("down")):
+            results = list(pipeline.ask_batch(QUESTIONS[:2]))
+
+        assert sorted(result["index"] for result in results) == [0, 1]
+        assert all(result["error"] == "RuntimeError('down')" for result in results)
+
+    def test_ask_batch_searches_with_bulk_embeddings(self):
+        def build(settings: Settings) -> PipelineComponents:
+            components = fake_builder()(settings)
+            embeddings = BatchingEmbeddings(FakeEmbeddings())
+            components.vectordb._embedding = embeddings  # pylint: disable=protected-access
+            return replace(components, embeddings=embeddings)
+
+        pipeline = RagPipeline(Settings(retrieval_mode="plain"), builder=build)
+        embedded = []
+        embed_documents = FakeEmbeddings.embed_documents
+
+        def record(self, texts):
+            embedded.append(list(texts))
+            return embed_documents(self, texts)
+
+        with patch.object(FakeEmbeddings, "embed_documents", record):
+            results = list(pipeline.ask_batch(QUESTIONS))
+
+        assert not any("error" in result for result in results)
+        # The vector searches reuse the vectors of the questions embedded in bulk
+        assert embedded == [QUESTIONS]
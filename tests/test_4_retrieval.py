@@ -0,0 +1,131 @@
+import asyncio
+import tempfile
+import time
+from unittest.mock import patch
+
+from langchain.schema import BaseRetriever, Document
+from langchain.vectorstores.base import VectorStoreRetriever
+
+from regent_rag.core.bm25 import BM25_FOLDER, Bm25Index
+from regent_rag.core.settings import Settings
+from regent_rag.pipeline import get_document_sources
+from regent_rag.retrieval import (
+    AdaptiveMultiQueryRetriever,
+    HybridRetriever,
+    get_retriever_from_vectordb,
+    keyword_document,
+    reciprocal_rank_fusion,
+)
+from tests.fakes import FakeEmbeddings, FakeLLM, FakeVectorStore, fake_documents
+
+
+def doc(text: str) -> Document:
+    return Document(page_content=text, metadata={"source": f"https://intern.regent.se/{text}"})
+
+
+def test_reciprocal_rank_fusion_favours_documents_in_both_rankings():
+    fused = reciprocal_rank_fusion([[doc("a"), doc("b"), doc("c")], [doc("d"), doc("c")]])
+
+    assert [d.page_content for d in fused] == ["c", "a", "d", "b"]
+
+
+def test_hybrid_retriever_finds_exact_terms():
+    vectordb = FakeVectorStore(FakeEmbeddings(), fake_documents())
+    chunks = [
+        {"id": "iso-0", "text": "Regent is certified according to ISO 9001.", "source": "https://intern.regent.se/iso"}
+    ]
+    retriever = HybridRetriever(vectordb=vectordb, bm25=Bm25Index.build(chunks), k=2)
+
+    docs = retriever.get_relevant_documents("Which ISO 9001 certificate do we have?")
+
+    # The top keyword hit ties with the top vector hit, which the vector store returns for any question
+    assert [d.metadata["source"] for d in docs] == [
+        "https://intern.regent.se/en/staff-car/0",
+        "https://intern.regent.se/iso",
+    ]
+
+
+def test_keyword_hits_keep_the_sources_of_duplicates():
+    chunks = [
+        {
+            "id": "iso-0",
+            "text": "Regent is certified according to ISO 9001.",
+            "source": "https://intern.regent.se/iso",
+            "sources": ["https://intern.regent.se/iso", "https://intern.regent.se/print/iso"],
+        }
+    ]
+    bm25 = Bm25Index.build(chunks)
+
+    document = keyword_document(bm25.documents[bm25.search("ISO 9001", k=1)[0][0]])
+
+    assert document.metadata == {"source": chunks[0]["source"], "sources": chunks[0]["sources"]}
+    assert get_document_sources([document, doc("a")]) == [*chunks[0]["sources"], "https://intern.regent.se/a"]
+
+
+def test_hybrid_search_is_the_base_search():
+    vectordb = FakeVectorStore(FakeEmbeddings(), fake_documents())
+    with tempfile.TemporaryDirectory() as folder:
+        Bm25Index.build([{"id": "a-0", "text": "Fonts", "source": "s"}]).save(f"{folder}/{BM25_FOLDER}")
+
+        hybrid = get_retriever_from_vectordb(
+            Settings(hybrid_search_enabled=True, retrieval_mode="plain", output_folder=folder), vectordb, FakeLLM()
+        )
+        expanded = get_retriever_from_vectordb(
+            Settings(hybrid_search_enabled=True, output_folder=folder), vectordb, FakeLLM()
+        )
+        # Without a BM25 index there is nothing to fuse with
+        fallback = get_retriever_from_vectordb(
+            Settings(hybrid_search_enabled=True, retrieval_mode="plain", output_folder=f"{folder}/missing"),
+            vectordb,
+            FakeLLM(),
+        )
+
+    assert isinstance(hybrid, HybridRetriever)
+    assert isinstance(expanded, AdaptiveMultiQueryRetriever) and isinstance(expanded.retriever, HybridRetriever)
+    assert isinstance(fallback, VectorStoreRetriever)
+
+
+class TestRetrievalModes:
+    question = "How long is the lease time for a staff car?"
+
+    def retriever(self, mode: str, score: float = 0.9, latency: float = 0.0) -> BaseRetriever:
+        vectordb = FakeVectorStore(FakeEmbeddings(), fake_documents(), latency=latency, score=score)
+        return get_retriever_from_vectordb(Settings(retrieval_mode=mode), vectordb, FakeLLM())
+
+    def test_plain_mode_skips_the_llm(self):
+        with patch.object(FakeLLM, "_call") as llm:
+            docs = self.retriever("plain").get_relevant_documents(self.question)
+
+        assert docs == fake_documents()
+        llm.assert_not_called()
+
+    def test_adaptive_mode_only_expands_weak_results(self):
+        with patch.object(FakeLLM, "_call", return_value="Lease time?\nStaff car lease?") as llm:
+            strong = self.retriever("adaptive", score=0.9).get_relevant_documents(self.question)
+            assert llm.call_count == 0
+
+            weak = self.retriever("adaptive", score=0.5).get_relevant_documents(self.question)
+            assert llm.call_count == 1
+
+        assert strong == fake_documents()
+        assert weak == fake_documents()
+
+    def test_query_variants_are_memoized(self):
+        retriever = self.retriever("multi_query")
+        with patch.object(FakeLLM, "_call", return_value="Lease time?\nStaff car lease?") as llm:
+            retriever.get_relevant_documents(self.question)
+            retriever.get_relevant_documents(f" {self.question} ")
+            asyncio.run(retriever.aget_relevant_documents(self.question))
+
+        assert llm.call_count == 1
+
+    def test_variant_searches_run_concurrently(self):
+        retriever = self.retriever("multi_query", latency=0.2)
+        variants = "\n".join(f"Variant {i}?" for i in range(4))
+        with patch.object(FakeLLM, "_call", return_value=variants):
+            start = time.perf_counter()
+            retriever.get_relevant_documents(self.question)
+            elapsed = time.perf_counter() - start
+
+        # Four searches of 0.2 seconds each, one after another would take 0.8 seconds
+        assert elapsed < 0.6
@@ -0,0 +1,75 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from regent_rag import async_app
+
+
+def test_chat_keeps_response_shape():
+    pipeline = MagicMock()
+    pipeline.aask = AsyncMock(
+        return_value={"question": "q", "answer": "36 months", "sources": "https://intern.regent.se/en/staff-car/"}
+    )
+
+    async def run() -> tuple[int, dict, str]:
+        async with TestClient(TestServer(async_app.create_app(pipeline))) as client:
+            response = await client.post("/chat", json={"query": "How long is the lease time for a staff car?"})
+            return response.status, await response.json(), response.headers["Access-Control-Allow-Origin"]
+
+    status, body, allow_origin = asyncio.run(run())
+
+    assert status == 200
+    assert body == {"answer": "36 months", "sources": "https://intern.regent.se/en/staff-car/"}
+    assert allow_origin == "*"
+    pipeline.aask.assert_awaited_once_with("How long is the lease time for a staff car?")
+
+
+def test_chat_batch_streams_jsonl():
+    results = [
+        {"index": 1, "query": "q1", "answer": "36 months", "sources": "https://intern.regent.se/en/staff-car/"},
+        {"index": 0, "query": "q0", "error": "RuntimeError('down')"},
+    ]
+
+    async def aask_batch(_):
+        for result in results:
+            yield result
+
+    pipeline = MagicMock()
+    pipeline.aask_batch = MagicMock(side_effect=aask_batch)
+
+    async def run() -> tuple[int, str, str]:
+        async with TestClient(TestServer(async_app.create_app(pipeline))) as client:
+            response = await client.post("/chat/batch", json={"queries": ["q0", "q1"]})
+            return response.status, response.headers["Content-Type"], await response.text()
+
+    status, content_type, body = asyncio.run(run())
+
+    assert status == 200
+    assert content_type == "application/x-ndjson"
+    assert [json.loads(line) for line in body.splitlines()] == results
+    pipeline.aask_batch.assert_called_once_with(["q0", "q1"])
+
+
+def test_chat_batch_rejects_invalid_queries():
+    pipeline = MagicMock()
+
+    async def run() -> list[tuple[int, dict]]:
+        async with TestClient(TestServer(async_app.create_app(pipeline))) as client:
+            responses = [
+                await client.post("/chat/batch", json=body)
+                for body in [{"query": "q0"}, {"queries": "q0"}, {"queries": ["q0", " "]}, {"queries": ["q0", 1]}]
+            ]
+            responses.append(await client.post("/chat/batch", data="queries"))
+            with patch.object(async_app, "get_settings", return_value=MagicMock(batch_max_queries=2)):
+                responses.append(await client.post("/chat/batch", json={"queries": ["q0", "q1", "q2"]}))
+            return [(response.status, await response.json()) for response in responses]
+
+    results = asyncio.run(run())
+
+    # Nothing is answered, every rejection says why
+    assert [status for status, _ in results] == [400] * 6
+    assert all(body["error"] for _, body in results)
+    assert "At most 2 queries" in results[-1][1]["error"]
+    pipeline.aask_batch.assert_not_called()
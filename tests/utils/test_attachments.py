@@ -0,0 +1,68 @@
+import threading
+import unittest
+from io import BytesIO
+
+from reportlab.pdfgen import canvas
+
+from regent_rag.core.attachments import AttachmentExtractor, ExtractionTimeout, extract_pages
+
+
+def make_pdf(pages: int) -> bytes:
+    pdf_file = BytesIO()
+    c = canvas.Canvas(pdf_file)
+    for i in range(1, pages + 1):
+        c.drawString(100, 750, f"Page {i} of the staff handbook")
+        c.showPage()
+    c.save()
+    return pdf_file.getvalue()
+
+
+class TestAttachmentExtractor(unittest.TestCase):
+    def test_extracts_pages_in_worker_processes(self) -> None:
+        results: dict[str, list[tuple[int, str]]] = {}
+        lock = threading.Lock()
+
+        def on_pages(url: str):
+            def save(pages: list[tuple[int, str]]) -> None:
+                with lock:
+                    results[url] = pages
+
+            return save
+
+        with AttachmentExtractor(workers=2, max_bytes=100_000) as extractor:
+            for i in range(4):
+                url = f"https://intern.regent.se/wp-content/uploads/handbook-{i}.pdf"
+                extractor.submit(url, make_pdf(i + 1), on_pages(url))
+            # Too large to be sent to the pool at all
+            self.assertIsNone(extractor.submit("https://intern.regent.se/huge.pdf", b"%PDF" * 50_000, on_pages("")))
+
+        self.assertEqual((extractor.extracted, extractor.skipped), (4, 1))
+        self.assertEqual(
+            results["https://intern.regent.se/wp-content/uploads/handbook-2.pdf"],
+            [
+                (1, "Page 1 of the staff handbook"),
+                (2, "Page 2 of the staff handbook"),
+                (3, "Page 3 of the staff handbook"),
+            ],
+        )
+
+    def test_slow_and_broken_files_are_skipped(self) -> None:
+        saved: list[list[tuple[int, str]]] = []
+
+        with AttachmentExtractor(workers=1, timeout=0.001) as extractor:
+            extractor.submit("https://intern.regent.se/handbook.pdf", make_pdf(300), saved.append)
+        with AttachmentExtractor(workers=1) as broken_extractor:
+            broken_extractor.submit("https://intern.regent.se/broken.pptx", b"not a presentation", saved.append)
+
+        self.assertEqual(saved, [])
+        self.assertEqual((extractor.extracted, extractor.skipped), (0, 1))
+        self.assertEqual((broken_extractor.extracted, broken_extractor.skipped), (0, 1))
+
+    def test_extract_pages_time_limit(self) -> None:
+        with self.assertRaises(ExtractionTimeout):
+            extract_pages("https://intern.regent.se/handbook.pdf", make_pdf(300), timeout=0.001)
+        self.assertEqual(len(extract_pages("https://intern.regent.se/handbook.pdf", make_pdf(3), timeout=10)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+
+from regent_rag.core.bm25 import Bm25Index, tokenize
+
+DOCUMENTS = [
+    {
+        "id": "a-0",
+        "text": "Regent is certified according to ISO 9001 and ISO 14001.",
+        "source": "https://intern.regent.se/iso",
+    },
+    {"id": "b-0", "text": "Staff cars are leased for 36 months.", "source": "https://intern.regent.se/staff-car"},
+    {
+        "id": "b-1",
+        "text": "Estimate the cost of a staff car in the Excel sheet.",
+        "source": "https://intern.regent.se/staff-car",
+    },
+    {"id": "c-0", "text": "Use the font Regent Sans in all documents.", "source": "https://intern.regent.se/fonts"},
+]
+
+
+class TestBm25Index(unittest.TestCase):
+    def test_tokenize(self) -> None:
+        self.assertEqual(tokenize("ISO 9001:2015, Regent_Sans.ttf"), ["iso", "9001", "2015", "regent_sans", "ttf"])
+
+    def test_exact_terms_rank_first(self) -> None:
+        index = Bm25Index.build(DOCUMENTS)
+
+        self.assertEqual(index.search("ISO 14001 certificate")[0][0], 0)
+        self.assertEqual([doc_id for doc_id, _ in index.search("staff car excel sheet")], [2, 1])
+        self.assertEqual(index.search("unknown words"), [])
+
+    def test_search_returns_at_most_k(self) -> None:
+        index = Bm25Index.build(DOCUMENTS)
+
+        self.assertEqual(len(index.search("regent staff car", k=2)), 2)
+
+    def test_save_and_load(self) -> None:
+        index = Bm25Index.build(DOCUMENTS)
+        with tempfile.TemporaryDirectory() as folder:
+            index.save(folder)
+            loaded = Bm25Index.load(folder)
+
+        assert loaded is not None
+        self.assertEqual(loaded.documents, DOCUMENTS)
+        self.assertEqual(loaded.search("staff car excel"), index.search("staff car excel"))
+
+    def test_load_missing_index(self) -> None:
+        with tempfile.TemporaryDirectory() as folder:
+            self.assertIsNone(Bm25Index.load(folder))
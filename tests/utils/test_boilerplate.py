@@ -0,0 +1,46 @@
+import unittest
+
+from regent_rag.core.boilerplate import BlockCounter, block_hash, iter_blocks, strip_blocks
+
+MENU = "Start\nNews\nStaff car"
+COOKIES = "We use cookies. Read more about cookies."
+
+
+class TestBoilerplate(unittest.TestCase):
+    def test_iter_blocks(self) -> None:
+        text = "Title\n\nFirst line\nsecond line\n \nLast"
+
+        self.assertEqual(
+            [text[start:end] for start, end in iter_blocks(text)], ["Title", "First line\nsecond line", "Last"]
+        )
+
+    def test_block_hash_ignores_whitespace(self) -> None:
+        self.assertEqual(block_hash("Staff  car\nlease"), block_hash("Staff car lease "))
+        self.assertNotEqual(block_hash("Staff car"), block_hash("Staff cars"))
+        self.assertEqual(block_hash(" \n"), 0)
+
+    def test_blocks_on_a_fraction_of_pages_are_boilerplate(self) -> None:
+        counter = BlockCounter()
+        for i in range(10):
+            blocks = [MENU, f"Page {i}", COOKIES if i < 3 else f"Footnote {i}"]
+            # A block repeated on the same page counts once
+            counter.add("\n\n".join(blocks + [MENU]))
+
+        self.assertEqual(counter.boilerplate(0.5, min_pages=2), {block_hash(MENU)})
+        self.assertEqual(counter.boilerplate(0.3, min_pages=2), {block_hash(MENU), block_hash(COOKIES)})
+        self.assertEqual(counter.boilerplate(0.3, min_pages=20), set())
+        self.assertEqual(BlockCounter().boilerplate(0.3, min_pages=2), set())
+
+    def test_strip_blocks_maps_offsets(self) -> None:
+        text = f"Staff car\n\n{MENU}\n\nLease time is 36 months\n\n{COOKIES}"
+
+        stripped, segments = strip_blocks(text, {block_hash(MENU), block_hash(COOKIES)})
+
+        self.assertEqual(stripped, "Staff car\n\nLease time is 36 months")
+        self.assertEqual(segments, [(0, 0), (11, text.index("Lease"))])
+
+    def test_strip_blocks_without_boilerplate_keeps_text(self) -> None:
+        text = "Staff car\n \nLease time"
+
+        self.assertEqual(strip_blocks(text, {block_hash(MENU)}), (text, [(0, 0)]))
+        self.assertEqual(strip_blocks(text, set()), (text, [(0, 0)]))
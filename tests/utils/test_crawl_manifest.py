@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import unittest
+
+from regent_rag.core.changes import SourceChanges, add_pending_changes, clear_pending_changes
+from regent_rag.core.crawl_manifest import CrawlEntry, CrawlManifest, scrape_filename
+
+URL_A = "https://intern.regent.se/en/a"
+URL_B = "https://intern.regent.se/en/b"
+URL_C = "https://intern.regent.se/en/c"
+
+
+class TestCrawlManifest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.scrape_folder = os.path.join(self.temp_dir.name, "scrape")
+        os.makedirs(self.scrape_folder)
+        self.manifest_path = os.path.join(self.temp_dir.name, "crawl_manifest.json")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def save(self, manifest: CrawlManifest, url: str, content_hash: str, etag: str = "") -> None:
+        manifest.visit(url)
+        if manifest.record(url, CrawlEntry(content_hash, etag, None, [URL_B])):
+            with open(scrape_filename(self.scrape_folder, url), "w", encoding="utf-8") as f:
+                json.dump({"url": url, "content": content_hash}, f)
+
+    def test_conditional_headers_and_links_of_unchanged_pages(self) -> None:
+        manifest = CrawlManifest(self.manifest_path)
+        self.assertEqual(manifest.visit(URL_A), {})
+        self.save(manifest, URL_A, "hash-a", etag='"v1"')
+        manifest.finish(self.scrape_folder)
+
+        manifest = CrawlManifest(self.manifest_path)
+        self.assertEqual(manifest.visit(URL_A), {"If-None-Match": '"v1"'})
+        self.assertEqual(manifest.not_modified(URL_A), [URL_B])
+
+    def test_changed_and_removed_pages(self) -> None:
+        manifest = CrawlManifest(self.manifest_path)
+        for url in (URL_A, URL_B, URL_C):
+            self.save(manifest, url, f"hash-{url}")
+        self.assertEqual(manifest.finish(self.scrape_folder).changed, {URL_A, URL_B, URL_C})
+
+        # A changed, B failed to download, C is no longer linked to
+        manifest = CrawlManifest(self.manifest_path)
+        self.save(manifest, URL_A, "new-hash")
+        manifest.visit(URL_B)
+        changes = manifest.finish(self.scrape_folder)
+
+        self.assertEqual(changes, SourceChanges(changed={URL_A}, removed={URL_C}))
+        self.assertEqual(len(CrawlManifest(self.manifest_path)), 2)
+        self.assertTrue(os.path.isfile(scrape_filename(self.scrape_folder, URL_B)))
+        self.assertFalse(os.path.isfile(scrape_filename(self.scrape_folder, URL_C)))
+
+    def test_gone_pages_are_removed(self) -> None:
+        manifest = CrawlManifest(self.manifest_path)
+        self.save(manifest, URL_A, "hash-a")
+        manifest.finish(self.scrape_folder)
+
+        manifest = CrawlManifest(self.manifest_path)
+        manifest.visit(URL_A)
+        manifest.gone(URL_A)
+
+        self.assertEqual(manifest.finish(self.scrape_folder).removed, {URL_A})
+        self.assertEqual(os.listdir(self.scrape_folder), [])
+
+
+class TestPendingChanges(unittest.TestCase):
+    def test_pending_changes_accumulate_until_cleared(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "changes.json")
+            add_pending_changes(path, SourceChanges(changed={URL_A, URL_B}, removed={URL_C}))
+            pending = add_pending_changes(path, SourceChanges(changed={URL_C}, removed={URL_B}))
+
+            self.assertEqual(pending, SourceChanges(changed={URL_A, URL_C}, removed={URL_B}))
+            self.assertEqual(SourceChanges.load(path), pending)
+
+            clear_pending_changes(path)
+            self.assertIsNone(SourceChanges.load(path))
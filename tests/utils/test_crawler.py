@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from regent_rag.core.crawler import (
+    AsyncCrawlFrontier,
+    AsyncHostLimiter,
+    CrawlAborted,
+    CrawlFrontier,
+    FetchFailed,
+    HostLimiter,
+    normalize_url,
+)
+
+SITE = {
+    "https://intern.regent.se/": ["/en/a", "en/b", "https://intern.regent.se/en/a#top", "mailto:it@regent.se"],
+    "https://intern.regent.se/en/a": ["/", "b", "https://example.com/elsewhere", "/en/a?y=2&x=1"],
+    "https://intern.regent.se/en/b": ["./a", "https://INTERN.regent.se:443/en/b"],
+    "https://intern.regent.se/en/a?x=1&y=2": [],
+}
+
+
+class TestNormalizeUrl(unittest.TestCase):
+    def test_normalize_url(self) -> None:
+        self.assertEqual(
+            normalize_url("../b?z=1&a=2#x", "https://Intern.Regent.se/en/a/"), "https://intern.regent.se/en/b?a=2&z=1"
+        )
+        self.assertEqual(normalize_url("HTTPS://intern.regent.se:443"), "https://intern.regent.se/")
+        self.assertEqual(normalize_url("http://localhost:8080/x"), "http://localhost:8080/x")
+        self.assertIsNone(normalize_url("mailto:it@regent.se"))
+        self.assertIsNone(normalize_url("javascript:void(0)", "https://intern.regent.se/"))
+
+
+class TestCrawlFrontier(unittest.TestCase):
+    def test_fetches_every_page_once(self) -> None:
+        fetched: list[str] = []
+        lock = threading.Lock()
+
+        def fetch(url: str) -> list[str]:
+            with lock:
+                fetched.append(url)
+            return SITE[url]
+
+        frontier = CrawlFrontier(allowed_hosts=["intern.regent.se"])
+        frontier.add("https://intern.regent.se")
+        stats = frontier.crawl(fetch, workers=4)
+
+        self.assertEqual(sorted(fetched), sorted(SITE))
+        self.assertEqual((stats.fetched, stats.failed, stats.seen), (4, 0, 4))
+
+    def test_failed_fetches_are_counted(self) -> None:
+        def fetch(url: str) -> list[str]:
+            if url.endswith("/b"):
+                raise ConnectionError("Connection reset")
+            return SITE[url]
+
+        frontier = CrawlFrontier(allowed_hosts=["intern.regent.se"])
+        frontier.add("https://intern.regent.se/")
+        stats = frontier.crawl(fetch, workers=2)
+
+        self.assertEqual((stats.fetched, stats.failed), (3, 1))
+
+    def test_links_of_failed_fetches_are_followed(self) -> None:
+        def fetch(url: str) -> list[str]:
+            if url == "https://intern.regent.se/":
+                raise FetchFailed("https://intern.regent.se/ answered 503")
+            return []
+
+        frontier = CrawlFrontier(allowed_hosts=["intern.regent.se"], failed_links=SITE.__getitem__)
+        frontier.add("https://intern.regent.se/")
+        stats = frontier.crawl(fetch, workers=2)
+
+        self.assertEqual((stats.fetched, stats.failed, stats.seen), (2, 1, 3))
+
+    def test_abort_stops_the_crawl(self) -> None:
+        def fetch(url: str) -> list[str]:
+            raise CrawlAborted(url)
+
+        frontier = CrawlFrontier()
+        frontier.add("https://intern.regent.se/")
+
+        with self.assertRaises(CrawlAborted):
+            frontier.crawl(fetch, workers=2)
+
+
+class TestAsyncCrawlFrontier(unittest.TestCase):
+    def test_fetches_every_page_once_within_concurrency(self) -> None:
+        fetched: list[str] = []
+        active, peak = [0], [0]
+
+        async def fetch(url: str) -> list[str]:
+            fetched.append(url)
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            await asyncio.sleep(0.01)
+            active[0] -= 1
+            return SITE[url]
+
+        frontier = AsyncCrawlFrontier(allowed_hosts=["intern.regent.se"])
+        frontier.add("https://intern.regent.se")
+        stats = asyncio.run(frontier.crawl(fetch, concurrency=2))
+
+        self.assertEqual(sorted(fetched), sorted(SITE))
+        self.assertEqual((stats.fetched, stats.failed, stats.seen), (4, 0, 4))
+        self.assertLessEqual(peak[0], 2)
+
+    def test_failed_fetches_are_counted(self) -> None:
+        async def fetch(url: str) -> list[str]:
+            if url.endswith("/b"):
+                raise ConnectionError("Connection reset")
+            return SITE[url]
+
+        frontier = AsyncCrawlFrontier(allowed_hosts=["intern.regent.se"])
+        frontier.add("https://intern.regent.se/")
+        stats = asyncio.run(frontier.crawl(fetch))
+
+        self.assertEqual((stats.fetched, stats.failed), (3, 1))
+
+    def test_abort_stops_the_crawl(self) -> None:
+        async def fetch(url: str) -> list[str]:
+            raise CrawlAborted(url)
+
+        frontier = AsyncCrawlFrontier()
+        frontier.add("https://intern.regent.se/")
+
+        with self.assertRaises(CrawlAborted):
+            asyncio.run(frontier.crawl(fetch))
+
+
+class TestHostLimiter(unittest.TestCase):
+    def test_limits_concurrency_and_rate_per_host(self) -> None:
+        limiter = HostLimiter(concurrency=2, delay=0.05)
+        active, peak, starts = [0], [0], []
+        lock = threading.Lock()
+
+        def request() -> None:
+            limiter.acquire("intern.regent.se")
+            with lock:
+                starts.append(time.monotonic())
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            limiter.release("intern.regent.se")
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        first = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # A late wake-up can bring two starts closer, but never ahead of the slot reserved for them
+        starts.sort()
+        self.assertLessEqual(peak[0], 2)
+        self.assertTrue(all(start - first >= i * 0.05 - 0.005 for i, start in enumerate(starts)))
+
+    def test_async_limits_concurrency_and_rate_per_host(self) -> None:
+        limiter = AsyncHostLimiter(concurrency=2, delay=0.05)
+        active, peak, starts = [0], [0], []
+
+        async def request() -> None:
+            await limiter.acquire_async("intern.regent.se")
+            starts.append(time.monotonic())
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            await asyncio.sleep(0.01)
+            active[0] -= 1
+            limiter.release_async("intern.regent.se")
+
+        async def run() -> None:
+            await asyncio.gather(*(request() for _ in range(5)))
+
+        first = time.monotonic()
+        asyncio.run(run())
+
+        starts.sort()
+        self.assertLessEqual(peak[0], 2)
+        self.assertTrue(all(start - first >= i * 0.05 - 0.005 for i, start in enumerate(starts)))
@@ -0,0 +1,49 @@
+import random
+import unittest
+
+from regent_rag.core.dedup import NearDuplicateIndex
+
+WORDS = [f"word{i}" for i in range(500)]
+
+
+def text(seed: int, length: int = 300) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    def test_same_texts_are_grouped(self) -> None:
+        index = NearDuplicateIndex()
+
+        self.assertEqual(index.add("Lease time is 36 months."), 0)
+        self.assertEqual(index.add("Lease time is 36 months."), 0)
+        self.assertEqual(index.add("lease TIME is 36 months"), 0)
+        self.assertEqual(index.add("Lease time is 48 months."), 1)
+        self.assertEqual(len(index), 2)
+
+    def test_near_duplicates_are_grouped(self) -> None:
+        index = NearDuplicateIndex(threshold=0.8)
+        original = text(1).split()
+        # A changed word changes the 5 shingles that cover it, 4 changes in 300 words keep ~94% of the shingles
+        edited = list(original)
+        for position in (50, 120, 190, 260):
+            edited[position] = "changed"
+
+        self.assertEqual(index.add(" ".join(original)), 0)
+        self.assertEqual(index.add(" ".join(edited)), 0)
+        self.assertEqual(index.add(" ".join(original[:150] + text(2, 150).split())), 1)
+        self.assertEqual(index.add(text(3)), 2)
+
+    def test_signature_estimates_jaccard_similarity(self) -> None:
+        index = NearDuplicateIndex(num_perm=256, bands=32, shingle_size=1)
+        first = " ".join(f"word{i}" for i in range(100))
+        second = " ".join(f"word{i}" for i in range(50, 150))
+
+        # The sets share 50 of 150 words
+        similarity = (index.signature(first) == index.signature(second)).mean()
+
+        self.assertAlmostEqual(similarity, 1 / 3, delta=0.1)
+
+    def test_bands_must_divide_hash_functions(self) -> None:
+        with self.assertRaises(ValueError):
+            NearDuplicateIndex(num_perm=128, bands=10)
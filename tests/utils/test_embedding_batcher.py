@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from regent_rag.core.embedding_batcher import BatchingEmbeddings, BatchStats
+from tests.fakes import FakeEmbeddings
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__(latency=latency)
+        self.calls: list[list[str]] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        return super().embed_documents(texts)
+
+
+class FailingEmbeddings(FakeEmbeddings):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise ConnectionError("OpenAI is down")
+
+
+class TestBatchingEmbeddings(unittest.TestCase):
+    def test_concurrent_queries_share_calls(self) -> None:
+        inner = CountingEmbeddings(latency=0.01)
+        embeddings = BatchingEmbeddings(inner, window=5.0, max_size=4)
+        texts = [f"question {i}" for i in range(8)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            vectors = list(executor.map(embeddings.embed_query, texts))
+
+        # Batches are closed as soon as they are full, long before the window ends
+        self.assertEqual(sorted(len(call) for call in inner.calls), [4, 4])
+        self.assertEqual(vectors, [inner.embed_query(text) for text in texts])
+        self.assertEqual(
+            embeddings.stats, BatchStats(max_size=4, batches=2, full_batches=2, queries=8, texts=8, largest_batch=4)
+        )
+        self.assertEqual(embeddings.stats.fill_rate, 1.0)
+
+    def test_single_query_waits_for_the_window(self) -> None:
+        inner = CountingEmbeddings()
+        embeddings = BatchingEmbeddings(inner, window=0.05, max_size=16)
+
+        start = time.perf_counter()
+        vector = embeddings.embed_query("How long is the lease time?")
+
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        self.assertEqual(vector, inner.embed_query("How long is the lease time?"))
+        self.assertEqual(embeddings.stats.to_dict()["mean_batch_size"], 1.0)
+        self.assertEqual(embeddings.stats.fill_rate, 1 / 16)
+
+    def test_same_text_is_embedded_once(self) -> None:
+        inner = CountingEmbeddings()
+        embeddings = BatchingEmbeddings(inner, window=0.2, max_size=16)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            vectors = list(executor.map(embeddings.embed_query, ["staff car", "staff car", "font"]))
+
+        self.assertEqual(inner.calls, [["staff car", "font"]])
+        self.assertEqual(vectors[0], vectors[1])
+        self.assertEqual((embeddings.stats.queries, embeddings.stats.texts), (3, 2))
+
+    def test_errors_reach_every_query_of_the_batch(self) -> None:
+        embeddings = BatchingEmbeddings(FailingEmbeddings(), window=0.2, max_size=16)
+        errors: list[BaseException] = []
+
+        def query(text: str) -> None:
+            try:
+                embeddings.embed_query(text)
+            except ConnectionError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=query, args=(f"question {i}",)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 3)
+        self.assertEqual((embeddings.stats.errors, embeddings.stats.batches), (1, 0))
+
+    def test_async_queries_join_batches(self) -> None:
+        inner = CountingEmbeddings()
+        embeddings = BatchingEmbeddings(inner, window=5.0, max_size=3)
+
+        async def run() -> list[List[float]]:
+            return await asyncio.gather(*(embeddings.aembed_query(f"question {i}") for i in range(3)))
+
+        vectors = asyncio.run(run())
+
+        self.assertEqual([sorted(call) for call in inner.calls], [["question 0", "question 1", "question 2"]])
+        self.assertEqual(vectors[2], inner.embed_query("question 2"))
+
+    def test_primed_texts_skip_the_call(self) -> None:
+        inner = CountingEmbeddings()
+        embeddings = BatchingEmbeddings(inner, window=0.0, max_size=16)
+        vector = [1.0, 0.0]
+
+        with embeddings.primed(["question"], [vector]):
+            with embeddings.primed(["question"], [vector]):
+                self.assertIs(embeddings.embed_query("question"), vector)
+            # Still primed by the outer block
+            self.assertIs(asyncio.run(embeddings.aembed_query("question")), vector)
+        self.assertEqual(inner.calls, [])
+
+        self.assertEqual(embeddings.embed_query("question"), inner.embed_query("question"))
+        self.assertEqual(inner.calls, [["question"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
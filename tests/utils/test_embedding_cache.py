@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+
+from regent_rag.core.embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.test_dir.name, "embeddings.sqlite")
+
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    def test_round_trip_is_persistent(self) -> None:
+        cache = EmbeddingCache(self.file_path)
+        cache.put_many(["staff car", "fonts"], [[0.5, -1.0], [0.25, 2.0]], "text-embedding-ada-002")
+        cache.close()
+
+        cache = EmbeddingCache(self.file_path)
+        result = cache.get_many(["fonts", "logo", "staff car"], "text-embedding-ada-002")
+        cache.close()
+
+        self.assertEqual(result, [[0.25, 2.0], None, [0.5, -1.0]])
+
+    def test_keyed_by_model(self) -> None:
+        cache = EmbeddingCache(self.file_path)
+        cache.put_many(["staff car"], [[0.5, -1.0]], "text-embedding-ada-002")
+
+        self.assertEqual(cache.get_many(["staff car"], "text-embedding-3-small"), [None])
+        self.assertEqual(len(cache), 1)
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,14 @@ from io import BytesIO
 from pptx import Presentation
 from reportlab.pdfgen import canvas
 
-from regent_rag.core.extractors import extract_text_from_pdf, extract_text_from_pptx
+from regent_rag.core.extractors import (
+    extract_text_and_links_from_html,
+    extract_text_from_pdf,
+    extract_text_from_pptx,
+    iter_pdf_pages,
+    join_pages,
+    page_url,
+)
 
 
 class TestExtractText(unittest.TestCase):
@@ -42,6 +49,46 @@ class TestExtractText(unittest.TestCase):
         # Assert that the result is equal to the known content
         self.assertEqual(result, "Test content")
 
+    def test_extract_pdf_pages(self) -> None:
+        pdf_file = BytesIO()
+        c = canvas.Canvas(pdf_file)
+        for text in ["Lease time", "", "Fonts"]:
+            c.drawString(100, 750, text)
+            c.showPage()
+        c.save()
+
+        pages = list(iter_pdf_pages(pdf_file.getvalue()))
+
+        # Pages without text are left out, but keep their number
+        self.assertEqual(pages, [(1, "Lease time"), (3, "Fonts")])
+        self.assertEqual(
+            join_pages(iter(pages)), ("Lease time\n\nFonts", [{"page": 1, "start": 0}, {"page": 3, "start": 12}])
+        )
+        self.assertEqual(page_url("https://intern.regent.se/a.pdf", 3), "https://intern.regent.se/a.pdf#page=3")
+        self.assertEqual(page_url("https://intern.regent.se/a", None), "https://intern.regent.se/a")
+
+    def test_extract_text_and_links_from_html(self) -> None:
+        page = """<?xml version="1.0" encoding="utf-8"?>
+            <html><head><title>Staff car - Intranet</title><style>p { margin: 0; }</style></head><body>
+            <header><a href="/">Home</a></header><nav><ul><li><a href="/en/hr">HR</a></li></ul></nav>
+            <div class="content"><h1>Staff   car</h1><p>Lease time is <b>36</b> months.<br>Ask&nbsp;HR.</p>
+            <!-- generated --><ul><li>Volvo</li><li>Tesla &amp; Polestar <a href="/en/cars">cars</a></li></ul>
+            <script>var page = 1;</script></div><footer><a href="/">Home</a> Regent</footer></body></html>"""
+
+        text, links = extract_text_and_links_from_html(page)
+
+        self.assertEqual(
+            text,
+            "Staff car - Intranet\n\nStaff car\n\nLease time is 36 months.\nAsk HR.\n\nVolvo\n\nTesla & Polestar cars",
+        )
+        self.assertEqual(links, ["/", "/en/hr", "/en/cars"])
+
+    def test_extract_text_from_main_element(self) -> None:
+        page = "<html><body><p>Menu</p><main><p>Lease time is 36 months.</p></main><p>Cookies</p></body></html>"
+
+        self.assertEqual(extract_text_and_links_from_html(page), ("Lease time is 36 months.", []))
+        self.assertEqual(extract_text_and_links_from_html(" "), ("", []))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,158 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from regent_rag.core.local_index import IVF_FILE, QUANTIZED_FILE, LocalIndex, LocalVectorStore, QuantizedVectors
+from tests.fakes import FakeEmbeddings
+
+
+class TestLocalIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def test_query_returns_most_similar_first(self) -> None:
+        index = LocalIndex(self.folder.name)
+        index.upsert(
+            [
+                ("x", [1.0, 0.0, 0.0], {"text": "x"}),
+                ("y", [0.0, 2.0, 0.0], {"text": "y"}),
+                ("xy", [1.0, 1.0, 0.0], {"text": "xy"}),
+            ]
+        )
+
+        matches = index.query([1.0, 0.1, 0.0], top_k=2)["matches"]
+
+        self.assertEqual([match["id"] for match in matches], ["x", "xy"])
+        self.assertAlmostEqual(matches[0]["score"], 1 / np.sqrt(1.01), places=5)
+        self.assertEqual(matches[1]["metadata"], {"text": "xy"})
+
+    def test_upsert_updates_and_delete_removes(self) -> None:
+        index = LocalIndex(self.folder.name)
+        index.upsert([("x", [1.0, 0.0], {"text": "old"}), ("y", [0.0, 1.0], {"text": "y"})])
+        index.upsert([("x", [0.0, 1.0], {"text": "new"})])
+        index.delete(ids=["y"])
+
+        matches = index.query([0.0, 1.0], top_k=5)["matches"]
+
+        self.assertEqual([(match["id"], match["metadata"]["text"]) for match in matches], [("x", "new")])
+        self.assertEqual(index.describe_index_stats(), {"dimension": 2, "total_vector_count": 1})
+
+    def test_save_and_load_memory_maps_vectors(self) -> None:
+        index = LocalIndex(self.folder.name)
+        index.upsert([(f"id-{i}", [float(i), 1.0], {"text": str(i)}) for i in range(10)])
+        index.delete(ids=["id-3"])
+        index.save()
+
+        loaded = LocalIndex(self.folder.name)
+        # pylint: disable=protected-access
+        self.assertIsInstance(loaded._vectors, np.memmap)
+        self.assertEqual(len(loaded), 9)
+        self.assertEqual(loaded.query([9.0, 1.0], top_k=1)["matches"][0]["id"], "id-9")
+
+        # Writing to a loaded index leaves the saved files alone until the next save
+        loaded.upsert([("id-10", [1.0, 0.0], {"text": "10"})])
+        self.assertEqual(len(LocalIndex(self.folder.name)), 9)
+
+    def test_delete_all(self) -> None:
+        index = LocalIndex(self.folder.name)
+        index.upsert([("x", [1.0, 0.0], {"text": "x"})])
+        index.delete(delete_all=True)
+
+        self.assertEqual(index.query([1.0, 0.0])["matches"], [])
+        self.assertEqual(index.describe_index_stats()["total_vector_count"], 0)
+
+    def test_ivf_matches_exact_search_when_probing_every_list(self) -> None:
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((500, 16)).astype(np.float32)
+        index = LocalIndex(self.folder.name)
+        index.upsert((str(i), vector, {"text": str(i)}) for i, vector in enumerate(vectors))
+        index.build_ivf(n_lists=8)
+
+        exact = LocalIndex(self.folder.name)
+        ivf = LocalIndex(self.folder.name, nprobe=8)
+        for query in vectors[:20]:
+            exact_ids = [match["id"] for match in exact.query(query, top_k=5)["matches"]]
+            self.assertEqual(exact_ids, [match["id"] for match in ivf.query(query, top_k=5)["matches"]])
+        # A single probe still finds the vector itself, which is in the list of its nearest centroid
+        self.assertEqual(LocalIndex(self.folder.name, nprobe=1).query(vectors[7], top_k=1)["matches"][0]["id"], "7")
+
+    def test_changes_drop_the_ivf(self) -> None:
+        index = LocalIndex(self.folder.name, nprobe=1)
+        index.upsert([("x", [1.0, 0.0], {"text": "x"}), ("y", [0.0, 1.0], {"text": "y"})])
+        index.build_ivf(n_lists=2)
+        index.upsert([("z", [0.7, 0.7], {"text": "z"})])
+        index.save()
+
+        self.assertFalse(os.path.exists(os.path.join(self.folder.name, IVF_FILE)))
+        self.assertEqual(len(LocalIndex(self.folder.name, nprobe=1).query([0.6, 0.8], top_k=3)["matches"]), 3)
+
+    def test_quantized_search_rescores_with_vectors(self) -> None:
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((500, 100)).astype(np.float32)
+        queries = vectors[:20] + 0.3 * rng.standard_normal((20, 100)).astype(np.float32)
+        index = LocalIndex(self.folder.name)
+        index.upsert((str(i), vector, {"text": str(i)}) for i, vector in enumerate(vectors))
+        index.build_ivf(n_lists=4)
+        exact = [index.query(query, top_k=5)["matches"] for query in queries]
+
+        for kind in ("int8", "binary"):
+            index.quantize(kind)
+            quantized = LocalIndex(self.folder.name, rescore=10)
+            # pylint: disable=protected-access
+            assert quantized._quantized is not None
+            self.assertEqual(quantized._quantized.kind, kind)
+            for query, exact_matches in zip(queries, exact):
+                matches = quantized.query(query, top_k=5)["matches"]
+                # The nearest vector is found, with its exact score
+                self.assertEqual(matches[0]["id"], exact_matches[0]["id"])
+                self.assertAlmostEqual(matches[0]["score"], exact_matches[0]["score"], places=5)
+            # Quantizing keeps the inverted file index, which then probes the codes
+            ivf = LocalIndex(self.folder.name, nprobe=4, rescore=10)
+            self.assertEqual(ivf.query(queries[0], top_k=1)["matches"][0]["id"], exact[0][0]["id"])
+
+    def test_quantized_scores(self) -> None:
+        vectors = np.array([[0.6, -0.8, 0.0], [-0.6, 0.0, 0.8], [0.0, 1.0, 0.0]], dtype=np.float32)
+        query = np.array([0.6, -0.8, 0.0], dtype=np.float32)
+
+        int8 = QuantizedVectors.build(vectors, "int8")
+        binary = QuantizedVectors.build(vectors, "binary")
+
+        self.assertEqual(int8.codes.dtype, np.int8)
+        np.testing.assert_allclose(int8.scorer(query)(0, 3), vectors @ query, atol=0.01)
+        self.assertEqual(binary.codes.shape, (3, 8))
+        # Signs agree in 3, 1 and 1 dimensions (zero counts as negative)
+        np.testing.assert_array_equal(binary.scorer(query)(0, 3), [3, -1, -1])
+        np.testing.assert_array_equal(binary.scorer(query)(1, 3), [-1, -1])
+
+    def test_changes_drop_the_quantized_codes(self) -> None:
+        index = LocalIndex(self.folder.name)
+        index.upsert([("x", [1.0, 0.0], {"text": "x"}), ("y", [0.0, 1.0], {"text": "y"})])
+        index.quantize("int8")
+        self.assertTrue(os.path.exists(os.path.join(self.folder.name, QUANTIZED_FILE)))
+        index.upsert([("z", [0.7, 0.7], {"text": "z"})])
+
+        self.assertEqual([match["id"] for match in index.query([0.6, 0.8], top_k=1)["matches"]], ["z"])
+        index.save()
+        self.assertFalse(os.path.exists(os.path.join(self.folder.name, QUANTIZED_FILE)))
+
+
+class TestLocalVectorStore(unittest.TestCase):
+    def test_similarity_search_returns_documents(self) -> None:
+        with tempfile.TemporaryDirectory() as folder:
+            texts = ["Staff cars are leased for 36 months.", "Use the Regent font.", "ISO 9001 certified."]
+            store = LocalVectorStore.from_texts(
+                texts,
+                FakeEmbeddings(),
+                metadatas=[{"source": f"https://intern.regent.se/{i}"} for i in range(3)],
+                folder=folder,
+            )
+
+            docs = store.similarity_search("Use the Regent font.", k=1)
+
+        self.assertEqual(docs[0].page_content, "Use the Regent font.")
+        self.assertEqual(docs[0].metadata, {"source": "https://intern.regent.se/1"})
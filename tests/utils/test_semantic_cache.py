@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from regent_rag.core.semantic_cache import SemanticCache, write_index_version
+
+ANSWER = {"answer": "36 months", "sources": "https://intern.regent.se/en/staff-car/"}
+
+
+class TestSemanticCache(unittest.TestCase):
+    def test_hit_on_similar_embedding(self) -> None:
+        cache = SemanticCache(threshold=0.95)
+        cache.store([1.0, 0.0, 0.0], ANSWER)
+
+        self.assertEqual(cache.lookup([0.99, 0.05, 0.0]), ANSWER)
+        self.assertIsNone(cache.lookup([0.0, 1.0, 0.0]))
+
+        stats = cache.stats
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 1, 1))
+        self.assertEqual(stats.hit_rate, 0.5)
+
+    def test_evicts_least_recently_used(self) -> None:
+        cache = SemanticCache(threshold=0.99, max_size=2)
+        cache.store([1.0, 0.0, 0.0], "x")
+        cache.store([0.0, 1.0, 0.0], "y")
+        # Touch x, so that y is the least recently used entry
+        cache.lookup([1.0, 0.0, 0.0])
+        cache.store([0.0, 0.0, 1.0], "z")
+
+        self.assertEqual(cache.lookup([1.0, 0.0, 0.0]), "x")
+        self.assertIsNone(cache.lookup([0.0, 1.0, 0.0]))
+        self.assertEqual(cache.lookup([0.0, 0.0, 1.0]), "z")
+        self.assertEqual(cache.stats.evictions, 1)
+
+    def test_expires_after_ttl(self) -> None:
+        cache = SemanticCache(ttl=10)
+        with patch("regent_rag.core.semantic_cache.time.monotonic", return_value=100.0):
+            cache.store([1.0, 0.0], ANSWER)
+        with patch("regent_rag.core.semantic_cache.time.monotonic", return_value=111.0):
+            self.assertIsNone(cache.lookup([1.0, 0.0]))
+        self.assertEqual(cache.stats.expirations, 1)
+        self.assertEqual(cache.stats.size, 0)
+
+    def test_invalidated_when_index_is_rebuilt(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            version_file = os.path.join(temp_dir, "index_version")
+            cache = SemanticCache(version_file=version_file, version_interval=0.0)
+            cache.store([1.0, 0.0], ANSWER)
+
+            write_index_version(version_file)
+
+            self.assertIsNone(cache.lookup([1.0, 0.0]))
+            self.assertEqual(cache.stats.invalidations, 1)
+
+    def test_version_is_read_at_most_once_per_interval(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            version_file = os.path.join(temp_dir, "index_version")
+            with patch("regent_rag.core.semantic_cache.time.monotonic", return_value=100.0):
+                cache = SemanticCache(version_file=version_file, version_interval=5.0)
+                cache.store([1.0, 0.0], ANSWER)
+                write_index_version(version_file)
+
+                with patch("regent_rag.core.semantic_cache.read_index_version") as read:
+                    self.assertEqual(cache.lookup([1.0, 0.0]), ANSWER)
+                read.assert_not_called()
+
+            with patch("regent_rag.core.semantic_cache.time.monotonic", return_value=105.0):
+                self.assertIsNone(cache.lookup([1.0, 0.0]))
+            self.assertEqual(cache.stats.invalidations, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()